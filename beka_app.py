@@ -2,23 +2,36 @@
 # BEKA_APP.PY — Servidor Flask com memória persistente
 # =============================================
 
-from flask import Flask, request, jsonify
-import sqlite3
-import json
-import os
+from flask import Flask, Response, request, jsonify, stream_with_context
 from datetime import datetime
+import db
+import pagination
+import retrieval
+import metrics
+import retention
+from memory_journal import MemoryJournal
 
 app = Flask(__name__)
+db.init_app(app)
+metrics.init_app(app, "beka_app")  # tempos por etapa + GET /metrics
 
 # Caminhos dos arquivos de memória
 DB_PATH = "beka.db"
-MEMORY_PATH = "memory.json"
+JOURNAL_PATH = "memory.jsonl"  # espelho append-only da tabela memory
+journal = MemoryJournal(JOURNAL_PATH)
+# índice de relevância (FTS5/BM25) sobre memory — ver retrieval.py
+memory_index = retrieval.MemoryIndex("memory", vector_path=f"{DB_PATH}.memory.vec.npz")
+
+
+def get_conn():
+    # conexão persistente por thread (ver db.py)
+    return db.get_connection(DB_PATH)
 
 # =============================================
 # 🔧 Função para garantir que o banco exista
 # =============================================
 def init_db():
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_conn()
     c = conn.cursor()
     c.execute('''
         CREATE TABLE IF NOT EXISTS memory (
@@ -29,71 +42,51 @@ def init_db():
         )
     ''')
     conn.commit()
-    conn.close()
+    memory_index.init(conn)
+    # arquivamento das memórias antigas + VACUUM/ANALYZE incrementais (ver retention.py)
+    retention.start_maintenance(DB_PATH, ["memory"])
 
 # =============================================
 # 💾 Salva uma nova entrada no banco
 # =============================================
 def save_to_db(role, content):
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_conn()
     c = conn.cursor()
     c.execute(
         "INSERT INTO memory (role, content, timestamp) VALUES (?, ?, ?)",
         (role, content, datetime.now().isoformat())
     )
     conn.commit()
-    conn.close()
 
 # =============================================
-# 📤 Recupera as últimas mensagens do banco
+# 📄 Paginação (keyset por id) das memórias
 # =============================================
-def get_recent_from_db(limit=20):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("SELECT role, content FROM memory ORDER BY id DESC LIMIT ?", (limit,))
-    rows = c.fetchall()
-    conn.close()
-    messages = [{"role": r[0], "content": r[1]} for r in reversed(rows)]
-    return messages
+MEMORY_FIELDS = ("id", "role", "content", "timestamp")
+
+def paginate_memory(envelope):
+    try:
+        page = pagination.parse_page_args(request.args, MEMORY_FIELDS, MEMORY_FIELDS)
+    except pagination.PageError as e:
+        return jsonify({"error": str(e)}), 400
+    conn = get_conn()
+    if page["format"] == "ndjson":
+        lines = pagination.iter_ndjson(conn, "memory", page)
+        return Response(stream_with_context(lines), mimetype="application/x-ndjson")
+    messages, cursor = pagination.fetch_page(conn, "memory", page)
+    if envelope:
+        return jsonify({"memory": messages, "next_cursor": cursor}), 200
+    # /lembrar continua devolvendo uma lista; o cursor vai nos cabeçalhos
+    resp = jsonify(messages)
+    for k, v in (cursor or {}).items():
+        resp.headers[f"X-Next-{k.replace('_', '-').title()}"] = str(v)
+    return resp, 200
 
 # =============================================
-# 🔁 Sincroniza banco e JSON
+# 🔁 Sincroniza banco e journal (memory.jsonl)
 # =============================================
 def sync_memory():
-    # Se não existir o banco, cria
-    init_db()
-
-    # Puxa do banco as últimas conversas
-    db_messages = get_recent_from_db(limit=50)
-
-    # Se o JSON não existir, cria novo
-    if not os.path.exists(MEMORY_PATH):
-        with open(MEMORY_PATH, "w", encoding="utf-8") as f:
-            json.dump({"memory": db_messages}, f, indent=4, ensure_ascii=False)
-        return db_messages
-
-    # Lê o JSON existente
-    with open(MEMORY_PATH, "r", encoding="utf-8") as f:
-        try:
-            data = json.load(f)
-        except json.JSONDecodeError:
-            data = {"memory": []}
-
-    # Se estiver vazio, atualiza com o conteúdo do banco
-    if not data.get("memory"):
-        data["memory"] = db_messages
-    else:
-        # Adiciona apenas as novas mensagens que ainda não estão no JSON
-        existing = {(m["role"], m["content"]) for m in data["memory"]}
-        for msg in db_messages:
-            if (msg["role"], msg["content"]) not in existing:
-                data["memory"].append(msg)
-
-    # Salva o JSON sincronizado
-    with open(MEMORY_PATH, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=4, ensure_ascii=False)
-
-    return data["memory"]
+    # Acrescenta ao journal só as mensagens novas (id acima da marca d'água)
+    return journal.sync(get_conn())
 
 # =============================================
 # 🧠 Rota para salvar mensagens (memória)
@@ -110,7 +103,7 @@ def save_message():
     # Salva no banco
     save_to_db(role, content)
 
-    # Sincroniza com JSON
+    # Acrescenta ao journal
     sync_memory()
 
     return jsonify({"status": "mensagem salva com sucesso"}), 200
@@ -120,22 +113,19 @@ def save_message():
 # =============================================
 @app.route("/get_memory", methods=["GET"])
 def get_memory():
-    messages = sync_memory()
-    return jsonify({"memory": messages}), 200
+    return paginate_memory(envelope=True)
 
 # =============================================
-# 🧹 Rota para limpar a memória (banco + JSON)
+# 🧹 Rota para limpar a memória (banco + journal)
 # =============================================
 @app.route("/clear_memory", methods=["POST"])
 def clear_memory():
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_conn()
     c = conn.cursor()
     c.execute("DELETE FROM memory")
     conn.commit()
-    conn.close()
 
-    with open(MEMORY_PATH, "w", encoding="utf-8") as f:
-        json.dump({"memory": []}, f, indent=4, ensure_ascii=False)
+    journal.reset()
 
     return jsonify({"status": "memória limpa com sucesso"}), 200
 
@@ -145,9 +135,24 @@ def clear_memory():
 
 @app.route("/lembrar", methods=["GET"])
 def lembrar():
-    """Retorna as memórias armazenadas"""
-    messages = sync_memory()
-    return jsonify(messages), 200
+    """Retorna as memórias armazenadas (paginadas por id, ver pagination.py).
+
+    Com ?mensagem=... devolve as k (?k=, padrão 5) memórias mais relevantes (BM25);
+    com &arquivo=1 completa com memórias já arquivadas (ver retention.py).
+    """
+    mensagem = request.args.get("mensagem")
+    if mensagem:
+        try:
+            k = min(int(request.args.get("k", 5)), retrieval.MAX_TOP_K)
+        except ValueError:
+            return jsonify({"error": "'k' deve ser um inteiro"}), 400
+        k = max(k, 1)
+        hits = memory_index.search(get_conn(), mensagem, k=k, columns=("role", "timestamp"))
+        if request.args.get("arquivo") == "1" and len(hits) < k:
+            hits += retention.search_archive(retention.policy_for("memory", DB_PATH), mensagem,
+                                             limit=k - len(hits))
+        return jsonify(hits), 200
+    return paginate_memory(envelope=False)
 
 @app.route("/registrar", methods=["POST"])
 def registrar():
@@ -0,0 +1,59 @@
+# beka_cli.py
+# Chat com a Beka no terminal (o loop que antes rodava ao importar minha_ia.py).
+#
+#   python beka_cli.py [--historico historico.json]
+import argparse
+import json
+import os
+
+from minha_ia import conversar_com_ia
+
+
+# =========================
+# Funções para salvar/carregar histórico
+# =========================
+def carregar_historico(arquivo="historico.json"):
+    if os.path.exists(arquivo):
+        with open(arquivo, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return []
+
+
+def salvar_historico(historico, arquivo="historico.json"):
+    with open(arquivo, "w", encoding="utf-8") as f:
+        json.dump(historico, f, ensure_ascii=False, indent=2)
+
+
+# =========================
+# Chat em loop com memória
+# =========================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Converse com a Beka pelo terminal")
+    parser.add_argument("--historico", default="historico.json", help="arquivo JSON do histórico")
+    args = parser.parse_args(argv)
+
+    historico = carregar_historico(args.historico)
+    print("🤖 Beka ligada! Escreva 'sair' para encerrar.")
+
+    while True:
+        try:
+            entrada = input("Você: ")
+        except (EOFError, KeyboardInterrupt):
+            entrada = "sair"
+
+        if entrada.lower() in ["sair", "exit"]:
+            print("Beka: Até logo! Vou guardar nossa conversa. 💾")
+            salvar_historico(historico, args.historico)
+            break
+
+        resposta = conversar_com_ia(entrada, historico)
+
+        if resposta:
+            print("Beka:", resposta)
+            historico.append({"role": "user", "content": entrada})
+            historico.append({"role": "assistant", "content": resposta})
+            salvar_historico(historico, args.historico)  # salva a cada interação
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# benchmarks/bench_ingest.py
+# Compara o caminho antigo (uma conexão + commit por técnico) com a ingestão em lote.
+#
+#   python benchmarks/bench_ingest.py --rows 5000
+import argparse
+import datetime
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+import tecnicos  # noqa: E402
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tecnicos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    estado TEXT, nome TEXT, cpf TEXT, rg TEXT, telefone TEXT, outros TEXT, created_at TEXT
+);
+"""
+
+
+def make_lines(n):
+    return [f"Tecnico Numero {i} CPF {i % 1000:03d}.{i % 997:03d}.{i % 991:03d}-{i % 97:02d} "
+            f"RG: {i:08d} Tel (21) 9{i % 10000:04d}-{i % 9999:04d}" for i in range(n)]
+
+
+def per_row(path, lines):
+    # reproduz o insert_tecnico original: connect/insert/commit/close por registro
+    for line in lines:
+        p = tecnicos.parse_technician(line)
+        conn = sqlite3.connect(path)
+        conn.execute(tecnicos.INSERT_TECNICO_SQL,
+                     ("RJ", p["nome"], p["cpf"], p["rg"], p["telefone"], p["outros"],
+                      datetime.datetime.utcnow().isoformat()))
+        conn.commit()
+        conn.close()
+
+
+def bulk(path, lines):
+    tecnicos.ingest(db.get_connection(path), lines, default_estado="RJ")
+
+
+def run(name, fn, lines):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        conn = sqlite3.connect(path)
+        conn.executescript(SCHEMA)
+        tecnicos.init_cpf_index(conn)
+        conn.close()
+        t0 = time.perf_counter()
+        fn(path, lines)
+        elapsed = time.perf_counter() - t0
+        db.close_all()
+    print(f"{name:>8}: {len(lines)} linhas em {elapsed:.3f}s  ({len(lines) / elapsed:,.0f} linhas/s)")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=5000)
+    args = parser.parse_args()
+    lines = make_lines(args.rows)
+    t_row = run("por linha", per_row, lines)
+    t_bulk = run("lote", bulk, lines)
+    print(f"speedup: {t_row / t_bulk:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# benchmarks/bench_intents.py
+# Custo de classificação por mensagem: sequência antiga de regex (serve.py) x roteador
+# pré-compilado de intents.py. Também confere que os dois classificam igual.
+#
+#   python benchmarks/bench_intents.py --repeat 2000
+import argparse
+import os
+import random
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import intents  # noqa: E402
+
+
+def legacy_classify(user_msg):
+    # cópia da cadeia de if/regex que existia em serve.py:chat
+    low = user_msg.lower()
+    mdel = re.match(r"^\s*delete[:\s]+(.+)$", user_msg, re.IGNORECASE)
+    if mdel:
+        return "delete", mdel.group(1)
+    if re.search(r"\bguarde\b.*\bbanco\b", low) or low.startswith("guarde no banco") \
+            or low.startswith("guardar no banco") or low.startswith("guardar:"):
+        return "save", None
+    mq = re.search(r"\b(tecnic|t[eé]cnico|t[eé]cnicos)\b.*\bde\s+([A-Za-z]{1,3})\b", user_msg, re.IGNORECASE)
+    if mq:
+        return "query", mq.group(2)
+    return None, None
+
+
+def router_classify(router, user_msg):
+    intent, m = router.classify(user_msg)
+    if intent is None:
+        return None, None
+    arg = {"delete": "delete_target", "query": "query_estado"}.get(intent.name)
+    return intent.name, (m.group(arg) if arg else None)
+
+
+CHAT = [
+    "Oi Beka, tudo bem?",
+    "Pode me ajudar a escrever um e-mail formal para o cliente sobre o atraso na entrega?",
+    "Qual a diferença entre switch gerenciável e não gerenciável?",
+    "Me lembra amanhã de ligar para o fornecedor de cabos de rede.",
+    "Resuma em três tópicos o que conversamos sobre a migração do servidor de arquivos.",
+    "Quantos técnicos temos disponíveis hoje?",
+    "Obrigado pela ajuda de hoje!",
+    "Preciso de um roteiro de atendimento para chamados de impressora que não liga, "
+    "com perguntas de triagem, passos de diagnóstico e quando escalar para o segundo nível.",
+]
+COMMANDS = [
+    "DELETE Maicon",
+    "delete: João da Silva",
+    "Guarde no banco: técnicos de RJ: Carlos Souza CPF 123.456.789-00 Tel (21) 99999-1111; Ana Lima CPF 98765432100",
+    "guardar: Pedro Alves 111.222.333-44",
+    "técnicos de SP",
+    "Quais os tecnicos de MG?",
+    "me mostra os técnicos cadastrados de BA",
+]
+
+
+def make_corpus(n, seed=7):
+    rnd = random.Random(seed)
+    corpus = []
+    for _ in range(n):
+        r = rnd.random()
+        if r < 0.75:
+            corpus.append(rnd.choice(CHAT))
+        elif r < 0.95:
+            corpus.append(rnd.choice(COMMANDS))
+        else:
+            # bloco colado grande que não é comando
+            corpus.append(" ".join(rnd.choice(CHAT) for _ in range(40)))
+    return corpus
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    router = intents.build_command_router()
+    router.compile()
+    corpus = make_corpus(args.messages)
+
+    mismatches = [m for m in corpus if legacy_classify(m) != router_classify(router, m)]
+    if mismatches:
+        print(f"DIVERGÊNCIA em {len(mismatches)} mensagens, ex.: {mismatches[0][:80]!r}")
+        sys.exit(1)
+
+    groups = {"todas": corpus, "conversa (fallthrough)": [m for m in corpus if legacy_classify(m)[0] is None],
+              "comandos": [m for m in corpus if legacy_classify(m)[0] is not None]}
+    print(f"{'grupo':<24}{'legado µs/msg':>16}{'roteador µs/msg':>18}{'speedup':>10}")
+    for name, msgs in groups.items():
+        if not msgs:
+            continue
+        t_old = min(timeit.repeat(lambda: [legacy_classify(m) for m in msgs], number=1, repeat=args.repeat))
+        t_new = min(timeit.repeat(lambda: [router.classify(m) for m in msgs], number=1, repeat=args.repeat))
+        per_old = t_old / len(msgs) * 1e6
+        per_new = t_new / len(msgs) * 1e6
+        print(f"{name:<24}{per_old:>16.2f}{per_new:>18.2f}{per_old / per_new:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
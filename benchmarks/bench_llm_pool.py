@@ -0,0 +1,110 @@
+# benchmarks/bench_llm_pool.py
+# Pool de backends do LLM (llm_pool.py) contra várias instâncias de fake_llm.py:
+# um backend lento, um fora do ar e os demais normais.
+#
+#   python benchmarks/bench_llm_pool.py --instances 3 --requests 120 --concurrency 8
+#
+# Mostra a distribuição por backend (menos requisições em andamento), a ejeção do
+# backend morto, as novas tentativas e o efeito do hedge na cauda (p95/p99).
+import argparse
+import os
+import socket
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import llm_client  # noqa: E402
+import llm_pool  # noqa: E402
+from fake_llm import start_fake_llm  # noqa: E402
+
+MESSAGES = [{"role": "user", "content": "Qual é a previsão para amanhã?"}]
+
+
+def dead_url():
+    # porta que acabou de ser liberada: conexão recusada na hora
+    s = socket.socket()
+    s.bind(("127.0.0.1", 0))
+    port = s.getsockname()[1]
+    s.close()
+    return f"http://127.0.0.1:{port}/v1/chat/completions"
+
+
+def run(client, requests, concurrency):
+    latencies, errors = [], []
+    lock = threading.Lock()
+    counter = iter(range(requests))
+
+    def worker():
+        while True:
+            with lock:
+                if next(counter, None) is None:
+                    return
+            t0 = time.perf_counter()
+            try:
+                client.chat(MESSAGES, max_tokens=20)
+                elapsed = time.perf_counter() - t0
+                with lock:
+                    latencies.append(elapsed)
+            except llm_client.LLMError as e:
+                with lock:
+                    errors.append(str(e))
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, errors, time.perf_counter() - t0
+
+
+def pct(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] * 1000 if ordered else float("nan")
+
+
+def report(title, client, latencies, errors, total):
+    print(f"\n== {title}")
+    print(f"   {len(latencies)} ok, {len(errors)} erro(s) em {total:.1f}s  "
+          f"p50 {pct(latencies, 50):.0f} ms  p95 {pct(latencies, 95):.0f} ms  p99 {pct(latencies, 99):.0f} ms")
+    s = client.stats()
+    print(f"   novas tentativas {s['retries']}, hedges {s['hedged']}")
+    print(f"   {'backend':<22} {'reqs':>5} {'erros':>5} {'ejetado':>8} {'p50 ms':>8} {'p95 ms':>8} {'hedge(ganhou)':>14}")
+    for b in s["backends"]:
+        print(f"   {b['name']:<22} {b['requests']:>5} {b['errors']:>5} {str(b['ejected']):>8} "
+              f"{b['latency_p50_ms'] or 0:>8.0f} {b['latency_p95_ms'] or 0:>8.0f} "
+              f"{b['hedges']:>7}({b['hedge_wins']})")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--instances", type=int, default=3, help="instâncias saudáveis do LLM falso")
+    parser.add_argument("--requests", type=int, default=120)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--ttft", type=float, default=0.15)
+    parser.add_argument("--slow-ttft", type=float, default=1.0, help="TTFT do backend lento")
+    parser.add_argument("--max-in-flight", type=int, default=2, help="vagas por backend")
+    args = parser.parse_args()
+
+    urls = []
+    for i in range(args.instances):
+        ttft = args.slow_ttft if i == args.instances - 1 else args.ttft
+        _, url, _ = start_fake_llm(ttft=ttft, tps=200, tokens=20)
+        urls.append(url)
+    urls.append(dead_url())
+    print("backends:", ", ".join(urls), "(o último está fora do ar; o penúltimo é lento)")
+
+    for title, hedge in (("sem hedge", 0), ("com hedge (p90 recente)", 10_000)):
+        backends = [llm_pool.Backend(u, args.max_in_flight) for u in urls]
+        client = llm_client.LLMClient(backends=backends, max_queue=args.requests,
+                                      queue_timeout=120, hedge_max_prompt_tokens=hedge)
+        latencies, errors, total = run(client, args.requests, args.concurrency)
+        report(title, client, latencies, errors, total)
+
+
+if __name__ == "__main__":
+    main()
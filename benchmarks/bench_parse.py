@@ -0,0 +1,87 @@
+# benchmarks/bench_parse.py
+# parse_technician (linha a linha) x parse_technicians_batch (em lote, saída em colunas)
+# num corpus golden com as variações de formato que aparecem nos blocos colados/planilhas.
+# Falha se os dois caminhos divergirem em qualquer linha. O lote ainda é um laço por
+# linha (ver o comentário em tecnicos.py): espere ~1.5x, não uma ordem de grandeza.
+#
+#   python benchmarks/bench_parse.py --rows 100000
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tecnicos  # noqa: E402
+
+NOMES = ["Carlos Souza", "Ana Lima", "João da Silva", "Maicon Pereira", "Fernanda Dos Santos",
+         "Técnico Pedro", "DADOS DE Marcos", "Luís Otávio"]
+
+TEMPLATES = [
+    "{nome} CPF {cpf} RG: {rg} Tel {tel}",
+    "{nome} - {cpf} - {tel}",
+    "{nome}, cpf: {cpf_raw}, telefone {tel}",
+    "{nome} Tel: {tel}",
+    "{nome} RG {rg}",
+    "{nome}",
+    "{cpf} {nome}",
+    "CPF {cpf} {nome}",
+    "{tel} {nome} placa ABC-1234",
+    "DADOS TECNICOS DE RJ: {nome} {cpf}",
+    "{nome}: RG:{rg} ({ddd}) {num}",
+    "  {nome}  ;  {cpf}  ",
+    "",
+    # só rótulos / rótulo sem número
+    "RG",
+    "CPF",
+    "{nome} RG-",
+    "{nome} rg: .",
+    "CPF: {nome}",
+    "rG-d,Od:",
+]
+
+
+def make_corpus(n, seed=42):
+    rnd = random.Random(seed)
+    out = []
+    for _ in range(n):
+        cpf_raw = "".join(rnd.choice("0123456789") for _ in range(11))
+        cpf = f"{cpf_raw[:3]}.{cpf_raw[3:6]}.{cpf_raw[6:9]}-{cpf_raw[9:]}"
+        ddd = rnd.randint(11, 99)
+        num = f"9{rnd.randint(1000, 9999)}-{rnd.randint(1000, 9999)}"
+        out.append(rnd.choice(TEMPLATES).format(
+            nome=rnd.choice(NOMES), cpf=cpf, cpf_raw=cpf_raw, rg=f"{rnd.randint(1, 99)}.{rnd.randint(100, 999)}-{rnd.randint(0, 9)}",
+            tel=f"({ddd}) {num}", ddd=ddd, num=num))
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100000)
+    args = parser.parse_args()
+    lines = make_corpus(args.rows)
+
+    t0 = time.perf_counter()
+    golden = [tecnicos.parse_technician(l) for l in lines]
+    t_row = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    cols = tecnicos.parse_technicians_batch(lines)
+    t_batch = time.perf_counter() - t0
+
+    batch = tecnicos.batch_records(cols)
+    diffs = [(l, g, b) for l, g, b in zip(lines, golden, batch) if g != b]
+    if diffs:
+        l, g, b = diffs[0]
+        print(f"DIVERGÊNCIA em {len(diffs)} linhas; ex.: {l!r}\n  linha a linha: {g}\n  lote: {b}")
+        sys.exit(1)
+
+    print(f"{len(lines)} linhas, resultados idênticos")
+    print(f"linha a linha: {t_row:.3f}s ({len(lines) / t_row:,.0f} linhas/s)")
+    print(f"lote:          {t_batch:.3f}s ({len(lines) / t_batch:,.0f} linhas/s)")
+    print(f"speedup: {t_row / t_batch:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
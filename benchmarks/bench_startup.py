@@ -0,0 +1,80 @@
+# benchmarks/bench_startup.py
+# Partida a frio e memória por processo: importa cada app num interpretador novo e
+# mede o tempo de import e o pico de RSS. O modo "eager" pré-importa pandas e
+# openpyxl como o serve.py fazia no topo do módulo, para comparação.
+#
+#   python benchmarks/bench_startup.py --repeat 5
+#   python benchmarks/bench_startup.py --modules serve minha_ia
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ("pandas", "openpyxl", "numpy")
+
+PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+for name in {preload!r}:
+    __import__(name)
+import {module}
+elapsed = time.perf_counter() - t0
+import resource
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+if sys.platform == "darwin":
+    rss //= 1024  # bytes -> KB
+print(json.dumps({{"import_s": elapsed, "rss_kb": rss,
+                  "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def probe(module, preload, workdir):
+    env = dict(os.environ, PYTHONPATH=ROOT, DB_FILE=os.path.join(workdir, "backup.db"))
+    code = PROBE.format(module=module, preload=tuple(preload), heavy=HEAVY)
+    # stdin fechado: um input() no import falharia em vez de travar o benchmark
+    out = subprocess.run([sys.executable, "-c", code], cwd=workdir, env=env, stdin=subprocess.DEVNULL,
+                         capture_output=True, text=True, timeout=120)
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr.strip().splitlines()[-1] if out.stderr.strip() else "falhou")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--modules", nargs="+", default=["serve", "server", "beka_app"])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    available = [m for m in ("pandas", "openpyxl") if _importable(m)]
+    print(f"pré-import do modo eager: {', '.join(available) or '(pandas/openpyxl não instalados)'}\n")
+    print(f"{'módulo':<10} {'modo':<6} {'import ms':>10} {'RSS MB':>8}  pesados carregados")
+    with tempfile.TemporaryDirectory() as workdir:
+        for module in args.modules:
+            rows = {}
+            for mode, preload in (("eager", available), ("lazy", ())):
+                try:
+                    runs = [probe(module, preload, workdir) for _ in range(args.repeat)]
+                except Exception as e:
+                    print(f"{module:<10} {mode:<6} erro: {e}")
+                    break
+                t = statistics.median(r["import_s"] for r in runs) * 1000
+                rss = statistics.median(r["rss_kb"] for r in runs) / 1024
+                rows[mode] = (t, rss)
+                print(f"{module:<10} {mode:<6} {t:>10.1f} {rss:>8.1f}  {', '.join(runs[0]['heavy']) or '-'}")
+            if len(rows) == 2:
+                (te, re_), (tl, rl) = rows["eager"], rows["lazy"]
+                print(f"{'':<10} {'ganho':<6} {te / tl:>9.1f}x {re_ - rl:>7.1f} MB a menos")
+
+
+def _importable(name):
+    import importlib.util
+
+    return importlib.util.find_spec(name) is not None
+
+
+if __name__ == "__main__":
+    main()
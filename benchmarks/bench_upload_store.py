@@ -0,0 +1,78 @@
+# benchmarks/bench_upload_store.py
+# Planilha XLSX lida do original (openpyxl, como antes) x do cache de upload_store.py,
+# mais o custo de reenviar o mesmo arquivo (só o sha256, sem ler a planilha).
+# Falha se o cache devolver linhas diferentes das do original.
+#
+#   python benchmarks/bench_upload_store.py --rows 50000
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import importer  # noqa: E402
+import upload_store  # noqa: E402
+
+
+def make_xlsx(path, rows):
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("tecnicos")
+    ws.append(["Estado", "Nome", "CPF", "RG", "Telefone", "Cidade"])
+    for i in range(rows):
+        ws.append(["SP", f"Técnico {i}", f"{i:011d}", i * 7, f"(11) 9{i:08d}", "São Paulo"])
+    wb.save(path)
+
+
+def read_all(chunks):
+    out = []
+    for _, rows in chunks:
+        out.extend(tuple(importer._cell(v) for v in r) for r in rows)
+    return out
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=50_000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_uploads_")
+    try:
+        src = os.path.join(workdir, "tecnicos.xlsx")
+        make_xlsx(src, args.rows)
+        store = upload_store.UploadStore(os.path.join(workdir, "uploads"), os.path.join(workdir, "bench.db"))
+        print(f"{args.rows} linhas, {os.path.getsize(src) / 1e6:.1f} MB, cache em {upload_store.CACHE_FORMAT}")
+
+        original, t_xlsx = timed(lambda: read_all(importer.iter_chunks(src)))
+        with open(src, "rb") as f:
+            (sha, _), t_save = timed(lambda: store.save(f, "tecnicos.xlsx"))
+        (meta, _), t_build = timed(lambda: store.ensure_cache(sha))
+        cached, t_cache = timed(lambda: read_all(store.iter_chunks(sha)))
+        with open(src, "rb") as f:
+            _, t_resave = timed(lambda: store.save(f, "tecnicos.xlsx"))
+        _, t_preview = timed(lambda: store.preview(sha))
+
+        if cached != original:
+            sys.exit("ERRO: o cache devolveu linhas diferentes do XLSX")
+        print(f"  ler o XLSX (openpyxl)        {t_xlsx * 1000:9.1f} ms")
+        print(f"  1º upload: gravar + sha256   {t_save * 1000:9.1f} ms")
+        print(f"  1º upload: montar cache      {t_build * 1000:9.1f} ms  ({meta['cache_size'] / 1e6:.1f} MB)")
+        print(f"  ler do cache                 {t_cache * 1000:9.1f} ms  ({t_xlsx / t_cache:.1f}x)")
+        print(f"  reenvio idêntico             {t_resave * 1000:9.1f} ms")
+        print(f"  prévia (5 linhas)            {t_preview * 1000:9.1f} ms")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# benchmarks/bench_write_queue.py
+# Latência de quem grava uma mensagem: INSERT + commit no request (direct) x fila
+# com gravação em lote (async) x group commit (group), com várias threads.
+#
+#   python benchmarks/bench_write_queue.py --threads 8 --rows 2000
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+import write_queue  # noqa: E402
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversas (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    role TEXT, content TEXT, created_at TEXT, kind TEXT NOT NULL DEFAULT 'text', meta TEXT
+)
+"""
+INSERT = "INSERT INTO conversas (role, content, created_at, kind, meta) VALUES (?, ?, ?, ?, ?)"
+
+
+def run(mode, path, threads, rows):
+    q = write_queue.WriteQueue(path, INSERT, durability=mode)
+    latencies = []
+    lock = threading.Lock()
+
+    def writer(k):
+        local = []
+        for i in range(rows):
+            row = ("user", f"mensagem {k}-{i} " + "x" * 200, "2024-01-01T00:00:00", "text", None)
+            t0 = time.perf_counter()
+            q.put(row)
+            local.append(time.perf_counter() - t0)
+        db.release_connections()
+        with lock:
+            latencies.extend(local)
+
+    t0 = time.perf_counter()
+    ts = [threading.Thread(target=writer, args=(k,)) for k in range(threads)]
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+    q.flush()
+    total = time.perf_counter() - t0
+    q.close()
+    latencies.sort()
+    pct = lambda p: latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] * 1e6  # noqa: E731
+    print(f"{mode:<7} {len(latencies) / total:>10,.0f} linhas/s   "
+          f"p50 {pct(50):>8.1f} µs   p99 {pct(99):>9.1f} µs   lotes {q.stats()['batches']}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--rows", type=int, default=2000, help="mensagens por thread")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in ("direct", "group", "async"):
+            path = os.path.join(tmp, f"{mode}.db")
+            conn = db.get_connection(path)
+            conn.execute(SCHEMA)
+            conn.commit()
+            run(mode, path, args.threads, args.rows)
+        db.close_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+# benchmarks/fake_llm.py
+# Servidor falso compatível com /v1/chat/completions (OpenAI/LM Studio), só stdlib.
+#
+# Simula a latência até o primeiro token e a velocidade de geração, com ou sem
+# stream=True, e devolve "usage". Serve para medir as apps sem LM Studio:
+#
+#   python benchmarks/fake_llm.py --port 1234 --ttft 0.3 --tps 40 --tokens 80
+#   LLM_URL=http://127.0.0.1:1234/v1/chat/completions python serve.py
+#
+# --instances N sobe N servidores em portas seguidas (pool de backends, ver llm_pool.py).
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = ("claro", "posso", "ajudar", "com", "isso", "agora", "vamos", "ver", "os",
+         "detalhes", "do", "seu", "pedido", "e", "seguir", "em", "frente")
+
+
+class FakeLLMConfig:
+    def __init__(self, ttft=0.2, tps=50.0, tokens=60, fail_rate=0.0):
+        self.ttft = ttft          # segundos até o primeiro token
+        self.tps = tps            # tokens por segundo depois do primeiro
+        self.tokens = tokens      # tamanho da resposta
+        self.fail_rate = fail_rate
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+
+def _make_handler(cfg):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, como o requests.Session espera
+
+        def log_message(self, *args):
+            pass
+
+        def _json(self, status, body):
+            raw = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(raw)))
+            self.end_headers()
+            self.wfile.write(raw)
+
+        def do_GET(self):
+            if self.path.rstrip("/").endswith("/models"):
+                return self._json(200, {"data": [{"id": "fake-llm"}]})
+            if self.path == "/stats":
+                with cfg.lock:
+                    return self._json(200, {"requests": cfg.requests, "in_flight": cfg.in_flight,
+                                            "max_in_flight": cfg.max_in_flight})
+            self._json(404, {"error": "not found"})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                body = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                return self._json(400, {"error": "invalid json"})
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                return self._json(404, {"error": "not found"})
+
+            with cfg.lock:
+                cfg.requests += 1
+                n = cfg.requests
+                cfg.in_flight += 1
+                cfg.max_in_flight = max(cfg.max_in_flight, cfg.in_flight)
+            try:
+                if cfg.fail_rate and (n * 7919 % 1000) / 1000 < cfg.fail_rate:
+                    return self._json(500, {"error": "falha simulada"})
+                prompt_tokens = sum(len(m.get("content") or "") for m in body.get("messages", [])) // 4
+                words = [WORDS[(n + i) % len(WORDS)] for i in range(cfg.tokens)]
+                usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(words),
+                         "total_tokens": prompt_tokens + len(words)}
+                time.sleep(cfg.ttft)
+                if body.get("stream"):
+                    self._stream(words, usage)
+                else:
+                    time.sleep(max(0, len(words) - 1) / cfg.tps if cfg.tps else 0)
+                    self._json(200, {
+                        "id": f"fake-{n}", "object": "chat.completion", "model": body.get("model"),
+                        "choices": [{"index": 0, "finish_reason": "stop",
+                                     "message": {"role": "assistant", "content": " ".join(words)}}],
+                        "usage": usage,
+                    })
+            finally:
+                with cfg.lock:
+                    cfg.in_flight -= 1
+
+        def _stream(self, words, usage):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            def chunk(data):
+                raw = f"data: {data}\n\n".encode("utf-8")
+                self.wfile.write(f"{len(raw):x}\r\n".encode() + raw + b"\r\n")
+                self.wfile.flush()
+
+            try:
+                for i, w in enumerate(words):
+                    if i and cfg.tps:
+                        time.sleep(1 / cfg.tps)
+                    delta = {"choices": [{"index": 0, "delta": {"content": (" " if i else "") + w}}]}
+                    chunk(json.dumps(delta))
+                chunk(json.dumps({"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                                  "usage": usage}))
+                chunk("[DONE]")
+                self.wfile.write(b"0\r\n\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # cliente desistiu no meio do stream
+
+    return Handler
+
+
+def start_fake_llm(host="127.0.0.1", port=0, **config):
+    """Sobe o servidor numa thread daemon. Retorna (server, url, cfg)."""
+    cfg = FakeLLMConfig(**config)
+    server = ThreadingHTTPServer((host, port), _make_handler(cfg))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name="fake-llm").start()
+    url = f"http://{host}:{server.server_address[1]}/v1/chat/completions"
+    return server, url, cfg
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM falso compatível com a API da OpenAI")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1234)
+    parser.add_argument("--instances", type=int, default=1)
+    parser.add_argument("--ttft", type=float, default=0.2, help="segundos até o 1º token")
+    parser.add_argument("--tps", type=float, default=50.0, help="tokens por segundo")
+    parser.add_argument("--tokens", type=int, default=60, help="tokens por resposta")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fração de respostas 500")
+    args = parser.parse_args()
+
+    urls = []
+    for i in range(args.instances):
+        _, url, _ = start_fake_llm(args.host, args.port + i, ttft=args.ttft, tps=args.tps,
+                                   tokens=args.tokens, fail_rate=args.fail_rate)
+        urls.append(url)
+        print(f"LLM falso em {url}")
+    if len(urls) > 1:
+        print(f"\nLLM_URLS={','.join(urls)}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+# benchmarks/load_test.py
+# Teste de carga das apps (serve, server, beka_app) contra o LLM falso de fake_llm.py.
+#
+# Sobe o LLM falso e a app num diretório temporário (bancos novos, nada do seu
+# beka.db/backup.db é tocado), semeia dados e dispara N sessões simultâneas com
+# uma mistura de operações durante --duration segundos. Mostra p50/p95/p99 e
+# req/s por operação e grava tudo em JSON para comparar com uma execução anterior:
+#
+#   python benchmarks/load_test.py --app serve --sessions 16 --duration 30 --out base.json
+#   python benchmarks/load_test.py --app serve --sessions 16 --duration 30 --compare base.json
+#
+#   --mix command=3,search=3,llm=2,upload=1     pesos das operações
+#   --ttft/--tps/--tokens                        comportamento do LLM falso
+import argparse
+import datetime
+import importlib
+import json
+import math
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_llm import start_fake_llm  # noqa: E402
+
+ESTADOS = ("RJ", "SP", "MG", "BA", "PR", "RS")
+NOMES = ("Silva", "Souza", "Oliveira", "Santos", "Pereira", "Costa", "Almeida", "Ferreira")
+ASSUNTOS = ("viagem para o Rio", "manutenção do ar-condicionado", "reunião de segunda",
+            "lista de compras", "técnicos de campo", "orçamento do mês", "aniversário da Ana")
+
+DEFAULT_MIX = {
+    "serve": "command=3,search=3,llm=2,llm_stream=1,upload=1",
+    "server": "llm=2,llm_stream=1,memory=3,lembrar=2,registrar=2",
+    "beka_app": "save=3,memory=3,lembrar=2",
+}
+
+
+# ----------------- HTTP -----------------
+def _request(base, method, path, body=None, files=None, headers=None):
+    headers = dict(headers or {})
+    data = None
+    if files:
+        boundary = uuid.uuid4().hex
+        parts = []
+        for name, value in (body or {}).items():
+            parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+        for name, (filename, content) in files.items():
+            parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; '
+                         f'filename="{filename}"\r\nContent-Type: text/csv\r\n\r\n'.encode() + content + b"\r\n")
+        parts.append(f"--{boundary}--\r\n".encode())
+        data = b"".join(parts)
+        headers["Content-Type"] = f"multipart/form-data; boundary={boundary}"
+    elif body is not None:
+        data = json.dumps(body).encode("utf-8")
+        headers["Content-Type"] = "application/json"
+    req = urllib.request.Request(base + path, data=data, method=method, headers=headers)
+    try:
+        with urllib.request.urlopen(req, timeout=120) as resp:
+            resp.read()  # corpo inteiro (streams SSE incluídos)
+            return resp.status
+    except urllib.error.HTTPError as e:
+        e.read()
+        return e.code
+
+
+def _csv(rows, seed):
+    lines = ["nome;cpf;telefone;estado"]
+    for i in range(rows):
+        n = seed * 1000 + i
+        lines.append(f"Tecnico {NOMES[n % len(NOMES)]} {n};{n % 1000:03d}.{n % 997:03d}.{n % 991:03d}-{n % 97:02d};"
+                     f"(21) 9{n % 10000:04d}-{n % 9999:04d};{ESTADOS[n % len(ESTADOS)]}")
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+# ----------------- Operações por app -----------------
+def ops_serve(rng, session):
+    n = rng.randrange(1_000_000)
+    return {
+        "command": lambda: ("POST", "/chat", {"message": rng.choice(
+            [f"técnicos de {rng.choice(ESTADOS)}", f"DELETE Ninguem {n}",
+             f"Guarde no banco {rng.choice(ESTADOS)}: Tecnico Carga {n} CPF 123.456.789-{n % 97:02d}"])}, None),
+        "search": lambda: ("GET", f"/technicians/search?q={rng.choice(NOMES)}&limit=20", None, None),
+        "llm": lambda: ("POST", "/chat", {"message": f"fale sobre {rng.choice(ASSUNTOS)} {n}", "cache": False}, None),
+        "llm_stream": lambda: ("POST", "/chat/stream", {"message": f"me ajude com {rng.choice(ASSUNTOS)} {n}",
+                                                        "cache": False}, None),
+        "upload": lambda: ("POST", "/upload", {"import": rng.choice(["0", "1"])},
+                           {"file": (f"carga_{session}_{n}.csv", _csv(200, n % 50))}),
+    }
+
+
+def ops_server(rng, session):
+    sid = f"bench-{session}"
+    n = rng.randrange(1_000_000)
+    return {
+        "llm": lambda: ("POST", "/chat", {"session_id": sid, "message": f"fale sobre {rng.choice(ASSUNTOS)} {n}"}, None),
+        "llm_stream": lambda: ("POST", "/chat/stream", {"session_id": sid,
+                                                        "message": f"me ajude com {rng.choice(ASSUNTOS)} {n}"}, None),
+        "memory": lambda: ("GET", f"/get_memory?session_id={sid}&limit=50", None, None),
+        "lembrar": lambda: ("GET", f"/lembrar?mensagem={urllib.request.quote(rng.choice(ASSUNTOS))}&k=5", None, None),
+        "registrar": lambda: ("POST", "/registrar", {"session_id": sid, "role": "user",
+                                                     "content": f"lembrete {n}: {rng.choice(ASSUNTOS)}"}, None),
+    }
+
+
+def ops_beka_app(rng, session):
+    n = rng.randrange(1_000_000)
+    return {
+        "save": lambda: ("POST", "/save_message", {"role": "user", "content": f"nota {n}: {rng.choice(ASSUNTOS)}"}, None),
+        "memory": lambda: ("GET", "/get_memory?limit=50", None, None),
+        "lembrar": lambda: ("GET", f"/lembrar?mensagem={urllib.request.quote(rng.choice(ASSUNTOS))}&k=5", None, None),
+    }
+
+
+OPS = {"serve": ops_serve, "server": ops_server, "beka_app": ops_beka_app}
+
+
+# ----------------- Preparação -----------------
+def seed_data(module, app_name, rows):
+    if app_name == "serve":
+        import tecnicos
+        lines = [f"Tecnico {NOMES[i % len(NOMES)]} {i} CPF {i % 1000:03d}.{i % 997:03d}.{i % 991:03d}-{i % 97:02d} "
+                 f"Tel (21) 9{i % 10000:04d}-{i % 9999:04d}" for i in range(rows)]
+        for i in range(0, rows, 5000):
+            tecnicos.ingest(module.get_conn(), lines[i:i + 5000], default_estado=ESTADOS[(i // 5000) % len(ESTADOS)])
+    elif app_name == "server":
+        for i in range(rows):
+            module.salvar_mensagem_db(f"bench-{i % 16}", "user" if i % 2 == 0 else "assistant",
+                                      f"mensagem antiga {i} sobre {ASSUNTOS[i % len(ASSUNTOS)]}")
+    else:
+        for i in range(rows):
+            module.save_to_db("user" if i % 2 == 0 else "assistant", f"memória {i}: {ASSUNTOS[i % len(ASSUNTOS)]}")
+    import db
+    db.release_connections()
+
+
+def start_app(app_name, seed_rows):
+    module = importlib.import_module(app_name)
+    if hasattr(module, "init_db"):
+        module.init_db()
+    seed_data(module, app_name, seed_rows)
+    from werkzeug.serving import make_server
+
+    server = make_server("127.0.0.1", 0, module.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True, name="app").start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+# ----------------- Execução -----------------
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    # nearest-rank
+    k = max(0, math.ceil(p / 100 * len(sorted_values)) - 1)
+    return sorted_values[k]
+
+
+def run_load(base, app_name, mix, sessions, duration, seed):
+    samples = {name: [] for name in mix}
+    errors = {name: 0 for name in mix}
+    rejected = {name: 0 for name in mix}  # 503 do controle de admissão do LLM
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+    names = list(mix)
+    weights = [mix[n] for n in names]
+
+    def session(idx):
+        rng = random.Random(seed * 1000 + idx)
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, weights)[0]
+            ops = OPS[app_name](rng, idx)
+            method, path, body, files = ops[name]()
+            t0 = time.perf_counter()
+            try:
+                status = _request(base, method, path, body, files)
+            except Exception:
+                status = 0
+            elapsed = time.perf_counter() - t0
+            with lock:
+                if status == 503:
+                    rejected[name] += 1
+                elif status == 0 or status >= 500:
+                    errors[name] += 1
+                else:
+                    samples[name].append(elapsed)
+
+    threads = [threading.Thread(target=session, args=(i,), daemon=True) for i in range(sessions)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+
+    def summary(values, n_err, n_rej):
+        values = sorted(values)
+        ms = lambda v: round(v * 1000, 2) if v is not None else None  # noqa: E731
+        return {
+            "count": len(values), "errors": n_err, "rejected": n_rej,
+            "rps": round(len(values) / wall, 2),
+            "p50_ms": ms(percentile(values, 50)), "p95_ms": ms(percentile(values, 95)),
+            "p99_ms": ms(percentile(values, 99)), "max_ms": ms(values[-1] if values else None),
+        }
+
+    ops = {n: summary(samples[n], errors[n], rejected[n]) for n in names}
+    total = summary([v for n in names for v in samples[n]], sum(errors.values()), sum(rejected.values()))
+    return ops, total, wall
+
+
+def compare(result, baseline_path, tolerance):
+    with open(baseline_path, encoding="utf-8") as f:
+        base = json.load(f)
+    regressions = []
+    print(f"\ncomparação com {baseline_path} ({base['meta'].get('timestamp')}):")
+    for name, cur in {**result["ops"], "total": result["total"]}.items():
+        old = base["ops"].get(name) if name != "total" else base.get("total")
+        if not old or not old.get("p95_ms") or not cur.get("p95_ms"):
+            continue
+        ratio = cur["p95_ms"] / old["p95_ms"]
+        flag = "  ⚠️ REGRESSÃO" if ratio > tolerance else ""
+        print(f"  {name:<12} p95 {old['p95_ms']:>9.2f} → {cur['p95_ms']:>9.2f} ms ({ratio:.2f}x)  "
+              f"req/s {old['rps']:>7.2f} → {cur['rps']:>7.2f}{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga das apps da Beka com LLM falso")
+    parser.add_argument("--app", choices=sorted(OPS), default="serve")
+    parser.add_argument("--sessions", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--mix", default=None, help="ex.: command=3,search=3,llm=2")
+    parser.add_argument("--seed-rows", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--ttft", type=float, default=0.3)
+    parser.add_argument("--tps", type=float, default=40.0)
+    parser.add_argument("--tokens", type=int, default=60)
+    parser.add_argument("--out", help="grava o resultado em JSON (baseline)")
+    parser.add_argument("--compare", help="JSON de uma execução anterior")
+    parser.add_argument("--tolerance", type=float, default=1.2, help="p95 novo/antigo acima disso = regressão")
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix or DEFAULT_MIX[args.app])
+    unknown = set(mix) - set(OPS[args.app](random.Random(0), 0))
+    if unknown:
+        parser.error(f"operações desconhecidas para {args.app}: {', '.join(sorted(unknown))}")
+
+    here = os.getcwd()
+    _, llm_url, llm_cfg = start_fake_llm(ttft=args.ttft, tps=args.tps, tokens=args.tokens)
+    os.environ["LLM_URL"] = llm_url
+    workdir = tempfile.mkdtemp(prefix="beka-load-")
+    os.chdir(workdir)  # beka.db, backup.db, uploads/ e journals ficam aqui
+    os.environ["DB_FILE"] = os.path.join(workdir, "backup.db")
+
+    print(f"{args.app}: semeando {args.seed_rows} linhas em {workdir} ...")
+    server, base = start_app(args.app, args.seed_rows)
+    print(f"{args.sessions} sessões por {args.duration:g}s, mix {mix}, LLM falso ttft={args.ttft}s tps={args.tps:g}")
+    ops, total, wall = run_load(base, args.app, mix, args.sessions, args.duration, args.seed)
+    server.shutdown()
+
+    print(f"\n{'operação':<12} {'n':>6} {'erros':>6} {'503':>5} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, s in {**ops, "total": total}.items():
+        fmt = lambda v: f"{v:>9.2f}" if v is not None else f"{'-':>9}"  # noqa: E731
+        print(f"{name:<12} {s['count']:>6} {s['errors']:>6} {s['rejected']:>5} {s['rps']:>8.2f} "
+              f"{fmt(s['p50_ms'])} {fmt(s['p95_ms'])} {fmt(s['p99_ms'])}")
+
+    result = {
+        "meta": {
+            "app": args.app, "sessions": args.sessions, "duration_s": round(wall, 2), "mix": mix,
+            "seed_rows": args.seed_rows, "seed": args.seed,
+            "llm": {"ttft": args.ttft, "tps": args.tps, "tokens": args.tokens,
+                    "requests": llm_cfg.requests, "max_in_flight": llm_cfg.max_in_flight},
+            "python": platform.python_version(), "platform": platform.platform(),
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        },
+        "ops": ops,
+        "total": total,
+    }
+    if args.out:
+        out = os.path.join(here, args.out)
+        with open(out, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"\nresultado salvo em {out}")
+    if args.compare:
+        if compare(result, os.path.join(here, args.compare), args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
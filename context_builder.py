@@ -0,0 +1,197 @@
+# context_builder.py
+# Monta o contexto enviado ao modelo em server.py respeitando um orçamento de tokens.
+#
+# Mantém as mensagens mais recentes da sessão na íntegra e substitui as antigas por
+# um resumo incremental guardado em session_summaries. O resumo é atualizado em
+# segundo plano: cada mensagem antiga é resumida uma única vez (junto com o resumo
+# anterior) e depois nunca mais é reenviada ao modelo.
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import db
+import llm_client
+import retrieval
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+SUMMARY_MIN_MESSAGES = int(os.getenv("SUMMARY_MIN_MESSAGES", "6"))
+SUMMARY_BATCH_TOKENS = int(os.getenv("SUMMARY_BATCH_TOKENS", "2500"))
+SUMMARY_MAX_TOKENS = 300
+RECENT_SCAN_LIMIT = 200  # nunca varre mais que isso para montar o contexto
+
+SUMMARY_PROMPT = (
+    "Resuma a conversa abaixo entre o usuário e a Beka em português, em no máximo "
+    "10 frases curtas. Preserve nomes, fatos, pedidos pendentes e preferências do "
+    "usuário. Se houver um resumo anterior, integre-o ao novo resumo."
+)
+
+log = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="resumo")
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+def estimate_tokens(text):
+    # aproximação barata (~4 caracteres por token) + overhead por mensagem
+    return len(text or "") // 4 + 4
+
+
+def init_context_tables(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS session_summaries (
+            session_id TEXT PRIMARY KEY,
+            summary TEXT NOT NULL,
+            last_message_id INTEGER NOT NULL,
+            updated_at TEXT
+        )
+    ''')
+    conn.commit()
+
+
+def get_summary(conn, session_id):
+    row = conn.execute(
+        "SELECT summary, last_message_id FROM session_summaries WHERE session_id = ?",
+        (session_id,),
+    ).fetchone()
+    return (row[0], row[1]) if row else ("", 0)
+
+
+def clear_summary(conn, session_id):
+    conn.execute("DELETE FROM session_summaries WHERE session_id = ?", (session_id,))
+    conn.commit()
+
+
+def build_context(db_path, session_id, system_prompt, user_message, budget=CONTEXT_TOKEN_BUDGET,
+                  memories=(), pending=(), cache=None):
+    """Retorna o histórico (resumo + memórias + turnos recentes) que cabe no orçamento.
+
+    `memories` são trechos recuperados por retrieval.py; os que já estão entre os
+    turnos recentes são descartados. `pending` são as mensagens mais novas que ainda
+    estão na fila de gravação (write_queue.py), da mais antiga para a mais nova.
+    Com `cache` (history_cache.HistoryCache) uma sessão já carregada não lê o banco;
+    numa falta, o que foi lido do banco + `pending` vira a cauda da sessão na cache.
+    Se sobrarem mensagens antigas fora do orçamento e ainda não resumidas, agenda o
+    resumo incremental em segundo plano.
+    """
+    cached = cache.get(session_id) if cache is not None else None
+    if cached is not None:
+        summary, last_id, rows = cached
+        rows = [r for r in rows if r[0] is None or r[0] > last_id]
+    else:
+        conn = db.get_connection(db_path)
+        summary, last_id = get_summary(conn, session_id)
+        rows = conn.execute(
+            "SELECT id, role, content FROM chat_history WHERE session_id = ? AND id > ? "
+            "ORDER BY id DESC LIMIT ?",
+            (session_id, last_id, RECENT_SCAN_LIMIT),
+        ).fetchall()
+        rows.reverse()
+        rows.extend((None, m["role"], m["content"]) for m in pending)
+        if cache is not None:
+            cache.load(session_id, summary, last_id, rows)
+
+    remaining = budget - estimate_tokens(system_prompt) - estimate_tokens(user_message)
+    if summary:
+        remaining -= estimate_tokens(summary)
+    if memories:
+        remaining -= estimate_tokens(retrieval.format_memories(memories))
+
+    recent = []
+    full = False
+    overflow_id = None
+    overflow_count = 0
+    for _id, role, content in reversed(rows):
+        cost = estimate_tokens(content)
+        if not full and cost <= remaining:
+            recent.append({"role": role, "content": content})
+            remaining -= cost
+            continue
+        # daqui para trás nada mais cabe: vai para o resumo (só o que já está no banco)
+        full = True
+        if _id is None:
+            continue
+        if overflow_id is None:
+            overflow_id = _id
+        overflow_count += 1
+    recent.reverse()
+
+    if overflow_id is not None and overflow_count >= SUMMARY_MIN_MESSAGES:
+        schedule_summary(db_path, session_id, upto_id=overflow_id, cache=cache)
+
+    historico = []
+    if summary:
+        historico.append({"role": "system", "content": f"Resumo da conversa até aqui: {summary}"})
+    lembrancas = retrieval.format_memories(retrieval.exclude_seen(memories, recent))
+    if lembrancas:
+        historico.append({"role": "system", "content": lembrancas})
+    return historico + recent
+
+
+# ----------------- Resumo incremental -----------------
+def schedule_summary(db_path, session_id, upto_id, cache=None):
+    with _pending_lock:
+        if session_id in _pending:
+            return
+        _pending.add(session_id)
+    _executor.submit(_summarize_job, db_path, session_id, upto_id, cache)
+
+
+def _summarize_job(db_path, session_id, upto_id, cache=None):
+    try:
+        summarize(db_path, session_id, upto_id, cache)
+    except llm_client.LLMError:
+        pass  # modelo ocupado/indisponível: tenta de novo num próximo turno
+    except Exception:
+        # roda no executor: sem isto o erro some junto com o Future descartado
+        log.exception("Falha ao resumir a sessão %s", session_id)
+    finally:
+        with _pending_lock:
+            _pending.discard(session_id)
+        db.release_connections()
+
+
+def summarize(db_path, session_id, upto_id, cache=None):
+    """Dobra as mensagens (last_message_id, upto_id] no resumo da sessão, em lotes."""
+    conn = db.get_connection(db_path)
+    while True:
+        summary, last_id = get_summary(conn, session_id)
+        rows = conn.execute(
+            "SELECT id, role, content FROM chat_history WHERE session_id = ? AND id > ? AND id <= ? "
+            "ORDER BY id ASC",
+            (session_id, last_id, upto_id),
+        )
+        batch, tokens = [], 0
+        for _id, role, content in rows:
+            cost = estimate_tokens(content)
+            if batch and tokens + cost > SUMMARY_BATCH_TOKENS:
+                break
+            batch.append((_id, role, content))
+            tokens += cost
+        if not batch:
+            return summary
+
+        transcript = "\n".join(
+            f"{'Usuário' if role == 'user' else 'Beka'}: {content}" for _, role, content in batch
+        )
+        if summary:
+            transcript = f"Resumo anterior: {summary}\n\nNovas mensagens:\n{transcript}"
+        new_summary = llm_client.get_client().chat(
+            [{"role": "system", "content": SUMMARY_PROMPT}, {"role": "user", "content": transcript}],
+            max_tokens=SUMMARY_MAX_TOKENS, temperature=0.2,
+        )
+        if not new_summary:
+            return summary
+        with conn:
+            conn.execute('''
+                INSERT INTO session_summaries (session_id, summary, last_message_id, updated_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(session_id) DO UPDATE SET
+                    summary = excluded.summary,
+                    last_message_id = excluded.last_message_id,
+                    updated_at = excluded.updated_at
+            ''', (session_id, new_summary.strip(), batch[-1][0], datetime.now().isoformat()))
+        if cache is not None:
+            cache.set_summary(session_id, new_summary.strip(), batch[-1][0])
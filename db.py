@@ -0,0 +1,197 @@
+# db.py
+# Camada de conexão SQLite compartilhada por serve.py, server.py e beka_app.py
+#
+# Cada thread de trabalho mantém uma conexão de longa duração por arquivo de banco
+# (WAL + pragmas ajustados + cache de statements preparados). Quando a thread
+# termina o request, a conexão volta para um pool de ociosas e é reaproveitada
+# pela próxima thread — assim o servidor de desenvolvimento do Flask, que cria uma
+# thread por request, também deixa de pagar o custo de abrir o banco a cada chamada.
+# execute/fetch/commit contam na etapa "db" de metrics.py.
+#
+# row_factory nunca é alterado na conexão compartilhada (outro código da mesma thread
+# receberia linhas num formato inesperado): get_connection(path, sqlite3.Row) devolve
+# a mesma conexão embrulhada em RowFactoryConnection, que só aplica o row_factory nos
+# cursores que ela cria.
+import atexit
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import metrics
+
+BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+STATEMENT_CACHE = int(os.getenv("DB_STATEMENT_CACHE", "256"))
+MAX_IDLE = int(os.getenv("DB_MAX_IDLE", "16"))
+
+PRAGMAS = (
+    # só vale para bancos novos (antes da 1ª tabela); os antigos mudam com
+    # `python retention.py run --full-vacuum`
+    "PRAGMA auto_vacuum=INCREMENTAL",
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",     # seguro com WAL, evita fsync a cada commit
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",      # ~16 MB de page cache por conexão
+    "PRAGMA mmap_size=134217728",    # 128 MB
+    "PRAGMA foreign_keys=ON",
+    f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}",
+)
+
+class TimedCursor(sqlite3.Cursor):
+    def execute(self, *args):
+        with metrics.span("db"):
+            return super().execute(*args)
+
+    def executemany(self, *args):
+        with metrics.span("db"):
+            return super().executemany(*args)
+
+    def executescript(self, *args):
+        with metrics.span("db"):
+            return super().executescript(*args)
+
+    def fetchone(self):
+        with metrics.span("db"):
+            return super().fetchone()
+
+    def fetchmany(self, *args):
+        with metrics.span("db"):
+            return super().fetchmany(*args)
+
+    def fetchall(self):
+        with metrics.span("db"):
+            return super().fetchall()
+
+
+class TimedConnection(sqlite3.Connection):
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    # via cursor(): o fetch do resultado também é medido
+    def execute(self, *args):
+        return self.cursor().execute(*args)
+
+    def executemany(self, *args):
+        return self.cursor().executemany(*args)
+
+    def commit(self):
+        with metrics.span("db"):
+            return super().commit()
+
+
+class RowFactoryConnection:
+    """A conexão da thread, com `row_factory` aplicado só aos cursores criados aqui."""
+
+    __slots__ = ("_conn", "row_factory")
+
+    def __init__(self, conn, row_factory):
+        self._conn = conn
+        self.row_factory = row_factory
+
+    def cursor(self, *args):
+        cur = self._conn.cursor(*args)
+        cur.row_factory = self.row_factory
+        return cur
+
+    def execute(self, *args):
+        return self.cursor().execute(*args)
+
+    def executemany(self, *args):
+        return self.cursor().executemany(*args)
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._conn.__exit__(*exc)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+_local = threading.local()
+_lock = threading.Lock()
+_idle = {}       # path -> [conexões ociosas]
+_all = set()     # todas as conexões abertas, para fechar no shutdown
+
+
+def _open(path):
+    conn = sqlite3.connect(
+        path,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        check_same_thread=False,
+        cached_statements=STATEMENT_CACHE,
+        factory=TimedConnection,
+    )
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    with _lock:
+        _all.add(conn)
+    return conn
+
+
+def get_connection(path, row_factory=None):
+    """Retorna a conexão da thread atual para `path`, abrindo/reaproveitando se preciso."""
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(path)
+    if conn is None:
+        with _lock:
+            pool = _idle.get(path)
+            conn = pool.pop() if pool else None
+        if conn is None:
+            conn = _open(path)
+        conns[path] = conn
+    return RowFactoryConnection(conn, row_factory) if row_factory else conn
+
+
+def release_connections():
+    """Devolve as conexões da thread atual ao pool (chamar no teardown do request)."""
+    conns = getattr(_local, "conns", None)
+    if not conns:
+        return
+    for path, conn in conns.items():
+        if conn.in_transaction:
+            conn.rollback()
+        with _lock:
+            pool = _idle.setdefault(path, [])
+            if len(pool) < MAX_IDLE:
+                pool.append(conn)
+                continue
+            _all.discard(conn)
+        conn.close()
+    conns.clear()
+
+
+@contextmanager
+def transaction(path, row_factory=None):
+    """Executa o bloco dentro de uma transação explícita (commit/rollback automáticos)."""
+    conn = get_connection(path, row_factory)
+    with conn:
+        yield conn
+
+
+def close_all():
+    with _lock:
+        conns = list(_all)
+        _all.clear()
+        _idle.clear()
+    for conn in conns:
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+    if getattr(_local, "conns", None):
+        _local.conns.clear()
+
+
+def init_app(app):
+    """Registra a devolução das conexões ao pool ao fim de cada request do Flask."""
+    @app.teardown_appcontext
+    def _release_db(exc):
+        release_connections()
+
+
+atexit.register(close_all)
@@ -0,0 +1,168 @@
+# exporter.py
+# Exportação em streaming da tabela tecnicos (CSV, NDJSON ou XLSX), sem limite de linhas.
+#
+# As linhas são lidas em blocos por keyset (id > último id, pelo índice (estado, id)),
+# cada bloco numa consulta curta: a memória fica constante e nenhuma transação de
+# leitura longa segura o checkpoint do WAL durante um download de minutos. O fim da
+# exportação é fixado no início (upto_id = maior id do filtro) e devolvido no
+# cabeçalho X-Export-Upto-Id; se a conexão cair, o cliente retoma com
+# ?after_id=<último id recebido>&upto_id=<o mesmo upto_id> e recebe o restante sem
+# duplicar nem pular linhas.
+#
+# CSV/NDJSON podem ir com Content-Encoding: gzip (compressão incremental). XLSX já é
+# zip e não é streaming de verdade: o workbook inteiro é montado (write_only) num
+# arquivo temporário e só depois enviado em pedaços, então o cliente não recebe nada
+# até a última linha ser serializada. Para não estourar timeouts de proxy/gunicorn,
+# exportações XLSX acima de EXPORT_XLSX_MAX_ROWS linhas são recusadas (use CSV/NDJSON).
+import csv
+import io
+import json
+import os
+import tempfile
+import zlib
+
+import metrics
+
+EXPORT_BATCH_ROWS = int(os.getenv("EXPORT_BATCH_ROWS", "2000"))
+EXPORT_XLSX_MAX_ROWS = int(os.getenv("EXPORT_XLSX_MAX_ROWS", "100000"))  # 0 = sem limite
+EXPORT_COLUMNS = ("id", "estado", "nome", "cpf", "rg", "telefone", "outros", "created_at")
+FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+FILE_CHUNK = 64 * 1024
+GZIP_LEVEL = 6
+
+
+class ExportError(ValueError):
+    pass
+
+
+def upto_id(conn, estado=None):
+    """Maior id atual do filtro: marca onde a exportação termina."""
+    if estado:
+        row = conn.execute("SELECT MAX(id) FROM tecnicos WHERE estado = ?", (estado,)).fetchone()
+    else:
+        row = conn.execute("SELECT MAX(id) FROM tecnicos").fetchone()
+    return row[0] or 0
+
+
+def count_rows(conn, estado=None, after_id=0, upto=None):
+    """Quantas linhas uma exportação (after_id, upto] vai enviar."""
+    upto = upto_id(conn, estado) if upto is None else upto
+    if estado:
+        row = conn.execute("SELECT COUNT(*) FROM tecnicos WHERE estado = ? AND id > ? AND id <= ?",
+                           (estado, after_id or 0, upto)).fetchone()
+    else:
+        row = conn.execute("SELECT COUNT(*) FROM tecnicos WHERE id > ? AND id <= ?",
+                           (after_id or 0, upto)).fetchone()
+    return row[0]
+
+
+def iter_batches(conn, estado=None, after_id=0, upto=None, batch=EXPORT_BATCH_ROWS):
+    """Blocos de linhas (tuplas em EXPORT_COLUMNS) com after_id < id <= upto, em ordem de id."""
+    cols = ", ".join(EXPORT_COLUMNS)
+    where = "WHERE estado = ? AND id > ? AND id <= ?" if estado else "WHERE id > ? AND id <= ?"
+    sql = f"SELECT {cols} FROM tecnicos {where} ORDER BY id LIMIT ?"
+    last = after_id or 0
+    upto = upto_id(conn, estado) if upto is None else upto
+    while last < upto:
+        params = ((estado,) if estado else ()) + (last, upto, batch)
+        rows = conn.execute(sql, params).fetchall()
+        if not rows:
+            return
+        yield rows
+        last = rows[-1][0]
+
+
+# ----------------- Formatos -----------------
+def iter_csv(batches, header=True):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    if header:  # numa retomada (after_id) o cabeçalho já foi recebido
+        writer.writerow(EXPORT_COLUMNS)
+        yield "\ufeff" + buf.getvalue()  # BOM: o Excel abre acentos corretamente
+    for rows in batches:
+        with metrics.span("serialize"):
+            buf.seek(0)
+            buf.truncate()
+            writer.writerows(rows)
+            chunk = buf.getvalue()
+        yield chunk
+
+
+def iter_ndjson(batches):
+    for rows in batches:
+        with metrics.span("serialize"):
+            chunk = "".join(json.dumps(dict(zip(EXPORT_COLUMNS, r)), ensure_ascii=False) + "\n" for r in rows)
+        yield chunk
+
+
+def iter_xlsx(batches):
+    # bufferizado: nada sai antes de wb.save terminar (ver EXPORT_XLSX_MAX_ROWS)
+    from openpyxl import Workbook  # lazy (só quem exporta XLSX carrega)
+
+    with tempfile.TemporaryFile() as tmp:
+        with metrics.span("serialize"):
+            wb = Workbook(write_only=True)
+            ws = wb.create_sheet("tecnicos")
+            ws.append(EXPORT_COLUMNS)
+            for rows in batches:
+                for r in rows:
+                    ws.append(r)
+            wb.save(tmp)
+        tmp.seek(0)
+        while True:
+            chunk = tmp.read(FILE_CHUNK)
+            if not chunk:
+                break
+            yield chunk
+
+
+def gzip_stream(chunks, level=GZIP_LEVEL):
+    """Comprime um gerador de str/bytes em gzip, pedaço a pedaço."""
+    z = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31 = cabeçalho gzip
+    for chunk in chunks:
+        data = z.compress(chunk.encode("utf-8") if isinstance(chunk, str) else chunk)
+        # sync flush por bloco: o cliente recebe (e pode retomar a partir de) cada bloco
+        data += z.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield z.flush()
+
+
+def export_stream(conn, fmt, estado=None, after_id=0, upto=None, gzip=False):
+    """Retorna (gerador de pedaços, mimetype) para o formato pedido."""
+    if fmt not in FORMATS:
+        raise ExportError(f"'format' deve ser {', '.join(FORMATS)}")
+    upto = upto_id(conn, estado) if upto is None else upto
+    if fmt == "xlsx" and EXPORT_XLSX_MAX_ROWS:
+        n = count_rows(conn, estado, after_id, upto)
+        if n > EXPORT_XLSX_MAX_ROWS:
+            raise ExportError(f"exportação XLSX limitada a {EXPORT_XLSX_MAX_ROWS} linhas ({n} no filtro); "
+                              "use format=csv ou format=ndjson")
+    batches = iter_batches(conn, estado, after_id, upto)
+    if fmt == "csv":
+        body = iter_csv(batches, header=not after_id)
+    elif fmt == "ndjson":
+        body = iter_ndjson(batches)
+    else:
+        body = iter_xlsx(batches)
+    if gzip and fmt != "xlsx":
+        body = gzip_stream(body)
+    return body, FORMATS[fmt]
+
+
+def export_headers(fmt, estado=None, upto=0, gzip=False):
+    """Cabeçalhos da resposta: nome do arquivo, upto_id para retomar, sem buffer no proxy."""
+    headers = {
+        "Content-Disposition": f'attachment; filename="tecnicos_{estado or "todos"}.{fmt}"',
+        "X-Export-Upto-Id": str(upto),
+        "Cache-Control": "no-store",
+        "X-Accel-Buffering": "no",
+        "Vary": "Accept-Encoding",
+    }
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+    return headers
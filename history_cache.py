@@ -0,0 +1,144 @@
+# history_cache.py
+# Cache LRU em memória do final do histórico de cada sessão (server.py).
+#
+# Guarda, por sessão, o resumo atual (session_summaries) e as últimas mensagens
+# como objetos com __slots__ — o suficiente para context_builder montar o prompt
+# de uma sessão "quente" sem ler o banco. A cache é write-through: cada mensagem
+# salva entra na cauda na hora (ainda sem id) e recebe o id quando o lote é
+# gravado (hooks do write_queue.py). O limite é por memória estimada: as sessões
+# menos usadas saem primeiro quando passa de HISTORY_CACHE_MAX_BYTES.
+import os
+import sys
+import threading
+from collections import OrderedDict, deque
+
+HISTORY_CACHE_MAX_BYTES = int(os.getenv("HISTORY_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+TAIL_MESSAGES = 200          # igual ao RECENT_SCAN_LIMIT do context_builder
+MESSAGE_OVERHEAD = 120       # objeto com __slots__ + referência na deque (estimativa)
+SESSION_OVERHEAD = 400
+
+
+class CachedMessage:
+    __slots__ = ("id", "role", "content")
+
+    def __init__(self, id, role, content):
+        self.id = id
+        self.role = role
+        self.content = content
+
+
+class SessionTail:
+    __slots__ = ("summary", "last_id", "messages", "size")
+
+    def __init__(self, summary, last_id, tail_messages):
+        self.summary = summary
+        self.last_id = last_id
+        self.messages = deque(maxlen=tail_messages)
+        self.size = SESSION_OVERHEAD + sys.getsizeof(summary)
+
+
+def _cost(content):
+    return MESSAGE_OVERHEAD + sys.getsizeof(content)
+
+
+class HistoryCache:
+    def __init__(self, max_bytes=HISTORY_CACHE_MAX_BYTES, tail_messages=TAIL_MESSAGES):
+        self.max_bytes = max_bytes
+        self.tail_messages = tail_messages
+        self._sessions = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "loads": 0, "appends": 0, "evictions": 0,
+                       "invalidations": 0}
+
+    # ---------- leitura ----------
+    def get(self, session_id):
+        """Cópia (resumo, last_id, [(id, role, content)...]) da sessão, ou None se não está na cache."""
+        with self._lock:
+            tail = self._sessions.get(session_id)
+            if tail is None:
+                self._stats["misses"] += 1
+                return None
+            self._sessions.move_to_end(session_id)
+            self._stats["hits"] += 1
+            return tail.summary, tail.last_id, [(m.id, m.role, m.content) for m in tail.messages]
+
+    # ---------- escrita ----------
+    def load(self, session_id, summary, last_id, rows):
+        """Coloca a sessão na cache a partir do banco; rows = [(id ou None, role, content)] antigas→novas."""
+        tail = SessionTail(summary, last_id, self.tail_messages)
+        for _id, role, content in rows[-self.tail_messages:]:
+            tail.messages.append(CachedMessage(_id, role, content))
+            tail.size += _cost(content)
+        with self._lock:
+            old = self._sessions.pop(session_id, None)
+            if old is not None:
+                self._bytes -= old.size
+            self._sessions[session_id] = tail
+            self._bytes += tail.size
+            self._stats["loads"] += 1
+            self._evict()
+
+    def append(self, session_id, role, content, id=None):
+        """Write-through de uma mensagem nova (sessões fora da cache são ignoradas)."""
+        with self._lock:
+            tail = self._sessions.get(session_id)
+            if tail is None:
+                return
+            delta = _cost(content)
+            if len(tail.messages) == tail.messages.maxlen:
+                delta -= _cost(tail.messages[0].content)  # a deque descarta a mais antiga
+            tail.messages.append(CachedMessage(id, role, content))
+            tail.size += delta
+            self._bytes += delta
+            self._stats["appends"] += 1
+            self._evict()
+
+    def assign_ids(self, session_id, ids):
+        """Dá os ids do banco, em ordem, às mensagens da sessão que ainda não tinham."""
+        with self._lock:
+            tail = self._sessions.get(session_id)
+            if tail is None:
+                return
+            it = iter(ids)
+            for m in tail.messages:
+                if m.id is None:
+                    m.id = next(it, None)
+                    if m.id is None:
+                        break
+
+    def set_summary(self, session_id, summary, last_id):
+        """Novo resumo: atualiza e descarta da cauda o que ele já cobre."""
+        with self._lock:
+            tail = self._sessions.get(session_id)
+            if tail is None:
+                return
+            freed = sys.getsizeof(tail.summary) - sys.getsizeof(summary)
+            while tail.messages and tail.messages[0].id is not None and tail.messages[0].id <= last_id:
+                freed += _cost(tail.messages.popleft().content)
+            tail.summary, tail.last_id = summary, last_id
+            tail.size -= freed
+            self._bytes -= freed
+
+    def invalidate(self, session_id):
+        with self._lock:
+            tail = self._sessions.pop(session_id, None)
+            if tail is not None:
+                self._bytes -= tail.size
+                self._stats["invalidations"] += 1
+
+    def _evict(self):
+        # chamado com o lock: remove as sessões menos usadas até caber
+        while self._bytes > self.max_bytes and len(self._sessions) > 1:
+            _, tail = self._sessions.popitem(last=False)
+            self._bytes -= tail.size
+            self._stats["evictions"] += 1
+
+    def stats(self):
+        with self._lock:
+            s = dict(self._stats)
+            s.update(sessions=len(self._sessions), bytes=self._bytes, max_bytes=self.max_bytes,
+                     messages=sum(len(t.messages) for t in self._sessions.values()))
+        lookups = s["hits"] + s["misses"]
+        s["hit_rate"] = round(s["hits"] / lookups, 4) if lookups else 0.0
+        return s
@@ -0,0 +1,246 @@
+# importer.py
+# Importação de planilhas (CSV/XLSX) para a tabela tecnicos em blocos de memória limitada.
+#
+# CSV é lido com pandas.read_csv(chunksize=...) e XLSX com openpyxl em modo read_only,
+# linha a linha. Cada bloco é mapeado para o schema de tecnicos e gravado com
+# tecnicos.bulk_insert_tecnicos (upsert por CPF: reimportar a mesma planilha não
+# duplica técnicos). A importação roda numa thread em segundo plano e o progresso
+# (inseridos/atualizados/sem alteração) fica disponível em get_job(job_id).
+# Uploads guardados em upload_store.py passam `chunks` e são lidos do cache colunar.
+# CSVs exportados pelo Excel em pt-BR costumam vir em cp1252: o encoding é detectado
+# antes (utf-8 -> cp1252 -> latin-1) e todas as colunas são lidas como texto, para o
+# CPF não perder os zeros à esquerda.
+import codecs
+import csv
+import os
+import threading
+import time
+import unicodedata
+import uuid
+from collections import OrderedDict
+from itertools import islice
+
+import db
+import metrics
+import tecnicos
+
+CHUNK_ROWS = int(os.getenv("IMPORT_CHUNK_ROWS", "5000"))
+CSV_ENCODINGS = ("utf-8-sig", "cp1252", "latin-1")  # latin-1 aceita qualquer byte
+MAX_JOBS_KEPT = 100
+
+# cabeçalho normalizado -> coluna de tecnicos
+COLUMN_ALIASES = {
+    "estado": "estado", "uf": "estado",
+    "nome": "nome", "name": "nome", "tecnico": "nome", "nome completo": "nome",
+    "cpf": "cpf",
+    "rg": "rg", "identidade": "rg",
+    "telefone": "telefone", "tel": "telefone", "celular": "telefone", "fone": "telefone",
+    "whatsapp": "telefone", "contato": "telefone",
+}
+
+_jobs = OrderedDict()
+_jobs_lock = threading.Lock()
+
+
+def _norm_header(h):
+    h = unicodedata.normalize("NFKD", str(h or "")).encode("ascii", "ignore").decode()
+    return " ".join(h.lower().replace("_", " ").split())
+
+
+def map_columns(headers):
+    """Retorna (mapa índice->campo, índices que vão para 'outros')."""
+    mapping = {}
+    extras = []
+    used = set()
+    for i, h in enumerate(headers):
+        field = COLUMN_ALIASES.get(_norm_header(h))
+        if field and field not in used:
+            mapping[i] = field
+            used.add(field)
+        else:
+            extras.append(i)
+    return mapping, extras
+
+
+def _cell(v):
+    if v is None:
+        return None
+    if isinstance(v, float):
+        if v != v:  # NaN
+            return None
+        if v.is_integer():
+            v = int(v)
+    v = str(v).strip()
+    return v or None
+
+
+def _cpf_cell(v):
+    # CPF gravado como número na planilha (1234567890 em vez de 01234567890)
+    v = _cell(v)
+    if v and v.isdigit() and len(v) < 11:
+        v = v.zfill(11)
+    return v
+
+
+def rows_to_records(headers, rows):
+    mapping, extras = map_columns(headers)
+    records = []
+    for row in rows:
+        rec = {}
+        for i, field in mapping.items():
+            cell = _cpf_cell if field == "cpf" else _cell
+            rec[field] = cell(row[i]) if i < len(row) else None
+        outros = []
+        for i in extras:
+            v = _cell(row[i]) if i < len(row) else None
+            if v is not None:
+                outros.append(f"{headers[i]}: {v}")
+        rec["outros"] = "; ".join(outros) or None
+        records.append(rec)
+    return records
+
+
+# ----------------- Leitura em blocos -----------------
+def detect_encoding(path, block=1 << 20):
+    """Primeiro encoding de CSV_ENCODINGS que decodifica o arquivo inteiro."""
+    for encoding in CSV_ENCODINGS[:-1]:
+        decoder = codecs.getincrementaldecoder(encoding)()
+        try:
+            with open(path, "rb") as f:
+                while True:
+                    data = f.read(block)
+                    decoder.decode(data, final=not data)
+                    if not data:
+                        break
+        except UnicodeDecodeError:
+            continue
+        return encoding
+    return CSV_ENCODINGS[-1]
+
+
+def _sniff_delimiter(path, encoding):
+    # planilhas exportadas em pt-BR costumam usar ';'
+    with open(path, "r", encoding=encoding, errors="ignore", newline="") as f:
+        sample = f.read(8192)
+    try:
+        return csv.Sniffer().sniff(sample, delimiters=",;\t|").delimiter
+    except csv.Error:
+        return ","
+
+
+def iter_csv_chunks(path, chunk_rows=CHUNK_ROWS):
+    import pandas as pd  # lazy: só a importação precisa de pandas
+
+    encoding = detect_encoding(path)
+    # dtype=str em todas as colunas: CPF/RG/telefone como texto, sem virar número
+    reader = pd.read_csv(path, chunksize=chunk_rows, dtype=str, keep_default_na=False,
+                         encoding=encoding, sep=_sniff_delimiter(path, encoding))
+    for chunk in reader:
+        headers = [str(c) for c in chunk.columns]
+        yield headers, chunk.itertuples(index=False, name=None)
+
+
+def iter_xlsx_chunks(path, chunk_rows=CHUNK_ROWS):
+    from openpyxl import load_workbook  # lazy
+
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = wb.active
+        rows = ws.iter_rows(values_only=True)
+        headers = next(rows, None)
+        if headers is None:
+            return
+        headers = [str(h) if h is not None else f"coluna_{i + 1}" for i, h in enumerate(headers)]
+        while True:
+            chunk = list(islice(rows, chunk_rows))
+            if not chunk:
+                break
+            yield headers, chunk
+    finally:
+        wb.close()
+
+
+def iter_chunks(path, chunk_rows=CHUNK_ROWS):
+    low = path.lower()
+    if low.endswith((".xlsx", ".xlsm")):
+        return iter_xlsx_chunks(path, chunk_rows)
+    if low.endswith(".csv"):
+        return iter_csv_chunks(path, chunk_rows)
+    raise ValueError("formato não suportado para importação (use .csv ou .xlsx)")
+
+
+# ----------------- Jobs em segundo plano -----------------
+def _new_job(filename, estado):
+    job = {
+        "id": uuid.uuid4().hex[:12],
+        "filename": filename,
+        "estado": estado,
+        "status": "queued",
+        "rows_read": 0,
+        "inserted": 0,
+        "updated": 0,
+        "unchanged": 0,
+        "rejected": 0,
+        "error": None,
+        "started_at": None,
+        "finished_at": None,
+    }
+    with _jobs_lock:
+        _jobs[job["id"]] = job
+        while len(_jobs) > MAX_JOBS_KEPT:
+            _jobs.popitem(last=False)
+    return job
+
+
+def get_job(job_id):
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        return dict(job) if job else None
+
+
+def list_jobs():
+    with _jobs_lock:
+        return [dict(j) for j in reversed(_jobs.values())]
+
+
+def _update(job, **fields):
+    with _jobs_lock:
+        job.update(fields)
+
+
+def run_import(job, path, db_file, chunk_rows=CHUNK_ROWS, chunks=None):
+    _update(job, status="running", started_at=time.time())
+    try:
+        conn = db.get_connection(db_file)
+        source = chunks(chunk_rows) if chunks else iter_chunks(path, chunk_rows)
+        for headers, rows in source:
+            accepted = []
+            read = rejected = 0
+            with metrics.span("parse"):
+                for rec in rows_to_records(headers, rows):
+                    read += 1
+                    parsed, err = tecnicos.prepare_record(rec, job["estado"])
+                    if err:
+                        rejected += 1
+                    else:
+                        accepted.append(parsed)
+            counts = tecnicos.bulk_insert_tecnicos(conn, accepted)
+            _update(job, rows_read=job["rows_read"] + read,
+                    inserted=job["inserted"] + counts["inserted"],
+                    updated=job["updated"] + counts["updated"],
+                    unchanged=job["unchanged"] + counts["unchanged"],
+                    rejected=job["rejected"] + rejected)
+        _update(job, status="done", finished_at=time.time())
+    except Exception as e:
+        _update(job, status="error", error=str(e), finished_at=time.time())
+    finally:
+        db.release_connections()
+
+
+def start_import(path, db_file, filename=None, estado=None, chunks=None):
+    """`chunks(chunk_rows)`: fonte alternativa de (cabeçalhos, linhas), ex. o cache de upload_store."""
+    job = _new_job(filename or os.path.basename(path), estado)
+    t = threading.Thread(target=run_import, args=(job, path, db_file, CHUNK_ROWS, chunks), daemon=True,
+                         name=f"import-{job['id']}")
+    t.start()
+    return get_job(job["id"])
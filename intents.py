@@ -0,0 +1,94 @@
+# intents.py
+# Roteador de comandos do chat (serve.py).
+#
+# Os padrões são registrados uma vez e compilados numa única regex com um grupo
+# nomeado por intenção, testados na ordem de prioridade do registro. Classificar
+# uma mensagem é um único `match` — mensagens que não são comando seguem direto
+# para o LLM sem passar por uma sequência de re.search.
+import re
+
+
+class Intent:
+    __slots__ = ("name", "pattern", "anywhere", "handler")
+
+    def __init__(self, name, pattern, anywhere):
+        self.name = name
+        self.pattern = pattern
+        self.anywhere = anywhere
+        self.handler = None
+
+
+class IntentRouter:
+    def __init__(self, flags=re.IGNORECASE):
+        self.flags = flags
+        self._intents = {}
+        self._regex = None
+
+    def add(self, name, pattern, anywhere=False):
+        """Registra uma intenção.
+
+        `pattern` casa a partir do início da mensagem; com anywhere=True pode
+        aparecer em qualquer posição (como um re.search). Nomes de grupos internos
+        precisam ser únicos entre todas as intenções.
+        """
+        if name in self._intents:
+            raise ValueError(f"intenção já registrada: {name}")
+        self._intents[name] = Intent(name, pattern, anywhere)
+        self._regex = None
+        return self
+
+    def handler(self, name):
+        """Decorador que associa a função que trata a intenção `name`."""
+        def decorator(fn):
+            self._intents[name].handler = fn
+            return fn
+        return decorator
+
+    def intent(self, name, pattern, anywhere=False):
+        """Registra padrão + handler de uma vez."""
+        self.add(name, pattern, anywhere)
+        return self.handler(name)
+
+    def compile(self):
+        parts = []
+        for it in self._intents.values():
+            body = f"(?s:.*?)(?:{it.pattern})" if it.anywhere else it.pattern
+            parts.append(f"(?P<{it.name}>{body})")
+        self._regex = re.compile("|".join(parts), self.flags)
+        return self._regex
+
+    def classify(self, text):
+        """Retorna (Intent, match) da primeira intenção que casa, ou (None, None)."""
+        regex = self._regex or self.compile()
+        m = regex.match(text)
+        if not m:
+            return None, None
+        # o grupo externo da intenção é sempre o último a fechar
+        return self._intents[m.lastgroup], m
+
+    def dispatch(self, text, *args, **kwargs):
+        """Executa o handler da intenção; None quando a mensagem não é um comando."""
+        intent, m = self.classify(text)
+        if intent is None or intent.handler is None:
+            return None
+        return intent.handler(m, text, *args, **kwargs)
+
+    @property
+    def names(self):
+        return list(self._intents)
+
+
+# ----------------- Comandos do chat de técnicos -----------------
+# mesma ordem e mesmas regras que serve.py usava em sequência
+DELETE_PATTERN = r"\s*delete[:\s]+(?P<delete_target>.+)$"
+SAVE_PATTERN = r"(?:(?s:.*?)\bguarde\b.*\bbanco\b|guardar no banco|guardar:)"
+QUERY_PATTERN = r"\b(?:tecnic|t[eé]cnico|t[eé]cnicos)\b.*\bde\s+(?P<query_estado>[A-Za-z]{1,3})\b"
+
+
+def build_command_router():
+    """Roteador com os padrões dos comandos (handlers são ligados em serve.py)."""
+    router = IntentRouter()
+    router.add("delete", DELETE_PATTERN)
+    router.add("save", SAVE_PATTERN)
+    router.add("query", QUERY_PATTERN, anywhere=True)
+    return router
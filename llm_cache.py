@@ -0,0 +1,212 @@
+# llm_cache.py
+# Cache persistente de respostas do LLM (usado por serve.py na conversa normal).
+#
+# Chave = sha256(modelo, temperatura, prompt de sistema, mensagem normalizada, o bloco
+# de contexto/memórias injetado no histórico e as últimas CACHE_HISTORY_MESSAGES
+# mensagens da conversa). Duas camadas: LRU em memória e a
+# tabela llm_cache no SQLite, com TTL e remoção por tamanho total. Pedidos idênticos
+# simultâneos são agrupados: só um gera, os outros esperam o mesmo resultado.
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import db
+
+CACHE_TTL_S = float(os.getenv("LLM_CACHE_TTL_S", str(7 * 24 * 3600)))
+CACHE_MEMORY_ENTRIES = int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "512"))
+CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+# mensagens recentes que entram na chave: um "sim" ou "continua" só reaproveita a
+# resposta se a conversa anterior for a mesma. 0 = só a pergunta e o bloco de contexto
+# (mais acertos, mas respostas de outra conversa podem voltar em perguntas de seguimento)
+CACHE_HISTORY_MESSAGES = int(os.getenv("LLM_CACHE_HISTORY_MESSAGES", "6"))
+EVICT_EVERY = 64  # verifica o tamanho da tabela a cada N gravações
+
+_SPACES_RE = re.compile(r"\s+")
+
+
+def normalize_message(text):
+    text = _SPACES_RE.sub(" ", (text or "").casefold()).strip()
+    return text.rstrip(" ?!.…")
+
+
+class _InFlight:
+    __slots__ = ("event", "value", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ResponseCache:
+    def __init__(self, db_path, ttl=CACHE_TTL_S, memory_entries=CACHE_MEMORY_ENTRIES,
+                 max_bytes=CACHE_MAX_BYTES, history_messages=CACHE_HISTORY_MESSAGES):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.memory_entries = memory_entries
+        self.max_bytes = max_bytes
+        self.history_messages = history_messages
+        self._lru = OrderedDict()  # key -> (resposta, expira_em)
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._stats = {"hits_memory": 0, "hits_disk": 0, "misses": 0, "coalesced": 0,
+                       "bypassed": 0, "stores": 0, "evictions": 0}
+        self._init_table()
+
+    def _init_table(self):
+        conn = db.get_connection(self.db_path)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_hit REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_hit ON llm_cache (last_hit)")
+        conn.commit()
+
+    # ---------- chave ----------
+    def make_key(self, model, temperature, system_prompt, message, history=()):
+        history = list(history)
+        # mensagens de sistema no histórico = memórias/resumo injetados: sempre na chave
+        context = [m.get("content") for m in history if m.get("role") == "system"]
+        turns = [m for m in history if m.get("role") != "system"]
+        relevant = turns[-self.history_messages:] if self.history_messages else []
+        raw = json.dumps({
+            "model": model,
+            "temperature": temperature,
+            "system": system_prompt,
+            "context": context,
+            "message": normalize_message(message),
+            "history": [(m.get("role"), normalize_message(m.get("content"))) for m in relevant],
+        }, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    # ---------- leitura/gravação ----------
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def lookup(self, key):
+        now = time.time()
+        with self._lock:
+            hit = self._lru.get(key)
+            if hit and hit[1] > now:
+                self._lru.move_to_end(key)
+                self._stats["hits_memory"] += 1
+                return hit[0]
+            if hit:
+                del self._lru[key]
+        conn = db.get_connection(self.db_path)
+        row = conn.execute("SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+        if row and row[1] + self.ttl > now:
+            with conn:
+                conn.execute("UPDATE llm_cache SET last_hit = ?, hits = hits + 1 WHERE key = ?", (now, key))
+            self._remember(key, row[0], row[1] + self.ttl)
+            self._count("hits_disk")
+            return row[0]
+        self._count("misses")
+        return None
+
+    def _remember(self, key, value, expires_at):
+        with self._lock:
+            self._lru[key] = (value, expires_at)
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.memory_entries:
+                self._lru.popitem(last=False)
+
+    def store(self, key, value):
+        if not value:
+            return
+        now = time.time()
+        self._remember(key, value, now + self.ttl)
+        conn = db.get_connection(self.db_path)
+        with conn:
+            conn.execute("""
+                INSERT OR REPLACE INTO llm_cache (key, response, size, created_at, last_hit, hits)
+                VALUES (?, ?, ?, ?, ?, 0)
+            """, (key, value, len(value.encode("utf-8")), now, now))
+        with self._lock:
+            self._stats["stores"] += 1
+            self._writes += 1
+            check = self._writes % EVICT_EVERY == 0
+        if check:
+            self.evict()
+
+    def evict(self):
+        """Remove entradas vencidas e, se passar de max_bytes, as menos usadas recentemente."""
+        conn = db.get_connection(self.db_path)
+        removed = 0
+        with conn:
+            removed += conn.execute("DELETE FROM llm_cache WHERE created_at < ?",
+                                    (time.time() - self.ttl,)).rowcount
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+            if total > self.max_bytes:
+                # apaga os mais antigos até voltar a ~90% do limite
+                excess = total - int(self.max_bytes * 0.9)
+                cur = conn.execute("SELECT key, size FROM llm_cache ORDER BY last_hit ASC")
+                victims = []
+                for key, size in cur:
+                    victims.append((key,))
+                    excess -= size
+                    if excess <= 0:
+                        break
+                conn.executemany("DELETE FROM llm_cache WHERE key = ?", victims)
+                removed += len(victims)
+        with self._lock:
+            self._stats["evictions"] += removed
+        return removed
+
+    # ---------- API principal ----------
+    def get_or_compute(self, key, compute, bypass=False):
+        """Devolve a resposta em cache ou chama compute() (uma vez por chave em paralelo)."""
+        if bypass:
+            self._count("bypassed")
+            return compute()
+        cached = self.lookup(key)
+        if cached is not None:
+            return cached
+
+        with self._lock:
+            waiting = self._inflight.get(key)
+            if waiting is None:
+                leader = self._inflight[key] = _InFlight()
+            else:
+                self._stats["coalesced"] += 1
+        if waiting is not None:
+            waiting.event.wait()
+            if waiting.error is not None:
+                raise waiting.error
+            return waiting.value
+
+        try:
+            leader.value = compute()
+            self.store(key, leader.value)
+            return leader.value
+        except Exception as e:
+            leader.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            leader.event.set()
+
+    def stats(self):
+        with self._lock:
+            s = dict(self._stats)
+            s["memory_entries"] = len(self._lru)
+            s["in_flight"] = len(self._inflight)
+        lookups = s["hits_memory"] + s["hits_disk"] + s["misses"]
+        s["hit_rate"] = round((s["hits_memory"] + s["hits_disk"]) / lookups, 4) if lookups else 0.0
+        row = db.get_connection(self.db_path).execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+        s["disk_entries"], s["disk_bytes"] = row
+        return s
@@ -0,0 +1,318 @@
+# llm_client.py
+# Cliente compartilhado para a API de chat compatível com OpenAI (LM Studio).
+#
+# - requests.Session com pool de conexões keep-alive (sem handshake TCP a cada turno)
+# - limite de gerações simultâneas (semáforo) + fila de espera limitada com timeout
+# - sobrecarga falha rápido com LLMOverloaded em vez de acumular esperas de 60s
+# - stats(): profundidade da fila, gerações em andamento e tempo de espera
+# - etapas llm_queue/llm_ttft/llm_total e contagem de tokens em metrics.py
+# - vários backends (llm_pool.py): menos requisições em andamento, ejeção passiva,
+#   nova tentativa em outro backend em falhas de conexão e hedge opcional para
+#   prompts curtos (LLM_HEDGE_MAX_PROMPT_TOKENS)
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeout
+from contextlib import contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import llm_pool
+import metrics
+from llm_stream import iter_chat_deltas
+
+LLM_URL = os.getenv("LLM_URL", "http://localhost:1234/v1/chat/completions")
+LLM_MODEL = os.getenv("LLM_MODEL", "meta-llama-3-8b-instruct")
+LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", "2"))  # por backend
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "8"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "15"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "3"))
+LLM_RETRIES = int(os.getenv("LLM_RETRIES", "1"))  # novas tentativas em outro backend
+# hedge: prompts até N tokens (estimados) ganham uma 2ª chamada em outro backend se a
+# 1ª passar do p90 recente (ou de LLM_HEDGE_AFTER_MS); 0 = desligado
+LLM_HEDGE_MAX_PROMPT_TOKENS = int(os.getenv("LLM_HEDGE_MAX_PROMPT_TOKENS", "0"))
+LLM_HEDGE_AFTER_MS = float(os.getenv("LLM_HEDGE_AFTER_MS", "0"))
+RETRY_STATUSES = frozenset({502, 503, 504})
+TEMPERATURE = 0.7
+
+LLM_BACKENDS = llm_pool.load_backends(LLM_URL, LLM_MAX_IN_FLIGHT)
+# gerações simultâneas no processo todo: a soma das capacidades dos backends
+LLM_TOTAL_IN_FLIGHT = sum(b.max_in_flight for b in LLM_BACKENDS)
+
+
+class LLMError(Exception):
+    """Falha ao obter resposta do modelo."""
+
+
+class LLMOverloaded(LLMError):
+    """Fila de gerações cheia ou tempo de espera esgotado."""
+
+
+class LLMClient:
+    def __init__(self, url=None, model=LLM_MODEL, max_in_flight=None,
+                 max_queue=LLM_MAX_QUEUE, queue_timeout=LLM_QUEUE_TIMEOUT, timeout=LLM_TIMEOUT,
+                 backends=None, retries=LLM_RETRIES, hedge_max_prompt_tokens=LLM_HEDGE_MAX_PROMPT_TOKENS):
+        if backends is None:
+            backends = [llm_pool.Backend(url, max_in_flight or LLM_MAX_IN_FLIGHT)] if url else LLM_BACKENDS
+        self.pool = llm_pool.BackendPool(backends)
+        self.url = ", ".join(self.pool.urls)
+        self.model = model
+        self.max_in_flight = max_in_flight or self.pool.capacity
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.timeout = timeout
+        self.retries = max(0, retries)
+        self.hedge_max_prompt_tokens = hedge_max_prompt_tokens
+
+        self.session = requests.Session()
+        per_backend = max(b.max_in_flight for b in self.pool.backends) * 2  # + hedges
+        adapter = HTTPAdapter(pool_connections=len(self.pool.backends), pool_maxsize=per_backend,
+                              max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"Content-Type": "application/json"})
+
+        self._slots = threading.BoundedSemaphore(self.max_in_flight)
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._in_flight = 0
+        self._stats = {"requests": 0, "rejected": 0, "errors": 0, "retries": 0, "hedged": 0,
+                       "wait_total_s": 0.0, "wait_max_s": 0.0}
+        self._hedge_executor = None
+
+    # ---------- controle de concorrência ----------
+    @contextmanager
+    def slot(self):
+        """Reserva uma vaga de geração; levanta LLMOverloaded se a fila estiver cheia/lenta."""
+        t0 = time.perf_counter()
+        # vaga livre: entra direto, sem passar pela fila (max_queue=0 = sem fila, não sem vagas)
+        acquired = self._slots.acquire(blocking=False)
+        if not acquired:
+            with self._lock:
+                if self._waiting >= self.max_queue:
+                    self._stats["rejected"] += 1
+                    raise LLMOverloaded("A Beka está atendendo muitas conversas agora. Tente novamente em instantes.")
+                self._waiting += 1
+            acquired = self._slots.acquire(timeout=self.queue_timeout)
+            with self._lock:
+                self._waiting -= 1
+        waited = time.perf_counter() - t0
+        metrics.observe_stage("llm_queue", waited)
+        with self._lock:
+            if not acquired:
+                self._stats["rejected"] += 1
+            else:
+                self._in_flight += 1
+                self._stats["requests"] += 1
+                self._stats["wait_total_s"] += waited
+                self._stats["wait_max_s"] = max(self._stats["wait_max_s"], waited)
+        if not acquired:
+            raise LLMOverloaded(f"Tempo de espera na fila do modelo esgotado ({self.queue_timeout:g}s). Tente novamente.")
+        try:
+            yield waited
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            s = dict(self._stats)
+            served = s["requests"] or 1
+            return {
+                "url": self.url,
+                "in_flight": self._in_flight,
+                "queue_depth": self._waiting,
+                "max_in_flight": self.max_in_flight,
+                "max_queue": self.max_queue,
+                "requests": s["requests"],
+                "rejected": s["rejected"],
+                "errors": s["errors"],
+                "retries": s["retries"],
+                "hedged": s["hedged"],
+                "wait_avg_ms": round(s["wait_total_s"] / served * 1000, 2),
+                "wait_max_ms": round(s["wait_max_s"] * 1000, 2),
+                "backends": self.pool.stats(),
+            }
+
+    def _error(self):
+        self._count("errors")
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    # ---------- backends ----------
+    def _post(self, payload, timeout, stream=False, backend=None):
+        """POST no backend menos ocupado (ou em `backend`, já reservado); falha de
+        conexão/502-504 tenta outro.
+
+        Retorna (resposta, backend, t0). Quem chama devolve o backend com pool.release().
+        """
+        tried, last_error = [], None
+        for attempt in range(self.retries + 1):
+            if not (attempt == 0 and backend is not None):
+                backend = self.pool.acquire(exclude=tried)
+            if backend is None:
+                break
+            if attempt:
+                self._count("retries")
+            tried.append(backend)
+            t0 = time.perf_counter()
+            try:
+                resp = self.session.post(backend.url, json=payload, stream=stream,
+                                         timeout=(LLM_CONNECT_TIMEOUT, timeout or self.timeout))
+            except requests.ConnectionError as e:
+                # não chegou a gerar nada: seguro repetir em outro backend
+                self.pool.release(backend, failed=True)
+                last_error = e
+                continue
+            except requests.RequestException as e:
+                # timeout de leitura: o modelo pode estar gerando; não duplica a carga
+                self.pool.release(backend, failed=True)
+                self._error()
+                raise LLMError(f"Falha de conexão com o modelo ({backend.name}): {e}") from e
+            if resp.status_code in RETRY_STATUSES and attempt < self.retries:
+                resp.close()
+                self.pool.release(backend, failed=True)
+                last_error = f"HTTP {resp.status_code} em {backend.name}"
+                continue
+            return resp, backend, t0
+        self._error()
+        raise LLMError(f"Falha de conexão com o modelo: {last_error or 'nenhum backend disponível'}")
+
+    def _complete(self, payload, timeout, backend=None):
+        """Uma chamada sem stream: (corpo JSON, segundos, backend que respondeu)."""
+        resp, backend, t0 = self._post(payload, timeout, backend=backend)
+        with resp:
+            if resp.status_code != 200:
+                self.pool.release(backend, failed=resp.status_code >= 500)
+                self._error()
+                raise LLMError(f"Erro LLM ({resp.status_code}): {resp.text[:200]}")
+            try:
+                body = resp.json()
+            except ValueError as e:
+                self.pool.release(backend, failed=True)
+                self._error()
+                raise LLMError(f"Resposta inválida do modelo ({backend.name})") from e
+        elapsed = time.perf_counter() - t0
+        self.pool.release(backend, seconds=elapsed)
+        return body, elapsed, backend
+
+    def _should_hedge(self, messages):
+        if not self.hedge_max_prompt_tokens or len(self.pool.backends) < 2:
+            return False
+        prompt_tokens = sum(len(m.get("content") or "") for m in messages) // 4
+        return prompt_tokens <= self.hedge_max_prompt_tokens
+
+    def _complete_hedged(self, payload, timeout):
+        """Se a 1ª chamada demorar mais que o normal, dispara outra num backend livre
+        e fica com a que responder primeiro (a outra termina em segundo plano)."""
+        delay = LLM_HEDGE_AFTER_MS / 1000 if LLM_HEDGE_AFTER_MS else self.pool.hedge_delay()
+        if delay is None:
+            return self._complete(payload, timeout)
+        with self._lock:
+            if self._hedge_executor is None:
+                self._hedge_executor = ThreadPoolExecutor(max_workers=max(2, self.max_in_flight * 2),
+                                                          thread_name_prefix="llm-hedge")
+        primary = self.pool.acquire()
+        if primary is None:
+            return self._complete(payload, timeout)
+        first = self._hedge_executor.submit(self._complete, payload, timeout, primary)
+        try:
+            return first.result(timeout=delay)
+        except FutureTimeout:
+            pass
+        # outro backend, e só se tiver vaga livre: o hedge não pode enfileirar
+        spare = self.pool.acquire(exclude=[primary], spare_only=True)
+        if spare is None:
+            return first.result()
+        self._count("hedged")
+        second = self._hedge_executor.submit(self._complete, payload, timeout, spare)
+        pending, error = {first, second}, None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for f in done:
+                if f.exception() is None:
+                    body, elapsed, backend = f.result()
+                    self.pool.record_hedge(spare, won=f is second)
+                    return body, elapsed, backend
+                error = f.exception()
+        raise error
+
+    # ---------- chamadas ----------
+    def _payload(self, messages, stream, **opts):
+        payload = {"model": self.model, "messages": messages, "temperature": TEMPERATURE, "stream": stream}
+        payload.update({k: v for k, v in opts.items() if v is not None})
+        return payload
+
+    def chat(self, messages, timeout=None, **opts):
+        """Gera a resposta completa e devolve o texto."""
+        payload = self._payload(messages, False, **opts)
+        with self.slot(), metrics.span("llm_total"):
+            if self._should_hedge(messages):
+                body, elapsed, _ = self._complete_hedged(payload, timeout)
+            else:
+                body, elapsed, _ = self._complete(payload, timeout)
+        choice = (body.get("choices") or [{}])[0]
+        text = choice.get("message", {}).get("content") or choice.get("text")
+        _record_usage(body.get("usage") or {}, messages, text, None, elapsed)
+        return text
+
+    def stream(self, messages, timeout=None, **opts):
+        """Gera os pedaços de texto conforme o modelo produz (stream=True)."""
+        payload = self._payload(messages, True, **opts)
+        with self.slot():
+            resp, backend, t0 = self._post(payload, timeout, stream=True)
+            failed, seconds, t_first = True, None, None
+            try:
+                with resp, metrics.span("llm_total"):
+                    if resp.status_code != 200:
+                        failed = resp.status_code >= 500
+                        self._error()
+                        raise LLMError(f"Erro LLM ({resp.status_code}): {resp.text[:200]}")
+                    usage, parts = {}, []
+                    try:
+                        for delta in iter_chat_deltas(resp, usage):
+                            if t_first is None:
+                                t_first = time.perf_counter()
+                                metrics.observe_stage("llm_ttft", t_first - t0)
+                            parts.append(delta)
+                            yield delta
+                    except requests.RequestException as e:
+                        self._error()
+                        raise LLMError(f"Conexão com o modelo interrompida ({backend.name}): {e}") from e
+                    failed, seconds = False, time.perf_counter() - t0
+                    # tokens/s de geração: conta a partir do primeiro token
+                    _record_usage(usage, messages, "".join(parts), len(parts),
+                                  time.perf_counter() - (t_first or t0))
+            except GeneratorExit:
+                failed = False  # o cliente desistiu: não é culpa do backend
+                raise
+            finally:
+                self.pool.release(backend, seconds=seconds, ttft=t_first - t0 if t_first else None,
+                                  failed=failed)
+
+
+def _record_usage(usage, messages, text, chunks, seconds):
+    # sem "usage" do servidor: ~4 caracteres por token no prompt e 1 token por chunk
+    prompt = usage.get("prompt_tokens") or sum(len(m.get("content") or "") for m in messages) // 4
+    completion = usage.get("completion_tokens") or chunks or len(text or "") // 4
+    metrics.record_tokens(prompt, completion, seconds)
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def get_client():
+    """Cliente padrão do processo (configurado pelas variáveis LLM_*)."""
+    global _default
+    if _default is None:
+        with _default_lock:
+            if _default is None:
+                _default = LLMClient()
+    return _default
@@ -0,0 +1,195 @@
+# llm_pool.py
+# Pool de backends compatíveis com a API da OpenAI (LM Studio, llama.cpp, vLLM...).
+#
+# Configuração (a primeira que existir):
+#   LLM_BACKENDS_FILE=backends.json  [{"url": "...", "max_in_flight": 2, "name": "gpu-1"}, ...]
+#   LLM_URLS=http://a:1234/v1/chat/completions,http://b:1234/v1/chat/completions
+#   LLM_URL (um backend só, comportamento antigo)
+#
+# - balanceamento por menos requisições em andamento (relativo à capacidade de
+#   cada backend; empate decidido pela latência média recente)
+# - health check passivo: LLM_EJECT_FAILURES falhas seguidas tiram o backend do
+#   pool por LLM_EJECT_SECONDS (dobrando a cada nova ejeção, até LLM_EJECT_MAX_SECONDS);
+#   depois ele volta e a primeira resposta boa zera o histórico de falhas
+# - se todos estiverem ejetados, tenta mesmo assim (melhor que recusar tudo)
+# - stats() por backend: requisições, erros, ejeções, latência p50/p95 e TTFT
+import json
+import os
+import threading
+import time
+from collections import deque
+
+import metrics
+
+LLM_URLS = os.getenv("LLM_URLS", "")
+LLM_BACKENDS_FILE = os.getenv("LLM_BACKENDS_FILE", "")
+LLM_EJECT_FAILURES = int(os.getenv("LLM_EJECT_FAILURES", "3"))
+LLM_EJECT_SECONDS = float(os.getenv("LLM_EJECT_SECONDS", "10"))
+LLM_EJECT_MAX_SECONDS = float(os.getenv("LLM_EJECT_MAX_SECONDS", "300"))
+LATENCY_WINDOW = 256      # últimas N latências por backend (percentis)
+HEDGE_MIN_SAMPLES = 20    # sem histórico suficiente não há como escolher o atraso do hedge
+
+BACKEND_SECONDS = metrics.Histogram("beka_llm_backend_seconds", "Duração das chamadas por backend do LLM.")
+BACKEND_FAILURES = metrics.Counter("beka_llm_backend_failures_total", "Falhas por backend do LLM.")
+metrics.REGISTRY += [BACKEND_SECONDS, BACKEND_FAILURES]
+
+
+def _percentile(values, p):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+class Backend:
+    def __init__(self, url, max_in_flight=2, name=None):
+        self.url = url
+        self.name = name or url.split("//", 1)[-1].split("/", 1)[0]
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.outstanding = 0
+        self.requests = 0
+        self.errors = 0
+        self.consecutive_failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.ttfts = deque(maxlen=LATENCY_WINDOW)
+
+    def available(self, now):
+        return self.ejected_until <= now
+
+    def avg_latency(self):
+        return sum(self.latencies) / len(self.latencies) if self.latencies else 0.0
+
+    def stats(self, now):
+        def ms(v):
+            return round(v * 1000, 1) if v is not None else None
+        return {
+            "name": self.name,
+            "url": self.url,
+            "max_in_flight": self.max_in_flight,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "errors": self.errors,
+            "ejected": not self.available(now),
+            "ejected_for_s": round(max(0.0, self.ejected_until - now), 1),
+            "ejections": self.ejections,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "latency_avg_ms": ms(self.avg_latency() if self.latencies else None),
+            "latency_p50_ms": ms(_percentile(self.latencies, 50)),
+            "latency_p95_ms": ms(_percentile(self.latencies, 95)),
+            "ttft_p50_ms": ms(_percentile(self.ttfts, 50)),
+        }
+
+
+def load_backends(default_url, default_max_in_flight, urls=None, path=None):
+    """Lista de Backend a partir de LLM_BACKENDS_FILE, LLM_URLS ou só `default_url`."""
+    path = LLM_BACKENDS_FILE if path is None else path
+    urls = LLM_URLS if urls is None else urls
+    if path:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        entries = data.get("backends", []) if isinstance(data, dict) else data
+        backends = [Backend(e["url"], e.get("max_in_flight", default_max_in_flight), e.get("name"))
+                    for e in entries]
+    elif urls:
+        backends = [Backend(u.strip(), default_max_in_flight) for u in urls.split(",") if u.strip()]
+    else:
+        backends = [Backend(default_url, default_max_in_flight)]
+    if not backends:
+        raise ValueError("nenhum backend de LLM configurado")
+    return backends
+
+
+class BackendPool:
+    def __init__(self, backends, eject_failures=LLM_EJECT_FAILURES, eject_seconds=LLM_EJECT_SECONDS,
+                 eject_max_seconds=LLM_EJECT_MAX_SECONDS):
+        self.backends = list(backends)
+        self.eject_failures = max(1, eject_failures)
+        self.eject_seconds = eject_seconds
+        self.eject_max_seconds = eject_max_seconds
+        self._lock = threading.Lock()
+
+    @property
+    def capacity(self):
+        return sum(b.max_in_flight for b in self.backends)
+
+    @property
+    def urls(self):
+        return [b.url for b in self.backends]
+
+    def acquire(self, exclude=(), spare_only=False):
+        """Escolhe o backend com menos requisições em andamento e reserva uma vaga nele.
+
+        `exclude`: backends já tentados (retry vai para outro). `spare_only`: só
+        backends com vaga livre (hedge não deve enfileirar atrás de ninguém).
+        Retorna None se não houver candidato.
+        """
+        now = time.monotonic()
+        with self._lock:
+            candidates = [b for b in self.backends if b not in exclude]
+            healthy = [b for b in candidates if b.available(now)]
+            if healthy:
+                candidates = healthy
+            elif spare_only:
+                return None
+            else:
+                # todos ejetados: o que volta primeiro ainda é melhor que recusar
+                candidates = sorted(candidates, key=lambda b: b.ejected_until)[:1]
+            if spare_only:
+                candidates = [b for b in candidates if b.outstanding < b.max_in_flight]
+            if not candidates:
+                return None
+            backend = min(candidates, key=lambda b: (b.outstanding / b.max_in_flight, b.avg_latency()))
+            backend.outstanding += 1
+            backend.requests += 1
+            return backend
+
+    def release(self, backend, seconds=None, ttft=None, failed=False):
+        """Devolve a vaga e registra o resultado (falha conta para a ejeção)."""
+        now = time.monotonic()
+        with self._lock:
+            backend.outstanding -= 1
+            if failed:
+                backend.errors += 1
+                backend.consecutive_failures += 1
+                if backend.consecutive_failures >= self.eject_failures:
+                    backend.ejections += 1
+                    backoff = self.eject_seconds * 2 ** min(backend.ejections - 1, 16)
+                    backend.ejected_until = now + min(backoff, self.eject_max_seconds)
+            else:
+                backend.consecutive_failures = 0
+                if backend.ejected_until:
+                    backend.ejected_until = 0.0
+                    backend.ejections = 0
+                if seconds is not None:
+                    backend.latencies.append(seconds)
+                if ttft is not None:
+                    backend.ttfts.append(ttft)
+        if failed:
+            BACKEND_FAILURES.inc(backend=backend.name)
+        elif seconds is not None:
+            BACKEND_SECONDS.observe(seconds, backend=backend.name)
+
+    def record_hedge(self, backend, won):
+        with self._lock:
+            backend.hedges += 1
+            if won:
+                backend.hedge_wins += 1
+
+    def hedge_delay(self, percentile=90):
+        """Atraso antes de disparar o hedge: o p90 recente dos backends saudáveis."""
+        now = time.monotonic()
+        with self._lock:
+            samples = [s for b in self.backends if b.available(now) for s in b.latencies]
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        return _percentile(samples, percentile)
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            return [b.stats(now) for b in self.backends]
@@ -0,0 +1,45 @@
+# llm_stream.py
+# Leitura incremental das respostas em streaming (stream=True) da API compatível
+# com OpenAI e formatação de eventos SSE para o navegador.
+import json
+
+import metrics
+
+
+def iter_chat_deltas(resp, usage=None):
+    """Gera os pedaços de texto de uma resposta `text/event-stream` do LLM.
+
+    Se `usage` (dict) for passado, recebe o campo "usage" quando o servidor o envia.
+    """
+    if not resp.encoding:
+        resp.encoding = "utf-8"
+    # chunk_size=None: entrega os dados assim que chegam (importante p/ time-to-first-token)
+    for line in resp.iter_lines(chunk_size=None, decode_unicode=True):
+        if not line or not line.startswith("data:"):
+            continue
+        data = line[5:].strip()
+        if data == "[DONE]":
+            break
+        try:
+            chunk = json.loads(data)
+        except ValueError:
+            continue
+        if usage is not None and chunk.get("usage"):
+            usage.update(chunk["usage"])
+        choice = (chunk.get("choices") or [{}])[0]
+        text = (choice.get("delta") or {}).get("content") or choice.get("text")
+        if text:
+            yield text
+
+
+def sse(data, event=None):
+    """Formata um evento server-sent (JSON em `data:`)."""
+    head = f"event: {event}\n" if event else ""
+    with metrics.span("serialize"):
+        return f"{head}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",  # desliga buffer em proxies (nginx)
+}
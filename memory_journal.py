@@ -0,0 +1,101 @@
+# memory_journal.py
+# Espelho incremental da tabela `memory` (beka_app.py) em JSON Lines.
+#
+# Cada linha é uma mensagem {"id", "role", "content", "timestamp"} na ordem do id.
+# O journal só recebe append: sync() grava as linhas com id acima da marca d'água
+# (último id já escrito), então salvar uma mensagem custa O(1) em vez de reler e
+# reescrever o arquivo inteiro.
+import json
+import os
+import threading
+
+
+class MemoryJournal:
+    def __init__(self, path):
+        self.path = path
+        self._hwm = None  # último id gravado no arquivo
+        self._lock = threading.Lock()
+
+    def _read_hwm(self):
+        """Lê o id da última linha válida sem percorrer o arquivo todo."""
+        if not os.path.exists(self.path):
+            return 0
+        with open(self.path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            block = 4096
+            data = b""
+            pos = size
+            while pos > 0:
+                step = min(block, pos)
+                pos -= step
+                f.seek(pos)
+                data = f.read(step) + data
+                lines = data.splitlines()
+                # a primeira linha do bloco pode estar cortada; só confia nela no início do arquivo
+                candidates = lines if pos == 0 else lines[1:]
+                for line in reversed(candidates):
+                    try:
+                        return int(json.loads(line)["id"])
+                    except (ValueError, KeyError, TypeError):
+                        continue  # linha parcial (queda no meio da escrita)
+                block *= 2
+        return 0
+
+    def _load(self):
+        if self._hwm is not None:
+            return
+        if os.path.exists(self.path) and os.path.getsize(self.path):
+            with open(self.path, "rb+") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")  # fecha linha parcial antes de novos appends
+        self._hwm = self._read_hwm()
+
+    def high_water_mark(self):
+        with self._lock:
+            self._load()
+            return self._hwm
+
+    def sync(self, conn):
+        """Acrescenta ao journal as mensagens novas da tabela memory. Retorna quantas."""
+        with self._lock:
+            self._load()
+            max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM memory").fetchone()[0]
+            if max_id < self._hwm:
+                # banco foi limpo/trocado por fora: recomeça o espelho
+                self._truncate()
+            if max_id == self._hwm:
+                return 0
+            rows = conn.execute(
+                "SELECT id, role, content, timestamp FROM memory WHERE id > ? ORDER BY id",
+                (self._hwm,),
+            )
+            written = 0
+            with open(self.path, "a", encoding="utf-8") as f:
+                for _id, role, content, ts in rows:
+                    f.write(json.dumps({"id": _id, "role": role, "content": content, "timestamp": ts},
+                                       ensure_ascii=False) + "\n")
+                    self._hwm = _id
+                    written += 1
+            return written
+
+    def _truncate(self):
+        with open(self.path, "w", encoding="utf-8"):
+            pass
+        self._hwm = 0
+
+    def reset(self):
+        with self._lock:
+            self._truncate()
+
+    def iter_entries(self):
+        """Lê o journal do início ao fim (para exportação/depuração)."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
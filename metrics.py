@@ -0,0 +1,232 @@
+# metrics.py
+# Instrumentação de latência por request para serve.py, server.py e beka_app.py.
+#
+#   with metrics.span("db"): ...        tempo de uma etapa (db, parse, llm_queue,
+#                                        llm_ttft, llm_total, serialize)
+#   metrics.record_tokens(p, c, s)      tokens de prompt/resposta e tokens/s
+#   metrics.init_app(app, "serve")      /metrics (formato Prometheus) + log de lentos
+#
+# Spans são exclusivos: uma etapa aninhada desconta seu tempo da etapa de fora
+# (ex.: "db" dentro de "parse"). Durante um request, os tempos são somados por
+# etapa e observados nos histogramas quando a resposta termina de ser enviada
+# (inclusive streams SSE); fora de um request são observados direto.
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "0"))  # 0 = log desligado
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 250)
+# medidas contidas em outra etapa (ttft faz parte de llm_total): fora da soma do log
+NESTED_STAGES = frozenset({"llm_ttft"})
+
+
+class Histogram:
+    """Histograma cumulativo no formato Prometheus, com labels."""
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels (tupla ordenada) -> [contagens por bucket, soma, total]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(key)
+            if s is None:
+                s = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            s[0][i] += 1
+            s[1] += value
+            s[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(k, list(v[0]), v[1], v[2]) for k, v in self._series.items()]
+        for key, counts, total, n in sorted(series):
+            acc = 0
+            for bound, c in zip(self.buckets + ("+Inf",), counts):
+                acc += c
+                lines.append(f"{self.name}_bucket{_labels(key + (('le', str(bound)),))} {acc}")
+            lines.append(f"{self.name}_sum{_labels(key)} {total:.6f}")
+            lines.append(f"{self.name}_count{_labels(key)} {n}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        lines += [f"{self.name}{_labels(k)} {v}" for k, v in values]
+        return lines
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+REQUEST_SECONDS = Histogram("beka_request_seconds", "Duração total do request (até o fim do corpo).")
+STAGE_SECONDS = Histogram("beka_stage_seconds", "Tempo por etapa (exclusivo) dentro de um request.")
+REQUESTS = Counter("beka_requests_total", "Requests atendidos.")
+PROMPT_TOKENS = Counter("beka_llm_prompt_tokens_total", "Tokens de prompt enviados ao LLM.")
+COMPLETION_TOKENS = Counter("beka_llm_completion_tokens_total", "Tokens gerados pelo LLM.")
+TOKENS_PER_SECOND = Histogram("beka_llm_tokens_per_second", "Velocidade de geração do LLM.", RATE_BUCKETS)
+REGISTRY = [REQUEST_SECONDS, STAGE_SECONDS, REQUESTS, PROMPT_TOKENS, COMPLETION_TOKENS, TOKENS_PER_SECOND]
+
+APP_NAME = os.getenv("METRICS_APP", "beka")
+
+
+# ----------------- Contexto do request -----------------
+class _Request:
+    __slots__ = ("app", "endpoint", "start", "stages", "tokens", "stack")
+
+    def __init__(self, app, endpoint):
+        self.app = app
+        self.endpoint = endpoint
+        self.start = time.perf_counter()
+        self.stages = {}
+        self.tokens = None
+        self.stack = []  # [etapa, início, tempo dos filhos]
+
+
+_local = threading.local()
+
+
+def _current():
+    return getattr(_local, "request", None)
+
+
+@contextmanager
+def span(stage):
+    req = _current()
+    stack = req.stack if req is not None else _stack()
+    frame = [stage, time.perf_counter(), 0.0]
+    stack.append(frame)
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - frame[1]
+        stack.pop()
+        if stack:
+            stack[-1][2] += elapsed
+        own = elapsed - frame[2]
+        if req is not None:
+            req.stages[stage] = req.stages.get(stage, 0.0) + own
+        else:
+            STAGE_SECONDS.observe(own, app=APP_NAME, stage=stage)
+
+
+def _stack():
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def observe_stage(stage, seconds):
+    """Registra um tempo medido por fora de um span (ex.: time-to-first-token)."""
+    req = _current()
+    if req is not None:
+        req.stages[stage] = req.stages.get(stage, 0.0) + seconds
+    else:
+        STAGE_SECONDS.observe(seconds, app=APP_NAME, stage=stage)
+
+
+def record_tokens(prompt_tokens, completion_tokens, seconds):
+    PROMPT_TOKENS.inc(prompt_tokens or 0, app=APP_NAME)
+    COMPLETION_TOKENS.inc(completion_tokens or 0, app=APP_NAME)
+    if completion_tokens and seconds > 0:
+        TOKENS_PER_SECOND.observe(completion_tokens / seconds, app=APP_NAME)
+    req = _current()
+    if req is not None:
+        req.tokens = (prompt_tokens, completion_tokens, seconds)
+
+
+def start_request(app, endpoint):
+    _local.request = _Request(app, endpoint)
+
+
+def finish_request(status, logger=None):
+    req = _current()
+    if req is None:
+        return
+    _local.request = None
+    total = time.perf_counter() - req.start
+    REQUEST_SECONDS.observe(total, app=req.app, endpoint=req.endpoint)
+    REQUESTS.inc(app=req.app, endpoint=req.endpoint, status=str(status))
+    for stage, seconds in req.stages.items():
+        STAGE_SECONDS.observe(seconds, app=req.app, stage=stage)
+    if SLOW_REQUEST_MS and total * 1000 >= SLOW_REQUEST_MS and logger is not None:
+        breakdown = " ".join(f"{k}={v * 1000:.1f}ms" for k, v in sorted(req.stages.items(), key=lambda kv: -kv[1]))
+        other = total - sum(v for k, v in req.stages.items() if k not in NESTED_STAGES)
+        msg = f"[lento] {req.endpoint} {status} {total * 1000:.1f}ms: {breakdown} outros={other * 1000:.1f}ms"
+        if req.tokens:
+            p, c, s = req.tokens
+            msg += f" tokens={p}+{c}" + (f" ({c / s:.1f} tok/s)" if c and s > 0 else "")
+        logger.warning(msg)
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
+
+
+# ----------------- Integração com Flask -----------------
+def init_app(app, name):
+    """Mede cada request do `app` e expõe GET /metrics."""
+    from flask import Response, request
+    from flask.json.provider import DefaultJSONProvider
+
+    global APP_NAME
+    APP_NAME = name
+
+    class TimedJSONProvider(DefaultJSONProvider):
+        def dumps(self, obj, **kwargs):
+            with span("serialize"):
+                return super().dumps(obj, **kwargs)
+
+    app.json = TimedJSONProvider(app)
+
+    @app.before_request
+    def _start_metrics():
+        if request.endpoint != "metrics":
+            start_request(name, request.endpoint or "404")
+
+    @app.after_request
+    def _finish_metrics(response):
+        if _current() is not None:
+            status = response.status_code
+            # fecha só quando o corpo termina (streams SSE/NDJSON incluídos)
+            response.call_on_close(lambda: finish_request(status, app.logger))
+        return response
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics():
+        return Response(render(), mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,169 @@
+# pagination.py
+# Paginação por keyset (id) para as rotas de memória de server.py e beka_app.py.
+#
+#   ?after_id=N    mensagens com id > N, em ordem crescente (avança)
+#   ?before_id=N   mensagens com id < N (volta para as mais antigas)
+#   (sem cursor)   as `limit` mensagens mais recentes
+#   ?since=/until= filtro por data/hora (qualquer formato aceito pelo datetime() do SQLite)
+#   ?fields=id,role,content   projeção de colunas
+#   ?format=ndjson  despejo completo em streaming, uma mensagem por linha
+#
+# `tail`: linhas que ainda não estão no banco (fila de write_queue.py) e que, ao serem
+# gravadas, terão ids maiores que todos os atuais. Entram no fim da página mais recente
+# (sem cursor) e do despejo NDJSON, com id None; páginas com cursor são só do banco.
+import json
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+NDJSON_BATCH = 500
+
+
+class PageError(ValueError):
+    pass
+
+
+def _int_arg(args, name):
+    v = args.get(name)
+    if v in (None, ""):
+        return None
+    try:
+        return int(v)
+    except ValueError:
+        raise PageError(f"'{name}' deve ser um inteiro")
+
+
+def parse_page_args(args, allowed_fields, default_fields):
+    """Lê os parâmetros da query string; levanta PageError se forem inválidos."""
+    after_id = _int_arg(args, "after_id")
+    before_id = _int_arg(args, "before_id")
+    if after_id is not None and before_id is not None:
+        raise PageError("use apenas 'after_id' ou 'before_id'")
+    limit = _int_arg(args, "limit")
+    if limit is not None and limit < 1:
+        raise PageError("'limit' deve ser maior que zero")
+
+    fields = default_fields
+    if args.get("fields"):
+        fields = tuple(f.strip() for f in args["fields"].split(",") if f.strip())
+        unknown = [f for f in fields if f not in allowed_fields]
+        if unknown or not fields:
+            raise PageError(f"campos inválidos: {', '.join(unknown) or '(vazio)'}; "
+                            f"permitidos: {', '.join(allowed_fields)}")
+
+    fmt = (args.get("format") or "json").lower()
+    if fmt not in ("json", "ndjson"):
+        raise PageError("'format' deve ser json ou ndjson")
+
+    return {
+        "after_id": after_id,
+        "before_id": before_id,
+        "limit": limit,
+        "since": args.get("since") or None,
+        "until": args.get("until") or None,
+        "fields": fields,
+        "format": fmt,
+    }
+
+
+def _where(page, base_where, base_args, ts_col):
+    clauses = [base_where] if base_where else []
+    args = list(base_args)
+    if page["after_id"] is not None:
+        clauses.append("id > ?")
+        args.append(page["after_id"])
+    if page["before_id"] is not None:
+        clauses.append("id < ?")
+        args.append(page["before_id"])
+    if page["since"]:
+        clauses.append(f"datetime({ts_col}) >= datetime(?)")
+        args.append(page["since"])
+    if page["until"]:
+        clauses.append(f"datetime({ts_col}) <= datetime(?)")
+        args.append(page["until"])
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", args
+
+
+def filter_tail(conn, page, rows, ts_col="timestamp"):
+    """Linhas de fora do banco que passam em since/until, projetadas nos campos da página."""
+    if page["after_id"] is not None or page["before_id"] is not None:
+        return []
+    # mesma comparação do WHERE, para aceitar os mesmos formatos de data
+    def before(a, b):
+        return conn.execute("SELECT datetime(?) <= datetime(?)", (a, b)).fetchone()[0]
+
+    out = []
+    for r in rows:
+        ts = r.get(ts_col)
+        if page["since"] and not before(page["since"], ts):
+            continue
+        if page["until"] and not before(ts, page["until"]):
+            continue
+        out.append({k: r.get(k) for k in dict.fromkeys(("id",) + tuple(page["fields"]))})
+    return out
+
+
+def fetch_page(conn, table, page, base_where="", base_args=(), ts_col="timestamp", tail=()):
+    """Retorna (itens em ordem crescente de id, cursor da próxima página ou None)."""
+    limit = min(page["limit"] or DEFAULT_LIMIT, MAX_LIMIT)
+    where, args = _where(page, base_where, base_args, ts_col)
+    cols = ", ".join(dict.fromkeys(("id",) + tuple(page["fields"])))
+    forward = page["after_id"] is not None
+    order = "ASC" if forward else "DESC"
+    cur = conn.execute(f"SELECT {cols} FROM {table}{where} ORDER BY id {order} LIMIT ?", args + [limit + 1])
+    names = [d[0] for d in cur.description]
+    rows = [dict(zip(names, r)) for r in cur.fetchall()]
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if not forward:
+        rows.reverse()
+    newest_id = rows[-1]["id"] if rows else None
+    if tail and not forward:
+        rows += [dict(r) for r in tail]
+        if len(rows) > limit:
+            rows = rows[-limit:]
+            has_more = newest_id is not None
+
+    cursor = None
+    if has_more and rows:
+        if forward:
+            cursor = {"after_id": rows[-1]["id"]}
+        else:
+            # página só com linhas da cauda: a próxima começa pela mais nova do banco
+            first = rows[0]["id"]
+            cursor = {"before_id": first if first is not None else newest_id + 1}
+    if "id" not in page["fields"]:
+        for r in rows:
+            del r["id"]
+    return rows, cursor
+
+
+def iter_ndjson(conn, table, page, base_where="", base_args=(), ts_col="timestamp", tail=()):
+    """Todas as linhas que batem com o filtro, em ordem de id, como NDJSON (gerador).
+
+    A consulta já é executada aqui: o snapshot de leitura fica fixado na chamada, mesmo
+    que o gerador só seja consumido depois de sair do read_lock() usado para montar `tail`.
+    """
+    where, args = _where(page, base_where, base_args, ts_col)
+    cols = ", ".join(page["fields"])
+    sql = f"SELECT {cols} FROM {table}{where} ORDER BY id ASC"
+    if page["limit"]:
+        sql += " LIMIT ?"
+        args.append(page["limit"])
+    cur = conn.execute(sql, args)
+    names = [d[0] for d in cur.description]
+    tail = [tuple(r.get(k) for k in names) for r in tail]
+    return _ndjson_lines(cur, names, tail, page["limit"])
+
+
+def _ndjson_lines(cur, names, tail, limit):
+    sent = 0
+    while True:
+        batch = cur.fetchmany(NDJSON_BATCH)
+        if not batch:
+            break
+        sent += len(batch)
+        yield "".join(json.dumps(dict(zip(names, r)), ensure_ascii=False) + "\n" for r in batch)
+    if limit:
+        tail = tail[:max(limit - sent, 0)]
+    if tail:
+        yield "".join(json.dumps(dict(zip(names, r)), ensure_ascii=False) + "\n" for r in tail)
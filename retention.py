@@ -0,0 +1,372 @@
+# retention.py
+# Retenção, arquivamento e compactação das tabelas de conversa:
+# conversas (serve.py), chat_history (server.py) e memory (beka_app.py).
+#
+# Cada tabela tem uma política (idade, número de linhas, tamanho do texto) lida de
+# RETENTION_<TABELA>_MAX_AGE_DAYS / _MAX_ROWS / _MAX_MB (ou RETENTION_MAX_* para
+# todas). Sem política nada é arquivado. As linhas frias (as mais antigas, por id)
+# saem do banco para segmentos JSON Lines gzip só de acréscimo:
+#
+#   <RETENTION_ARCHIVE_DIR>/<banco>/<tabela>/<primeiro id>-<último id>.jsonl.gz
+#
+# Cada segmento é gravado e o DELETE correspondente feito dentro da mesma transação
+# BEGIN IMMEDIATE; se o processo cair entre o rename do segmento e o commit, a
+# próxima execução apaga do banco o que já está arquivado. search_archive() varre
+# os segmentos sob demanda (do mais novo para o mais antigo).
+#
+# Depois do arquivamento: ANALYZE da tabela, PRAGMA incremental_vacuum (páginas
+# livres devolvidas ao sistema aos poucos) e checkpoint do WAL. start_maintenance()
+# roda isso periodicamente numa thread; a CLI roda na hora e mostra o antes/depois:
+#
+#   python retention.py run [--table conversas] [--dry-run] [--full-vacuum]
+#   python retention.py stats
+#   python retention.py search conversas "relatório do técnico" --limit 20
+import argparse
+import gzip
+import json
+import logging
+import os
+import re
+import threading
+from datetime import datetime, timedelta
+
+import db
+import retrieval
+
+RETENTION_ARCHIVE_DIR = os.getenv("RETENTION_ARCHIVE_DIR", "archive")
+RETENTION_INTERVAL_S = float(os.getenv("RETENTION_INTERVAL_S", str(6 * 3600)))  # 0 = desligado
+RETENTION_SEGMENT_ROWS = int(os.getenv("RETENTION_SEGMENT_ROWS", "10000"))
+RETENTION_VACUUM_PAGES = int(os.getenv("RETENTION_VACUUM_PAGES", "2000"))  # por execução (~8 MB)
+
+# tabela -> (banco, coluna de data, expressão do tamanho de cada linha)
+TABLES = {
+    "conversas": (os.getenv("DB_FILE", "backup.db"), "created_at",
+                  "LENGTH(content) + IFNULL(LENGTH(meta), 0)"),
+    "chat_history": ("beka.db", "timestamp", "LENGTH(content)"),
+    "memory": ("beka.db", "timestamp", "LENGTH(content)"),
+}
+
+log = logging.getLogger(__name__)
+
+_SEGMENT_RE = re.compile(r"^(\d+)-(\d+)\.jsonl\.gz$")
+_maintenance = {}
+_maintenance_lock = threading.Lock()
+
+
+class Policy:
+    __slots__ = ("table", "db_path", "time_col", "size_expr", "max_age_days", "max_rows", "max_bytes")
+
+    def __init__(self, table, db_path=None, max_age_days=None, max_rows=None, max_bytes=None):
+        default_db, self.time_col, self.size_expr = TABLES[table]
+        self.table = table
+        self.db_path = db_path or default_db
+        self.max_age_days = max_age_days
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+
+    @property
+    def active(self):
+        return any(v is not None for v in (self.max_age_days, self.max_rows, self.max_bytes))
+
+    def describe(self):
+        parts = []
+        if self.max_age_days is not None:
+            parts.append(f"idade > {self.max_age_days:g} dias")
+        if self.max_rows is not None:
+            parts.append(f"além de {self.max_rows} linhas")
+        if self.max_bytes is not None:
+            parts.append(f"além de {self.max_bytes / 2**20:g} MB")
+        return ", ".join(parts) or "sem política"
+
+
+def _env_number(table, name, cast):
+    raw = os.getenv(f"RETENTION_{table.upper()}_{name}", os.getenv(f"RETENTION_{name}"))
+    return cast(raw) if raw not in (None, "") else None
+
+
+def policy_for(table, db_path=None):
+    """Política da tabela a partir das variáveis de ambiente."""
+    max_mb = _env_number(table, "MAX_MB", float)
+    return Policy(table, db_path,
+                  max_age_days=_env_number(table, "MAX_AGE_DAYS", float),
+                  max_rows=_env_number(table, "MAX_ROWS", int),
+                  max_bytes=int(max_mb * 2**20) if max_mb is not None else None)
+
+
+# ----------------- Seleção das linhas frias -----------------
+def cold_upto(conn, policy):
+    """Maior id que deve sair do banco segundo a política (0 = nada)."""
+    table = policy.table
+    upto = 0
+    if policy.max_age_days is not None:
+        # as datas são ISO (com 'T' ou espaço): comparar com o dia de corte basta
+        cutoff = (datetime.now() - timedelta(days=policy.max_age_days)).strftime("%Y-%m-%d")
+        # ids crescem com o tempo: a primeira linha recente marca o fim das frias
+        row = conn.execute(f"SELECT id FROM {table} WHERE {policy.time_col} >= ? ORDER BY id LIMIT 1",
+                           (cutoff,)).fetchone()
+        if row:
+            upto = max(upto, row[0] - 1)
+        else:
+            upto = max(upto, conn.execute(f"SELECT IFNULL(MAX(id), 0) FROM {table}").fetchone()[0])
+    if policy.max_rows is not None:
+        row = conn.execute(f"SELECT id FROM {table} ORDER BY id DESC LIMIT 1 OFFSET ?",
+                           (policy.max_rows,)).fetchone()
+        if row:
+            upto = max(upto, row[0])
+    if policy.max_bytes is not None:
+        total = 0
+        for _id, size in conn.execute(f"SELECT id, {policy.size_expr} FROM {table} ORDER BY id DESC"):
+            total += size or 0
+            if total > policy.max_bytes:
+                upto = max(upto, _id)
+                break
+    return upto
+
+
+# ----------------- Segmentos -----------------
+def archive_dir(policy, base=None):
+    name = os.path.splitext(os.path.basename(policy.db_path))[0]
+    return os.path.join(base or RETENTION_ARCHIVE_DIR, name, policy.table)
+
+
+def list_segments(path):
+    """[(primeiro id, último id, caminho)] em ordem de id."""
+    if not os.path.isdir(path):
+        return []
+    out = []
+    for name in os.listdir(path):
+        m = _SEGMENT_RE.match(name)
+        if m:
+            out.append((int(m.group(1)), int(m.group(2)), os.path.join(path, name)))
+    return sorted(out)
+
+
+def _write_segment(path, names, rows):
+    os.makedirs(path, exist_ok=True)
+    final = os.path.join(path, f"{rows[0][0]:012d}-{rows[-1][0]:012d}.jsonl.gz")
+    tmp = final + ".tmp"
+    with open(tmp, "wb") as raw:
+        with gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6) as gz:
+            for r in rows:
+                gz.write(json.dumps(dict(zip(names, r)), ensure_ascii=False).encode("utf-8") + b"\n")
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(tmp, final)
+    return final
+
+
+def archive_table(policy, base=None, dry_run=False, segment_rows=RETENTION_SEGMENT_ROWS):
+    """Move as linhas frias da tabela para segmentos. Retorna um resumo do que fez."""
+    conn = db.get_connection(policy.db_path)
+    table = policy.table
+    out = {"table": table, "policy": policy.describe(), "rows": 0, "segments": 0, "bytes": 0}
+    if not policy.active:
+        return out
+    upto = cold_upto(conn, policy)
+    path = archive_dir(policy, base)
+    segments = list_segments(path)
+    done = segments[-1][1] if segments else 0
+    out["upto_id"] = upto
+    if dry_run:
+        out["rows"] = conn.execute(f"SELECT COUNT(*) FROM {table} WHERE id > ? AND id <= ?",
+                                   (done, upto)).fetchone()[0]
+        return out
+
+    if done:
+        # recuperação: segmento gravado, mas o DELETE não chegou a ser confirmado
+        with conn:
+            out["recovered"] = conn.execute(f"DELETE FROM {table} WHERE id <= ?", (done,)).rowcount
+    while done < upto:
+        conn.execute("BEGIN IMMEDIATE")  # segura gravadores enquanto o lote sai
+        try:
+            cur = conn.execute(f"SELECT * FROM {table} WHERE id > ? AND id <= ? ORDER BY id LIMIT ?",
+                               (done, upto, segment_rows))
+            names = [d[0] for d in cur.description]
+            rows = cur.fetchall()
+            if not rows:
+                conn.rollback()
+                break
+            segment = _write_segment(path, names, rows)
+            conn.execute(f"DELETE FROM {table} WHERE id >= ? AND id <= ?", (rows[0][0], rows[-1][0]))
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        done = rows[-1][0]
+        out["rows"] += len(rows)
+        out["segments"] += 1
+        out["bytes"] += os.path.getsize(segment)
+    if out["rows"]:
+        conn.execute(f"ANALYZE {table}")
+        conn.commit()
+    return out
+
+
+def search_archive(policy, text, limit=20, base=None, before_id=None, match=None):
+    """Linhas arquivadas que contêm todos os termos de `text`, das mais novas para as mais antigas.
+
+    `match(row)` filtra mais (ex.: só uma sessão de chat_history).
+    """
+    terms = retrieval.query_terms(text)
+    if not terms:
+        return []
+    hits = []
+    for first, last, segment in reversed(list_segments(archive_dir(policy, base))):
+        if before_id is not None and first >= before_id:
+            continue
+        found = []
+        with gzip.open(segment, "rt", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    continue
+                if before_id is not None and row.get("id", 0) >= before_id:
+                    continue
+                if match is not None and not match(row):
+                    continue
+                folded = retrieval._fold(row.get("content") or "")
+                if all(t in folded for t in terms):
+                    row["archived"] = True
+                    found.append(row)
+        hits.extend(reversed(found))
+        if len(hits) >= limit:
+            break
+    return hits[:limit]
+
+
+# ----------------- Compactação -----------------
+def compact(db_path, pages=RETENTION_VACUUM_PAGES, full=False):
+    """Devolve páginas livres ao sistema e atualiza estatísticas do planejador."""
+    conn = db.get_connection(db_path)
+    mode = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+    if full:
+        # VACUUM completo: reescreve o arquivo e liga o modo incremental (uma vez)
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+    elif mode == 2:
+        # executescript roda o pragma até o fim (execute() só libera uma página)
+        conn.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+    conn.execute("PRAGMA optimize")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+    return {"auto_vacuum": conn.execute("PRAGMA auto_vacuum").fetchone()[0], "full": full}
+
+
+def db_stats(db_path, tables=()):
+    conn = db.get_connection(db_path)
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    pages = conn.execute("PRAGMA page_count").fetchone()[0]
+    free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    files = sum(os.path.getsize(p) for p in (db_path, db_path + "-wal") if os.path.exists(p))
+    out = {"db": db_path, "file_bytes": files, "used_bytes": (pages - free) * page_size,
+           "free_bytes": free * page_size, "rows": {}}
+    for table in tables:
+        out["rows"][table] = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    return out
+
+
+def archive_bytes(policy, base=None):
+    return sum(os.path.getsize(p) for _, _, p in list_segments(archive_dir(policy, base)))
+
+
+def run(tables=None, base=None, dry_run=False, full_vacuum=False, db_paths=None):
+    """Arquiva e compacta as tabelas; retorna {banco: {"before", "after", "tables"}}."""
+    policies = [policy_for(t, (db_paths or {}).get(t)) for t in (tables or TABLES)]
+    by_db = {}
+    for p in policies:
+        by_db.setdefault(p.db_path, []).append(p)
+    report = {}
+    for db_path, group in by_db.items():
+        if not os.path.exists(db_path):
+            continue
+        names = [p.table for p in group]
+        before = db_stats(db_path, names)
+        results = [archive_table(p, base, dry_run=dry_run) for p in group]
+        if not dry_run:
+            compact(db_path, full=full_vacuum)
+        after = db_stats(db_path, names)
+        for r, p in zip(results, group):
+            r["archive_bytes"] = archive_bytes(p, base)
+        report[db_path] = {"before": before, "after": after, "tables": results}
+    return report
+
+
+# ----------------- Agendamento -----------------
+def start_maintenance(db_path, tables, interval=RETENTION_INTERVAL_S):
+    """Roda run() para as tabelas do banco a cada `interval` segundos numa thread."""
+    if not interval or interval <= 0:
+        return None
+    key = (os.path.abspath(db_path), tuple(tables))
+    with _maintenance_lock:
+        if key in _maintenance:
+            return _maintenance[key]
+        stop = threading.Event()
+
+        def loop():
+            while not stop.wait(interval):
+                try:
+                    run(tables, db_paths={t: db_path for t in tables})
+                except Exception:
+                    log.exception("manutenção de %s falhou", db_path)
+                finally:
+                    db.release_connections()
+
+        thread = threading.Thread(target=loop, name=f"retention-{os.path.basename(db_path)}", daemon=True)
+        thread.start()
+        _maintenance[key] = stop
+        return stop
+
+
+# ----------------- CLI -----------------
+def _mb(n):
+    return f"{n / 2**20:,.2f} MB"
+
+
+def _print_report(report, dry_run):
+    for db_path, r in report.items():
+        b, a = r["before"], r["after"]
+        print(f"\n{db_path}")
+        print(f"  arquivo   {_mb(b['file_bytes']):>14} -> {_mb(a['file_bytes']):>14}")
+        print(f"  usado     {_mb(b['used_bytes']):>14} -> {_mb(a['used_bytes']):>14}")
+        print(f"  livre     {_mb(b['free_bytes']):>14} -> {_mb(a['free_bytes']):>14}")
+        for t in r["tables"]:
+            verb = "arquivaria" if dry_run else "arquivadas"
+            print(f"  {t['table']:<13} {b['rows'][t['table']]:>10,} -> {a['rows'][t['table']]:>10,} linhas"
+                  f"  ({verb} {t['rows']:,}; {t['policy']}; arquivo {_mb(t['archive_bytes'])})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Retenção, arquivamento e compactação das conversas")
+    parser.add_argument("--archive-dir", default=RETENTION_ARCHIVE_DIR)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_run = sub.add_parser("run", help="arquiva as linhas frias e compacta o banco")
+    p_run.add_argument("--table", action="append", choices=sorted(TABLES))
+    p_run.add_argument("--dry-run", action="store_true", help="só mostra o que seria arquivado")
+    p_run.add_argument("--full-vacuum", action="store_true",
+                       help="VACUUM completo (liga auto_vacuum incremental em bancos antigos)")
+    sub.add_parser("stats", help="tamanho dos bancos e dos arquivos")
+    p_search = sub.add_parser("search", help="busca nos segmentos arquivados")
+    p_search.add_argument("table", choices=sorted(TABLES))
+    p_search.add_argument("text")
+    p_search.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    if args.cmd == "search":
+        for row in search_archive(policy_for(args.table), args.text, args.limit, base=args.archive_dir):
+            print(json.dumps(row, ensure_ascii=False))
+    elif args.cmd == "stats":
+        for table in TABLES:
+            p = policy_for(table)
+            if not os.path.exists(p.db_path):
+                continue
+            s = db_stats(p.db_path, [table])
+            print(f"{table:<13} {p.db_path:<12} {s['rows'][table]:>10,} linhas  banco {_mb(s['file_bytes'])}"
+                  f"  livre {_mb(s['free_bytes'])}  arquivo {_mb(archive_bytes(p, args.archive_dir))}"
+                  f"  ({p.describe()})")
+    else:
+        report = run(args.table, base=args.archive_dir, dry_run=args.dry_run, full_vacuum=args.full_vacuum)
+        _print_report(report, args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
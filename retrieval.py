@@ -0,0 +1,396 @@
+# retrieval.py
+# Busca por relevância na memória de longo prazo (memory / chat_history / conversas).
+#
+# Cada tabela ganha um índice invertido FTS5 (external content, mantido por
+# triggers) e a busca ordena por BM25. Opcionalmente (RETRIEVAL_VECTORS=1 e NumPy
+# instalado) um índice de vetores esparsos por hashing de tokens é mantido em .npz e
+# combinado com o BM25 por reciprocal rank fusion; ele é atualizado numa thread em
+# segundo plano, nunca no request, e só lê as linhas novas e os ids apagados.
+import glob
+import os
+import re
+import threading
+import time
+import unicodedata
+import zlib
+
+import db
+
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "3"))  # trechos injetados no prompt
+RETRIEVAL_VECTORS = os.getenv("RETRIEVAL_VECTORS", "0") == "1"
+# server.py: memórias de outras sessões só entram no prompt se isto for ligado
+RETRIEVAL_CROSS_SESSION = os.getenv("RETRIEVAL_CROSS_SESSION", "0") == "1"
+VECTOR_REFRESH_S = float(os.getenv("RETRIEVAL_VECTOR_REFRESH_S", "5"))
+VECTOR_MAX_SEGMENTS = 16
+MAX_TOP_K = 50
+VECTOR_DIM = 1 << 16  # esparso: a memória depende dos tokens de cada linha, não disto
+SNIPPET_CHARS = 300
+RRF_K = 60
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+STOPWORDS = frozenset("""
+a o e é de da do das dos em no na nos nas um uma uns umas que se por para pra com sem
+ao aos à às ou mas mais como eu tu ele ela nós vós eles elas me te lhe meu minha seu sua
+isso isto aquilo esse essa este esta já não sim foi ser ter tem está estou são era qual
+quais quando onde porque quem você vocês beka oi olá
+""".split())
+
+
+def _fold(text):
+    text = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def query_terms(text, limit=12):
+    seen = []
+    for tok in _TOKEN_RE.findall(_fold(text or "")):
+        if len(tok) < 3 or tok in STOPWORDS or tok in seen:
+            continue
+        seen.append(tok)
+        if len(seen) >= limit:
+            break
+    return seen
+
+
+class MemoryIndex:
+    """Índice de relevância sobre `table(id, <text_col>, ...)`."""
+
+    def __init__(self, table, text_col="content", vector_path=None):
+        self.table = table
+        self.text_col = text_col
+        self.fts = f"{table}_fts"
+        self._ready = False
+        self._db_path = None
+        self.vectors = None
+        if RETRIEVAL_VECTORS and vector_path:
+            try:
+                self.vectors = HashingVectorIndex(vector_path)
+            except ImportError:
+                self.vectors = None  # NumPy ausente: só BM25
+
+    def init(self, conn):
+        """Cria a tabela FTS5 + triggers e indexa o conteúdo existente na primeira vez."""
+        t, f, col = self.table, self.fts, self.text_col
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (f,)
+        ).fetchone()
+        with conn:
+            if not exists:
+                conn.execute(f"""
+                    CREATE VIRTUAL TABLE {f} USING fts5(
+                        {col}, content='{t}', content_rowid='id',
+                        tokenize='unicode61 remove_diacritics 2'
+                    )
+                """)
+                conn.execute(f"INSERT INTO {f} ({f}) VALUES ('rebuild')")
+            conn.execute(f"""CREATE TRIGGER IF NOT EXISTS {f}_ai AFTER INSERT ON {t} BEGIN
+                INSERT INTO {f} (rowid, {col}) VALUES (new.id, new.{col});
+            END""")
+            conn.execute(f"""CREATE TRIGGER IF NOT EXISTS {f}_ad AFTER DELETE ON {t} BEGIN
+                INSERT INTO {f} ({f}, rowid, {col}) VALUES ('delete', old.id, old.{col});
+            END""")
+            conn.execute(f"""CREATE TRIGGER IF NOT EXISTS {f}_au AFTER UPDATE ON {t} BEGIN
+                INSERT INTO {f} ({f}, rowid, {col}) VALUES ('delete', old.id, old.{col});
+                INSERT INTO {f} (rowid, {col}) VALUES (new.id, new.{col});
+            END""")
+        if self.vectors:
+            self.vectors.init(conn, t)
+        else:
+            drop_deletion_log(conn, t)
+        self._ready = True
+        if self.vectors:
+            self._refresh_vectors(conn)
+
+    def search(self, conn, text, k=5, where="", args=(), columns=("role",)):
+        """Top-k mensagens mais relevantes para `text` (BM25, + vetores se ativo)."""
+        terms = query_terms(text)
+        if not terms:
+            return []
+        if not self._ready:
+            self.init(conn)  # app iniciada sem init_db() (ex.: flask run)
+        match = " OR ".join(f'"{t}"*' for t in terms)
+        cols = ", ".join(f"t.{c}" for c in ("id", self.text_col) + tuple(columns))
+        sql = (f"SELECT {cols}, bm25({self.fts}) AS score FROM {self.fts} "
+               f"JOIN {self.table} t ON t.id = {self.fts}.rowid WHERE {self.fts} MATCH ?")
+        params = [match]
+        if where:
+            sql += f" AND ({where})"
+            params += list(args)
+        sql += " ORDER BY score LIMIT ?"
+        params.append(k * 4 if self.vectors else k)
+        cur = conn.execute(sql, params)
+        names = [d[0] for d in cur.description]
+        hits = [dict(zip(names, r)) for r in cur.fetchall()]
+        for h in hits:
+            h["score"] = round(-h["score"], 4)
+
+        if self.vectors:
+            self._refresh_vectors(conn)  # não bloqueia: usa o que já está indexado
+            hits = self._fuse(conn, hits, self.vectors.search(text, k * 4), k, where, args, cols)
+        return hits[:k]
+
+    def _refresh_vectors(self, conn):
+        if self._db_path is None:
+            self._db_path = conn.execute("PRAGMA database_list").fetchone()[2]
+        self.vectors.schedule(self._db_path, self.table, self.text_col)
+
+    def _fuse(self, conn, bm25_hits, vec_hits, k, where, args, cols):
+        # reciprocal rank fusion das duas listas
+        scores = {}
+        for rank, h in enumerate(bm25_hits):
+            scores[h["id"]] = scores.get(h["id"], 0) + 1 / (RRF_K + rank)
+        for rank, (_id, _sim) in enumerate(vec_hits):
+            scores[_id] = scores.get(_id, 0) + 1 / (RRF_K + rank)
+        by_id = {h["id"]: h for h in bm25_hits}
+        missing = [i for i in scores if i not in by_id]
+        if missing:
+            sql = f"SELECT {cols} FROM {self.table} t WHERE t.id IN ({','.join('?' * len(missing))})"
+            params = list(missing)
+            if where:
+                sql += f" AND ({where})"
+                params += list(args)
+            cur = conn.execute(sql, params)
+            names = [d[0] for d in cur.description]
+            for r in cur.fetchall():
+                by_id[r[0]] = dict(zip(names, r))
+        ranked = sorted((i for i in scores if i in by_id), key=lambda i: -scores[i])
+        out = []
+        for i in ranked[:k]:
+            h = by_id[i]
+            h["score"] = round(scores[i], 6)
+            out.append(h)
+        return out
+
+
+def exclude_seen(hits, messages):
+    """Remove trechos que já estão no contexto (mesmo conteúdo)."""
+    seen = {(m.get("content") or "").strip() for m in messages}
+    return [h for h in hits if (h.get("content") or "").strip() not in seen]
+
+
+def format_memories(hits, label="Memórias relevantes de conversas anteriores"):
+    """Texto compacto para injetar no prompt."""
+    if not hits:
+        return None
+    lines = []
+    for h in hits:
+        text = " ".join((h.get("content") or "").split())
+        if len(text) > SNIPPET_CHARS:
+            text = text[:SNIPPET_CHARS] + "…"
+        who = "Usuário" if h.get("role") == "user" else "Beka"
+        lines.append(f"- {who}: {text}")
+    return f"{label}:\n" + "\n".join(lines)
+
+
+# ----------------- Vetores por hashing (opcional) -----------------
+def _deletion_log(table):
+    return f"{table}_vec_deleted"
+
+
+def drop_deletion_log(conn, table):
+    """Sem vetores ligados, o log de ids apagados não é necessário (nem drenado)."""
+    log = _deletion_log(table)
+    with conn:
+        conn.execute(f"DROP TRIGGER IF EXISTS {log}_ad")
+        conn.execute(f"DROP TABLE IF EXISTS {log}")
+
+
+class HashingVectorIndex:
+    """Bag-of-words com hashing (crc32) em `dim` dimensões, normalizado (cosseno).
+
+    Cada linha guarda só as dimensões não nulas (formato CSR: indptr/indices/data),
+    ~8 bytes por token em vez de um vetor denso de `dim` floats. `<path>` guarda a
+    última compactação e cada refresh grava só as linhas com id maior que o último
+    indexado num segmento `<path>.<primeiro id>.seg`. Ids apagados (limpeza, retenção)
+    chegam por um trigger em `<tabela>_vec_deleted` e saem na compactação, que também
+    junta os segmentos quando passam de VECTOR_MAX_SEGMENTS.
+    """
+
+    def __init__(self, path, dim=VECTOR_DIM, refresh_interval=VECTOR_REFRESH_S):
+        import numpy as np  # opcional
+
+        self.np = np
+        self.path = path
+        self.dim = dim
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()          # lista de segmentos (busca x refresh)
+        self._refresh_lock = threading.Lock()  # um refresh por vez
+        self._last_refresh = float("-inf")
+        self.segments = []                     # [(ids, indptr, indices, data)] em ordem de id
+        self.last_id = 0                       # maior id já vetorizado (mesmo se apagado depois)
+        files = ([path] if os.path.exists(path) else []) + self._segment_files()
+        for f in files:
+            with np.load(f) as data:
+                if "indptr" not in data.files or int(data["dim"]) != dim:
+                    break  # formato denso antigo ou outra dimensão
+                if int(data["last"]) <= self.last_id:
+                    continue  # já está na compactação (queda antes de apagar os segmentos)
+                self.segments.append(tuple(data[k] for k in ("ids", "indptr", "indices", "data")))
+                self.last_id = int(data["last"])
+        else:
+            return
+        self.reset()  # reindexa do zero
+
+    def init(self, conn, table):
+        """Log de ids apagados (trigger AFTER DELETE); ao criá-lo, reindexa tudo uma vez."""
+        log = _deletion_log(table)
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (log,)
+        ).fetchone()
+        with conn:
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {log} (id INTEGER PRIMARY KEY)")
+            conn.execute(f"""CREATE TRIGGER IF NOT EXISTS {log}_ad AFTER DELETE ON {table} BEGIN
+                INSERT OR IGNORE INTO {log} (id) VALUES (old.id);
+            END""")
+        if not exists and self.last_id:
+            # apagados enquanto o log não existia não seriam vistos
+            self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.segments = []
+            self.last_id = 0
+        for f in [self.path] + self._segment_files():
+            if os.path.exists(f):
+                os.remove(f)
+
+    def _segment_files(self):
+        return sorted(glob.glob(glob.escape(self.path) + ".*.seg"))
+
+    def _segment_path(self, ids):
+        return f"{self.path}.{int(ids[0]):012d}.seg"
+
+    @property
+    def ids(self):
+        with self._lock:
+            segments = list(self.segments)
+        if not segments:
+            return self.np.zeros(0, dtype=self.np.int64)
+        return self.np.concatenate([s[0] for s in segments])
+
+    def embed(self, text):
+        """(índices, pesos) das dimensões não nulas do vetor normalizado."""
+        np = self.np
+        counts = {}
+        for tok in query_terms(text, limit=10_000):
+            h = zlib.crc32(tok.encode("utf-8")) % self.dim
+            counts[h] = counts.get(h, 0) + 1
+        indices = np.fromiter(counts.keys(), dtype=np.int32, count=len(counts))
+        weights = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+        norm = np.sqrt((weights * weights).sum())
+        return indices, (weights / norm if norm else weights)
+
+    def _segment(self, rows):
+        np = self.np
+        vecs = [self.embed(text) for _, text in rows]
+        indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum([len(i) for i, _ in vecs], out=indptr[1:])
+        empty_i, empty_w = np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+        return (np.array([r[0] for r in rows], dtype=np.int64), indptr,
+                np.concatenate([i for i, _ in vecs] or [empty_i]),
+                np.concatenate([w for _, w in vecs] or [empty_w]))
+
+    def _save(self, path, segment, last):
+        ids, indptr, indices, data = segment
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            self.np.savez(f, ids=ids, indptr=indptr, indices=indices, data=data, dim=self.dim, last=last)
+        os.replace(tmp, path)
+
+    def schedule(self, db_path, table, text_col):
+        """Dispara refresh() numa thread se o último foi há mais de refresh_interval."""
+        now = time.monotonic()
+        if now - self._last_refresh < self.refresh_interval or self._refresh_lock.locked():
+            return False
+        self._last_refresh = now
+
+        def run():
+            try:
+                self.refresh(db.get_connection(db_path), table, text_col)
+            finally:
+                db.release_connections()
+
+        threading.Thread(target=run, daemon=True, name=f"vectors-{table}").start()
+        return True
+
+    def refresh(self, conn, table, text_col):
+        """Vetoriza as linhas com id > last_id (um segmento) e tira os ids apagados."""
+        if not self._refresh_lock.acquire(blocking=False):
+            return 0
+        try:
+            np = self.np
+            log = _deletion_log(table)
+            # o log é lido antes das linhas novas: um id apagado depois disto fica para
+            # o próximo refresh, nunca se perde
+            deleted = [r[0] for r in conn.execute(f"SELECT id FROM {log}")]
+            rows = conn.execute(f"SELECT id, {text_col} FROM {table} WHERE id > ? ORDER BY id",
+                                (self.last_id,)).fetchall()
+            if rows:
+                segment = self._segment(rows)
+                last = rows[-1][0]
+                self._save(self._segment_path(segment[0]), segment, last)
+                with self._lock:
+                    self.segments.append(segment)
+                    self.last_id = last
+            stale = np.intersect1d(self.ids, np.array(deleted, dtype=np.int64)) if deleted else ()
+            with self._lock:
+                too_many = len(self.segments) > VECTOR_MAX_SEGMENTS
+            if len(stale) or too_many:
+                self.compact(stale)
+            for i in range(0, len(deleted), 500):
+                chunk = deleted[i:i + 500]
+                with conn:
+                    conn.execute(f"DELETE FROM {log} WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+            return len(rows)
+        finally:
+            self._refresh_lock.release()
+
+    def compact(self, removed_ids=()):
+        """Junta os segmentos em `<path>`, sem as linhas de `removed_ids`."""
+        np = self.np
+        with self._lock:
+            segments = list(self.segments)
+            last = self.last_id
+        if not segments:
+            return
+        ids = np.concatenate([s[0] for s in segments])
+        lengths = np.concatenate([np.diff(s[1]) for s in segments])
+        indices = np.concatenate([s[2] for s in segments])
+        data = np.concatenate([s[3] for s in segments])
+        keep = ~np.isin(ids, removed_ids)
+        entry_keep = np.repeat(keep, lengths)
+        indptr = np.zeros(int(keep.sum()) + 1, dtype=np.int64)
+        np.cumsum(lengths[keep], out=indptr[1:])
+        merged = (ids[keep], indptr, indices[entry_keep], data[entry_keep])
+        self._save(self.path, merged, last)
+        with self._lock:
+            # refresh() e compact() não rodam juntos: nenhum segmento novo apareceu
+            self.segments = [merged]
+        for f in self._segment_files():
+            os.remove(f)
+
+    def search(self, text, k):
+        np = self.np
+        with self._lock:
+            segments = list(self.segments)
+        if not segments:
+            return []
+        ids = np.concatenate([s[0] for s in segments])
+        if not len(ids):
+            return []
+        q = np.zeros(self.dim, dtype=np.float32)
+        q_indices, q_weights = self.embed(text)
+        q[q_indices] = q_weights
+        sims = np.concatenate([self._dot(s, q) for s in segments])
+        k = min(k, len(sims))
+        top = np.argpartition(-sims, k - 1)[:k]
+        top = top[np.argsort(-sims[top])]
+        return [(int(ids[i]), float(sims[i])) for i in top if sims[i] > 0]
+
+    def _dot(self, segment, q):
+        # produto escalar de cada linha CSR com q (denso): soma por linha via cumsum
+        np = self.np
+        _, indptr, indices, data = segment
+        acc = np.zeros(len(data) + 1, dtype=np.float64)
+        np.cumsum(data * q[indices], out=acc[1:])
+        return acc[indptr[1:]] - acc[indptr[:-1]]
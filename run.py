@@ -0,0 +1,127 @@
+# run.py
+# Launcher de produção para serve.py, server.py e beka_app.py.
+#
+#   python run.py serve                       # waitress, threads calculadas
+#   python run.py server --port 5000 --threads 48
+#   python run.py serve --server gunicorn --workers 2     (Linux/Mac; só serve.py)
+#
+# Nenhuma rota precisa ser assíncrona: o que prende uma thread por até 60 s é a
+# chamada ao LLM, e ela já passa pelo controle de admissão de llm_client.py
+# (LLM_MAX_IN_FLIGHT por backend gerando + LLM_MAX_QUEUE esperando; o resto recebe 503 na
+# hora). Com mais threads do que esse teto, sempre sobram COMMAND_THREADS livres
+# para comandos, buscas e uploads, que só fazem SQLite (ms).
+import argparse
+import importlib
+import os
+import sys
+
+try:
+    from dotenv import load_dotenv
+except ImportError:  # python-dotenv só é obrigatório para serve.py
+    load_dotenv = None
+if load_dotenv:
+    load_dotenv()  # antes de llm_client e dos apps: as variáveis LLM_*/DB_* são lidas no import
+
+import llm_client  # noqa: E402
+
+# módulo, porta padrão, se init_db() precisa ser chamado (serve.py já o chama no import)
+APPS = {
+    "serve": ("serve", 5000, False),
+    "server": ("server", 5000, True),
+    "beka_app": ("beka_app", 5001, True),
+}
+# estado em memória que só é consistente num único processo: a cache de histórico e a
+# fila de gravação mesclada nas leituras (server.py) e o journal de memory.jsonl
+# (beka_app.py). Nesses apps --workers > 1 é recusado.
+SINGLE_PROCESS_APPS = {"server", "beka_app"}
+COMMAND_THREADS = int(os.getenv("BEKA_COMMAND_THREADS", "16"))
+LLM_THREADS = llm_client.LLM_TOTAL_IN_FLIGHT + llm_client.LLM_MAX_QUEUE
+# acima do timeout do LLM, para o worker não ser morto no meio de uma geração
+WORKER_TIMEOUT = int(os.getenv("BEKA_WORKER_TIMEOUT", str(int(llm_client.LLM_TIMEOUT) + 30)))
+
+
+def default_threads():
+    return int(os.getenv("BEKA_THREADS", str(LLM_THREADS + COMMAND_THREADS)))
+
+
+def load_app(name):
+    module_name, _, needs_init = APPS[name]
+    module = importlib.import_module(module_name)
+    if needs_init:
+        module.init_db()  # server.py/beka_app.py só o chamam no __main__
+    return module.app
+
+
+def run_waitress(app, host, port, threads):
+    from waitress import serve
+
+    serve(app, host=host, port=port, threads=threads, channel_timeout=WORKER_TIMEOUT, ident="beka")
+
+
+def run_gunicorn(name, host, port, threads, workers):
+    from gunicorn.app.base import BaseApplication
+
+    class Launcher(BaseApplication):
+        def load_config(self):
+            for key, value in {
+                "bind": f"{host}:{port}",
+                "workers": workers,
+                "worker_class": "gthread",
+                "threads": threads,
+                "timeout": WORKER_TIMEOUT,
+                "graceful_timeout": 30,
+                "keepalive": 5,
+            }.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            # carregado em cada worker (após o fork): conexões SQLite e sessão HTTP
+            # do LLM nunca são compartilhadas entre processos
+            return load_app(name)
+
+    Launcher().run()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sobe uma das apps da Beka em servidor de produção")
+    parser.add_argument("app", choices=sorted(APPS))
+    parser.add_argument("--server", choices=("waitress", "gunicorn", "dev"),
+                        default=os.getenv("BEKA_SERVER", "waitress"))
+    parser.add_argument("--host", default=os.getenv("BEKA_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=None)
+    parser.add_argument("--threads", type=int, default=default_threads())
+    parser.add_argument("--workers", type=int, default=int(os.getenv("BEKA_WORKERS", "1")))
+    args = parser.parse_args(argv)
+    port = args.port or int(os.getenv("APP_PORT", APPS[args.app][1]))
+
+    if args.threads <= LLM_THREADS:
+        print(f"⚠️ {args.threads} thread(s) <= {LLM_THREADS} (capacidade dos backends + LLM_MAX_QUEUE): "
+              "comandos podem esperar atrás de gerações do LLM.", file=sys.stderr)
+    if args.workers > 1:
+        if args.app in SINGLE_PROCESS_APPS:
+            sys.exit(f"❌ {args.app} guarda histórico e fila de gravação em memória: use --workers 1 "
+                     "(e mais --threads).")
+        # a fila de gravação de serve.py é por processo: com vários workers uma leitura
+        # não veria o que outro worker ainda não gravou, então cada linha vai direto ao banco
+        if os.getenv("WRITE_DURABILITY", "async").lower() != "direct":
+            os.environ["WRITE_DURABILITY"] = "direct"
+            print("ℹ️ vários workers: WRITE_DURABILITY=direct (sem fila de gravação em memória).",
+                  file=sys.stderr)
+        # semáforo do LLM e jobs de importação são por processo
+        print(f"ℹ️ {args.workers} workers: até {args.workers * llm_client.LLM_TOTAL_IN_FLIGHT} gerações "
+              "simultâneas no LLM; /upload/jobs só enxerga os jobs do próprio worker.", file=sys.stderr)
+
+    print(f"Beka [{args.app}] em http://{args.host}:{port} — {args.server}, "
+          f"{args.workers} worker(s) x {args.threads} thread(s)")
+    if args.server == "gunicorn":
+        run_gunicorn(args.app, args.host, port, args.threads, args.workers)
+    elif args.server == "waitress":
+        if args.workers > 1:
+            print("⚠️ waitress roda um único processo; --workers ignorado.", file=sys.stderr)
+        run_waitress(load_app(args.app), args.host, port, args.threads)
+    else:
+        load_app(args.app).run(host=args.host, port=port, threaded=True, debug=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -95,6 +95,99 @@ input.addEventListener("keydown", (event) => {
     messageDiv.appendChild(bubble);
     chatBox.appendChild(messageDiv);
     chatBox.scrollTop = chatBox.scrollHeight;
+    return bubble;
+  }
+
+  // resultados estruturados (ex.: "técnicos de RJ") viram uma tabela paginada
+  function appendRows(tbody, items) {
+    items.forEach(t => {
+      const tr = document.createElement("tr");
+      [t.nome, t.cpf, t.rg, t.telefone].forEach(v => {
+        const td = document.createElement("td");
+        td.textContent = v || "-";
+        tr.appendChild(td);
+      });
+      tbody.appendChild(tr);
+    });
+  }
+
+  function renderResults(bubble, results) {
+    if (!results || results.type !== "tecnicos") return;
+    const table = document.createElement("table");
+    table.classList.add("results-table");
+    table.innerHTML = "<thead><tr><th>Nome</th><th>CPF</th><th>RG</th><th>Telefone</th></tr></thead>";
+    const tbody = document.createElement("tbody");
+    table.appendChild(tbody);
+    appendRows(tbody, results.items || []);
+    bubble.appendChild(table);
+
+    let nextUrl = results.next_url;
+    if (nextUrl) {
+      const more = document.createElement("button");
+      more.classList.add("load-more-btn");
+      more.textContent = "Carregar mais";
+      more.addEventListener("click", async () => {
+        more.disabled = true;
+        try {
+          const res = await fetch(`${API_FLASK}${nextUrl}`);
+          const data = await res.json();
+          appendRows(tbody, data.results || []);
+          const limit = (results.items || []).length || 50;
+          nextUrl = data.has_more
+            ? `/technicians/search?estado=${encodeURIComponent(results.estado)}&offset=${data.next_offset}&limit=${limit}`
+            : null;
+        } catch (err) {
+          console.error("Erro ao carregar mais:", err);
+        } finally {
+          more.disabled = false;
+          if (!nextUrl) more.remove();
+        }
+      });
+      bubble.appendChild(more);
+    }
+    chatBox.scrollTop = chatBox.scrollHeight;
+  }
+
+  // lê a resposta text/event-stream de /chat/stream e vai escrevendo na bolha
+  async function streamReply(res, bubble) {
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    let text = "";
+    let results = null;
+
+    const handleEvent = (raw) => {
+      let event = "message";
+      let data = "";
+      raw.split("\n").forEach(line => {
+        if (line.startsWith("event:")) event = line.slice(6).trim();
+        else if (line.startsWith("data:")) data += line.slice(5).trim();
+      });
+      if (!data) return;
+      const payload = JSON.parse(data);
+      if (event === "message" && payload.delta) {
+        text += payload.delta;
+      } else if (event === "done" || event === "error") {
+        text = payload.reply || text;
+        results = payload.results || null;
+      }
+      bubble.innerHTML = escapeHtml(text);
+      chatBox.scrollTop = chatBox.scrollHeight;
+    };
+
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      let sep;
+      while ((sep = buffer.indexOf("\n\n")) !== -1) {
+        handleEvent(buffer.slice(0, sep));
+        buffer = buffer.slice(sep + 2);
+      }
+    }
+    if (buffer.trim()) handleEvent(buffer);
+    if (!text) bubble.innerHTML = escapeHtml("⚠️ Sem resposta do servidor.");
+    renderResults(bubble, results);
   }
 
   async function sendMessage() {
@@ -118,21 +211,39 @@ input.addEventListener("keydown", (event) => {
     sendBtn.innerHTML = '<span class="send-icon">⏳</span>';
 
     try {
-      const res = await fetch(`${API_FLASK}/chat`, {
+      const body = JSON.stringify({ message: text, session_id: sessionId });
+      const streamRes = await fetch(`${API_FLASK}/chat/stream`, {
         method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ message: text, session_id: sessionId }),
+        headers: { "Content-Type": "application/json", "Accept": "text/event-stream" },
+        body,
       });
 
+      if (streamRes.ok && streamRes.body) {
+        await streamReply(streamRes, appendMessageHTML("Beka", "…"));
+        return;
+      }
+
+      // servidor sem /chat/stream: volta para a resposta completa
+      let res = streamRes;
+      if (streamRes.status === 404 || streamRes.status === 405) {
+        res = await fetch(`${API_FLASK}/chat`, {
+          method: "POST",
+          headers: { "Content-Type": "application/json" },
+          body,
+        });
+      }
+
       if (!res.ok) {
         const txt = await res.text();
-        appendMessageHTML("Beka", `⚠️ Erro do servidor: ${txt}`);
+        let reply = null;
+        try { reply = JSON.parse(txt).reply; } catch (_) { /* resposta não é JSON */ }
+        appendMessageHTML("Beka", reply || `⚠️ Erro do servidor: ${txt}`);
         return;
       }
 
       const data = await res.json();
       const resposta = data.reply || "⚠️ Sem resposta do servidor.";
-      appendMessageHTML("Beka", resposta);
+      renderResults(appendMessageHTML("Beka", resposta), data.results);
 
     } catch (err) {
       console.error("Erro ao enviar:", err);
@@ -0,0 +1,122 @@
+# search.py
+# Índices e busca full-text (FTS5) sobre a tabela tecnicos.
+#
+# - idx_tecnicos_estado (estado, id): "técnicos de RJ" sem varrer a tabela
+# - idx_tecnicos_nome_lower (LOWER(nome)): usado por delete_tecnico_by_name
+# - tecnicos_fts: tabela FTS5 contentless mantida por triggers; a coluna `docs`
+#   guarda CPF/RG/telefone só com dígitos para achar "12345678900" ou "123.456"
+import re
+
+UFS = frozenset((
+    "AC", "AL", "AP", "AM", "BA", "CE", "DF", "ES", "GO", "MA", "MT", "MS", "MG", "PA",
+    "PB", "PR", "PE", "PI", "RJ", "RN", "RS", "RO", "RR", "SC", "SP", "SE", "TO",
+))
+
+MAX_PAGE_SIZE = 200
+FTS_COLUMNS = ("nome", "cpf", "rg", "telefone", "outros", "docs")
+# pesos do bm25 na ordem de FTS_COLUMNS
+BM25_WEIGHTS = (10.0, 6.0, 6.0, 6.0, 1.0, 6.0)
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+_DIGITS_RE = re.compile(r"\D")
+
+
+def _digits_sql(col):
+    expr = f"COALESCE({col}, '')"
+    for ch in (".", "-", "(", ")", "/", " "):
+        expr = f"REPLACE({expr}, '{ch}', '')"
+    return expr
+
+
+def _fts_values(prefix):
+    docs = " || ' ' || ".join(_digits_sql(f"{prefix}.{c}") for c in ("cpf", "rg", "telefone"))
+    cols = ", ".join(f"{prefix}.{c}" for c in FTS_COLUMNS[:-1])
+    return f"{prefix}.id, {cols}, {docs}"
+
+
+FTS_COLS_SQL = ", ".join(FTS_COLUMNS)
+
+SCHEMA_STATEMENTS = (
+    "CREATE INDEX IF NOT EXISTS idx_tecnicos_estado ON tecnicos (estado, id)",
+    "CREATE INDEX IF NOT EXISTS idx_tecnicos_nome_lower ON tecnicos (LOWER(nome))",
+    f"""CREATE TRIGGER IF NOT EXISTS tecnicos_fts_ai AFTER INSERT ON tecnicos BEGIN
+        INSERT INTO tecnicos_fts (rowid, {FTS_COLS_SQL}) VALUES ({_fts_values("new")});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS tecnicos_fts_ad AFTER DELETE ON tecnicos BEGIN
+        INSERT INTO tecnicos_fts (tecnicos_fts, rowid, {FTS_COLS_SQL}) VALUES ('delete', {_fts_values("old")});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS tecnicos_fts_au AFTER UPDATE ON tecnicos BEGIN
+        INSERT INTO tecnicos_fts (tecnicos_fts, rowid, {FTS_COLS_SQL}) VALUES ('delete', {_fts_values("old")});
+        INSERT INTO tecnicos_fts (rowid, {FTS_COLS_SQL}) VALUES ({_fts_values("new")});
+    END""",
+)
+
+
+def init_search(conn):
+    """Cria índices, tabela FTS5 e triggers; indexa linhas antigas na primeira vez."""
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'tecnicos_fts'"
+    ).fetchone()
+    with conn:
+        if not exists:
+            conn.execute(f"""
+                CREATE VIRTUAL TABLE tecnicos_fts USING fts5(
+                    {FTS_COLS_SQL},
+                    content='',
+                    tokenize='unicode61 remove_diacritics 2',
+                    prefix='2 3'
+                )
+            """)
+            conn.execute(f"INSERT INTO tecnicos_fts (rowid, {FTS_COLS_SQL}) "
+                         f"SELECT {_fts_values('t')} FROM tecnicos t")
+        for stmt in SCHEMA_STATEMENTS:
+            conn.execute(stmt)
+
+
+def build_match_query(q):
+    """Transforma texto livre numa expressão FTS5 segura com busca por prefixo."""
+    terms = []
+    for tok in q.split():
+        # mesma regra de "dígito" da coluna docs: "²" passa em isdigit() mas não em \d
+        digits = _DIGITS_RE.sub("", tok)
+        if digits and not any(c.isalpha() for c in tok):
+            # documento/telefone: compara só os dígitos (coluna docs)
+            terms.append(f'"{digits}"*')
+            continue
+        for word in _TOKEN_RE.findall(tok):
+            terms.append(f'"{word}"*')
+    return " ".join(terms)
+
+
+def search_tecnicos(conn, q=None, estado=None, limit=50, offset=0):
+    """Busca paginada. Com `q` ordena por bm25; só com `estado` lista do mais novo ao mais antigo."""
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    offset = max(0, int(offset))
+    cols = "t.id, t.estado, t.nome, t.cpf, t.rg, t.telefone, t.outros, t.created_at"
+    match = build_match_query(q) if q else ""
+    if match:
+        weights = ", ".join(str(w) for w in BM25_WEIGHTS)
+        sql = (f"SELECT {cols}, bm25(tecnicos_fts, {weights}) AS score "
+               "FROM tecnicos_fts JOIN tecnicos t ON t.id = tecnicos_fts.rowid "
+               "WHERE tecnicos_fts MATCH ?")
+        params = [match]
+        if estado:
+            sql += " AND t.estado = ?"
+            params.append(estado)
+        sql += " ORDER BY score LIMIT ? OFFSET ?"
+    elif estado:
+        sql = f"SELECT {cols}, NULL AS score FROM tecnicos t WHERE t.estado = ? ORDER BY t.id DESC LIMIT ? OFFSET ?"
+        params = [estado]
+    else:
+        return [], False
+    # busca uma linha a mais para saber se existe próxima página
+    params += [limit + 1, offset]
+    rows = conn.execute(sql, params).fetchall()
+    has_more = len(rows) > limit
+    results = []
+    for r in rows[:limit]:
+        _id, uf, nome, cpf, rg, tel, outros, created, score = r
+        results.append({"id": _id, "estado": uf, "nome": nome, "cpf": cpf, "rg": rg, "telefone": tel,
+                        "outros": outros, "created_at": created,
+                        "score": round(-score, 4) if score is not None else None})
+    return results, has_more
@@ -1,29 +1,54 @@
 # server.py
 import os
-import re
 import sqlite3
 import datetime
 import json
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory, stream_with_context
 from flask_cors import CORS
 from dotenv import load_dotenv
-import minha_ia
-import pandas as pd  # só se for usar upload de planilha
 
+# before the app modules: llm_client, llm_cache, db, write_queue, retention... read
+# their settings from the environment when they are imported
 load_dotenv()
 
+import minha_ia
+import llm_client
+import llm_cache
+import db
+import tecnicos
+import importer
+import exporter
+import search
+import intents
+import retrieval
+import metrics
+import write_queue
+import retention
+import upload_store
+from llm_stream import sse, SSE_HEADERS
+from tecnicos import BANCO_RE, detect_estado, split_records
+
 APP_PORT = int(os.getenv("APP_PORT", "5000"))
 STATIC_FOLDER = os.path.join(os.getcwd(), "static")
 DB_FILE = os.getenv("DB_FILE", "backup.db")
 UPLOAD_FOLDER = os.path.join(os.getcwd(), "uploads")
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+BULK_MAX_RECORDS = int(os.getenv("BULK_MAX_RECORDS", "50000"))
+QUERY_PAGE_SIZE = 50
 
 app = Flask(__name__, static_folder=STATIC_FOLDER, static_url_path="/static")
 CORS(app, resources={r"/*": {"origins": "*"}})
+db.init_app(app)
+metrics.init_app(app, "serve")  # per-stage timings + GET /metrics
+# relevance index over conversas for long-term memory (see retrieval.py)
+memory_index = retrieval.MemoryIndex("conversas", vector_path=f"{DB_FILE}.conversas.vec.npz")
+# uploads keyed by sha256 + parsed columnar cache (see upload_store.py)
+uploads = upload_store.UploadStore(UPLOAD_FOLDER, DB_FILE)
 
 # ----------------- DB helpers -----------------
 def get_conn():
-    return sqlite3.connect(DB_FILE, check_same_thread=False)
+    # long-lived, per-thread connection (WAL + cached statements) — see db.py
+    return db.get_connection(DB_FILE)
 
 def init_db():
     conn = get_conn()
@@ -48,33 +73,37 @@ def init_db():
         created_at TEXT
     );
     """)
+    # conversas.kind/meta: command results are logged as compact references
+    cols = {r[1] for r in c.execute("PRAGMA table_info(conversas)")}
+    if "kind" not in cols:
+        c.execute("ALTER TABLE conversas ADD COLUMN kind TEXT NOT NULL DEFAULT 'text'")
+    if "meta" not in cols:
+        c.execute("ALTER TABLE conversas ADD COLUMN meta TEXT")
     conn.commit()
-    conn.close()
-
-def save_conversa(role, content):
+    # cpf_norm + unique index; merges duplicates left by older versions (runs once)
+    merged = tecnicos.init_cpf_index(conn)
+    if merged:
+        app.logger.info("init_db: merged %d duplicate tecnico(s) by CPF", merged)
+    # indexes + FTS5 table/triggers over tecnicos (see search.py)
+    search.init_search(conn)
+    memory_index.init(conn)
+    # cold conversas rows -> gzip archive segments + incremental VACUUM/ANALYZE (see retention.py)
+    retention.start_maintenance(DB_FILE, ["conversas"])
+
+# conversation log is written behind the request, in batches (see write_queue.py)
+conversation_log = write_queue.WriteQueue(
+    DB_FILE, "INSERT INTO conversas (role, content, created_at, kind, meta) VALUES (?, ?, ?, ?, ?)",
+    name="conversas-writer")
+
+def save_conversa(role, content, kind="text", meta=None):
+    conversation_log.put((role, content, datetime.datetime.utcnow().isoformat(), kind,
+                          json.dumps(meta, ensure_ascii=False) if meta is not None else None))
+
+def count_tecnicos_estado(estado):
+    # COUNT/MAX straight from the (estado, id) index
     conn = get_conn()
-    c = conn.cursor()
-    c.execute("INSERT INTO conversas (role, content, created_at) VALUES (?, ?, ?)",
-              (role, content, datetime.datetime.utcnow().isoformat()))
-    conn.commit()
-    conn.close()
-
-def insert_tecnico(estado, nome, cpf=None, rg=None, telefone=None, outros=None):
-    conn = get_conn()
-    c = conn.cursor()
-    c.execute("""INSERT INTO tecnicos (estado, nome, cpf, rg, telefone, outros, created_at)
-                 VALUES (?, ?, ?, ?, ?, ?, ?)""",
-              (estado, nome, cpf, rg, telefone, outros, datetime.datetime.utcnow().isoformat()))
-    conn.commit()
-    conn.close()
-
-def query_tecnicos_estado(estado, limit=500):
-    conn = get_conn()
-    c = conn.cursor()
-    c.execute("SELECT id, nome, cpf, rg, telefone, outros, created_at FROM tecnicos WHERE estado = ? ORDER BY id DESC LIMIT ?", (estado, limit))
-    rows = c.fetchall()
-    conn.close()
-    return rows
+    row = conn.execute("SELECT COUNT(*), MAX(id) FROM tecnicos WHERE estado = ?", (estado,)).fetchone()
+    return row[0], row[1]
 
 def delete_tecnico_by_name(nome):
     conn = get_conn()
@@ -82,89 +111,147 @@ def delete_tecnico_by_name(nome):
     c.execute("DELETE FROM tecnicos WHERE LOWER(nome) = LOWER(?)", (nome.strip(),))
     deleted = c.rowcount
     conn.commit()
-    conn.close()
     return deleted
 
 def get_recent_conversation(limit=20):
     conn = get_conn()
-    c = conn.cursor()
-    c.execute("SELECT role, content FROM conversas ORDER BY id DESC LIMIT ?", (limit,))
-    rows = c.fetchall()
-    conn.close()
+    with conversation_log.read_lock():
+        rows = conn.execute("SELECT role, content, kind, meta FROM conversas ORDER BY id DESC LIMIT ?",
+                            (limit,)).fetchall()
+        # messages not flushed yet are the newest ones
+        pending = [(r[0], r[1], r[3], r[4]) for r in conversation_log.pending()]
     # return as list oldest->newest
-    return [{"role": r[0], "content": r[1]} for r in rows[::-1]]
+    rows = (rows[::-1] + pending)[-limit:]
+    return [{"role": r[0], "content": r[1], "kind": r[2], "meta": json.loads(r[3]) if r[3] else None}
+            for r in rows]
 
 init_db()
 
-# ----------------- Parsing helpers -----------------
-CPF_RE = re.compile(r"\b\d{3}\.?\d{3}\.?\d{3}-?\d{2}\b")
-TEL_RE = re.compile(r"(\(?\d{2,3}\)?\s?\d{4,5}[-\s]?\d{4})")
-PLACA_RE = re.compile(r"\b[A-Z]{1,3}-?\d{1,4}[A-Z]{0,2}\b", re.IGNORECASE)
-
-def detect_estado(text):
-    # procura "DE RJ" ou "RJ" isolado depois de 'TÉCNICOS' / 'DADOS'
-    m = re.search(r"TECNIC?OS?.*DE\s+([A-Za-z]{1,3})", text, re.IGNORECASE)
-    if m:
-        return m.group(1).upper()
-    m2 = re.search(r"DADOS.*DE\s+([A-Za-z]{1,3})", text, re.IGNORECASE)
-    if m2:
-        return m2.group(1).upper()
-    # procura sigla isolada
-    m3 = re.search(r"\b(RJ|SP|MG|BA|PR|RS|SC|DF|GO|ES|PE|CE|PB|SE|AL|PI|MA)\b", text, re.IGNORECASE)
-    if m3:
-        return m3.group(1).upper()
-    return None
-
-def split_records(block):
-    # tenta dividir em linhas por ; ou \n
-    if not block:
-        return []
-    if ";" in block:
-        parts = [p.strip() for p in block.split(";") if p.strip()]
-        return parts
-    lines = [l.strip() for l in block.splitlines() if l.strip()]
-    if lines:
-        return lines
-    # fallback: split by comma but careful
-    parts = [p.strip() for p in re.split(r",\s*(?=[A-Z])", block) if p.strip()]
-    return parts
-
-def parse_technician(line):
-    # heurística simples
-    nome = None
-    cpf = None
-    telefone = None
-    rg = None
-
-    cpf_m = CPF_RE.search(line)
-    if cpf_m: cpf = cpf_m.group(0)
-
-    tel_m = TEL_RE.search(line)
-    if tel_m: telefone = tel_m.group(1)
-
-    rg_m = re.search(r"\bRG[:\s]*([\d\.\-]+)\b", line, re.IGNORECASE)
-    if rg_m: rg = rg_m.group(1)
-
-    # tentative name: text before CPF or before 'CPF' literal or before phone
-    cut_pos = None
-    mcpf = re.search(r"\bCPF\b", line, re.IGNORECASE)
-    if mcpf:
-        cut_pos = mcpf.start()
-    elif cpf_m:
-        cut_pos = cpf_m.start()
-    elif tel_m:
-        cut_pos = tel_m.start()
-    if cut_pos:
-        cand = line[:cut_pos].strip().strip(":,-")
+# ----------------- Chat commands -----------------
+router = intents.build_command_router()
+
+@router.handler("delete")
+def cmd_delete(m, user_msg):
+    # 'DELETE <nome>' or 'delete: <nome>' at start (case-insensitive)
+    target = m.group("delete_target").strip()
+    if not target:
+        return "⚠️ Informe o nome para deletar: exemplo 'DELETE Maicon'."
+    deleted = delete_tecnico_by_name(target)
+    if deleted > 0:
+        return f"✅ Removido(s) {deleted} registro(s) com nome '{target}'."
+    return f"❌ Nenhum técnico chamado '{target}' encontrado no banco."
+
+@router.handler("save")
+def cmd_save(m, user_msg):
+    # "guarde no banco:" or "guardar no banco"
+    with metrics.span("parse"):
+        estado = detect_estado(user_msg) or "DESCONHECIDO"
+        # extract data part after ':' if present
+        if ":" in user_msg:
+            after = user_msg.split(":", 1)[1].strip()
+        else:
+            # take after 'banco'
+            parts = BANCO_RE.split(user_msg)
+            after = parts[1].strip() if len(parts) > 1 else ""
+        regs = split_records(after) if after else []
+    if not after:
+        return "⚠️ Não encontrei dados após o comando. Use: 'Guarde no banco: <dados; separados; por ;>'."
+
+    # whole block goes in one transaction (upsert by CPF) — see tecnicos.ingest
+    accepted, _, counts = tecnicos.ingest(get_conn(), regs, default_estado=estado)
+    examples = accepted[:5]
+    reply = (f"✅ Salvos {len(accepted)} registro(s) para {estado}: {counts['inserted']} novo(s), "
+             f"{counts['updated']} atualizado(s), {counts['unchanged']} sem alteração.")
+    if examples:
+        reply += "\nExemplo(s):\n" + "\n".join([f"- {e.get('nome') or '(sem nome)'} | CPF: {e.get('cpf') or '-'} | Tel: {e.get('telefone') or '-'}" for e in examples])
+    return reply
+
+@router.handler("query")
+def cmd_query(m, user_msg):
+    # 'técnicos de RJ' or 'tecnicos de RJ' -> first page as structured data,
+    # rendered by the frontend; the conversation log only keeps a reference
+    estado = m.group("query_estado").upper()
+    total, max_id = count_tecnicos_estado(estado)
+    if not total:
+        return f"❌ Não encontrei técnicos cadastrados para {estado}."
+    items, has_more = search.search_tecnicos(get_conn(), estado=estado, limit=QUERY_PAGE_SIZE)
+    return {
+        "reply": f"📋 Técnicos de {estado} — total: {total}",
+        "results": {
+            "type": "tecnicos",
+            "estado": estado,
+            "total": total,
+            "items": items,
+            "has_more": has_more,
+            "next_url": f"/technicians/search?estado={estado}&offset={len(items)}&limit={QUERY_PAGE_SIZE}" if has_more else None,
+        },
+        "ref": {"query": "tecnicos_estado", "estado": estado, "count": total, "max_id": max_id},
+    }
+
+def handle_command(user_msg):
+    """Classifies the message in one pass (see intents.py) and runs its handler.
+
+    Returns a dict with at least "reply" (plus optional structured "results"),
+    or None when the message is normal conversation that should go to the LLM.
+    """
+    result = router.dispatch(user_msg)
+    if result is None:
+        return None
+    return {"reply": result} if isinstance(result, str) else result
+
+def save_command_reply(result):
+    """Logs a command reply; structured results are stored as a compact reference."""
+    ref = result.pop("ref", None)
+    if ref:
+        content = f"[consulta] técnicos de {ref['estado']}: {ref['count']} registro(s)"
+        save_conversa("assistant", content, kind="query_ref", meta=ref)
     else:
-        # try take up to first digit sequence
-        cand = re.split(r"\d", line, 1)[0].strip().strip(":,-")
-    # cleanup known labels
-    cand = re.sub(r"\b(DADOS|TECNICOS|TÉCNICOS|DE|DO|DOS)\b", "", cand, flags=re.IGNORECASE).strip()
-    if cand:
-        nome = cand
-    outros = line
-    return {"nome": nome, "cpf": cpf, "rg": rg, "telefone": telefone, "outros": outros}
+        save_conversa("assistant", result["reply"])
+    return result
+
+def build_lm_history(limit=12):
+    # build history to provide context (last `limit` messages)
+    recent = get_recent_conversation(limit=limit)
+    # convert to LM messages format
+    lm_history = []
+    for m in recent:
+        role = m["role"]
+        content = m["content"]
+        if m.get("kind") == "query_ref" and m.get("meta"):
+            # never feed rendered reports back to the model, only what was shown
+            ref = m["meta"]
+            content = f"(Mostrei ao usuário a lista de técnicos de {ref['estado']}: {ref['count']} registro(s).)"
+        # keep roles as user/assistant; system message injected inside minha_ia
+        lm_history.append({"role": "user" if role == "user" else "assistant", "content": content})
+    return lm_history
+
+def with_memories(user_msg, lm_history):
+    """Prepends older messages relevant to user_msg (BM25, see retrieval.py) to the history."""
+    if not retrieval.RETRIEVAL_TOP_K:
+        return lm_history
+    hits = memory_index.search(get_conn(), user_msg, k=retrieval.RETRIEVAL_TOP_K,
+                               where="t.kind = 'text'")
+    note = retrieval.format_memories(retrieval.exclude_seen(hits, lm_history))
+    if not note:
+        return lm_history
+    return [{"role": "system", "content": note}] + lm_history
+
+# ----------------- LLM (with response cache) -----------------
+response_cache = llm_cache.ResponseCache(DB_FILE)
+
+def cache_bypassed(data):
+    # per-request bypass: {"cache": false} or 'Cache-Control: no-cache'
+    return data.get("cache") is False or "no-cache" in (request.headers.get("Cache-Control") or "")
+
+def llm_cache_key(user_msg, lm_history):
+    # lm_history already ends with the current user message (saved before building it)
+    return response_cache.make_key(llm_client.get_client().model, llm_client.TEMPERATURE,
+                                   minha_ia.INSTRUCAO["content"], user_msg, lm_history[:-1])
+
+def ask_llm(user_msg, lm_history, bypass_cache=False):
+    key = llm_cache_key(user_msg, lm_history)
+    return response_cache.get_or_compute(
+        key, lambda: minha_ia.conversar_com_ia(user_msg, lm_history, timeout=60), bypass=bypass_cache)
 
 # ----------------- Endpoints -----------------
 @app.route("/")
@@ -182,95 +269,19 @@ def chat():
         # Save user message to history
         save_conversa("user", user_msg)
 
-        low = user_msg.lower()
-
-        # ----- DELETE command: 'DELETE <nome>' (case-insensitive) -----
-        # Accept "delete:" or "delete " at start
-        mdel = re.match(r"^\s*delete[:\s]+(.+)$", user_msg, re.IGNORECASE)
-        if mdel:
-            target = mdel.group(1).strip()
-            if not target:
-                reply = "⚠️ Informe o nome para deletar: exemplo 'DELETE Maicon'."
-            else:
-                deleted = delete_tecnico_by_name(target)
-                if deleted > 0:
-                    reply = f"✅ Removido(s) {deleted} registro(s) com nome '{target}'."
-                else:
-                    reply = f"❌ Nenhum técnico chamado '{target}' encontrado no banco."
-            save_conversa("assistant", reply)
-            return jsonify({"reply": reply})
-
-        # ----- SAVE command: "guarde no banco:" or "guardar no banco" -----
-        if re.search(r"\bguarde\b.*\bbanco\b", low) or low.startswith("guarde no banco") or low.startswith("guardar no banco") or low.startswith("guardar:"):
-            # detect state
-            estado = detect_estado(user_msg) or "DESCONHECIDO"
-            # extract data part after ':' if present
-            if ":" in user_msg:
-                after = user_msg.split(":", 1)[1].strip()
-            else:
-                # take after 'banco'
-                parts = re.split(r"\bbanco\b", user_msg, flags=re.IGNORECASE)
-                after = parts[1].strip() if len(parts) > 1 else ""
-            if not after:
-                reply = "⚠️ Não encontrei dados após o comando. Use: 'Guarde no banco: <dados; separados; por ;>'."
-                save_conversa("assistant", reply)
-                return jsonify({"reply": reply})
-
-            regs = split_records(after)
-            inserted = 0
-            examples = []
-            for r in regs:
-                parsed = parse_technician(r)
-                # Only insert if has a name or CPF
-                if parsed.get("nome") or parsed.get("cpf"):
-                    insert_tecnico(estado, parsed.get("nome") or "(sem nome)", parsed.get("cpf"), parsed.get("rg"), parsed.get("telefone"), parsed.get("outros"))
-                    inserted += 1
-                    if len(examples) < 5:
-                        examples.append(parsed)
-            reply = f"✅ Salvos {inserted} registro(s) para {estado}."
-            if examples:
-                reply += "\nExemplo(s):\n" + "\n".join([f"- {e.get('nome') or '(sem nome)'} | CPF: {e.get('cpf') or '-'} | Tel: {e.get('telefone') or '-'}" for e in examples])
-            save_conversa("assistant", reply)
-            return jsonify({"reply": reply})
-
-        # ----- QUERY command: 'técnicos de RJ' or 'tecnicos de RJ' -----
-        mq = re.search(r"\b(tecnic|t[eé]cnico|t[eé]cnicos)\b.*\bde\s+([A-Za-z]{1,3})\b", user_msg, re.IGNORECASE)
-        if mq:
-            estado = mq.group(2).upper()
-            rows = query_tecnicos_estado(estado, limit=500)
-            if not rows:
-                reply = f"❌ Não encontrei técnicos cadastrados para {estado}."
-                save_conversa("assistant", reply)
-                return jsonify({"reply": reply})
-            # format nicely
-            lines = [f"📋 Técnicos de {estado} — total: {len(rows)}\n"]
-            for i, r in enumerate(rows[:200], start=1):
-                _id, nome, cpf, rg, tel, outros, created = r
-                lines.append(f"{i}. {nome}")
-                if cpf: lines.append(f"   • CPF: {cpf}")
-                if rg: lines.append(f"   • RG: {rg}")
-                if tel: lines.append(f"   • Tel: {tel}")
-                # don't overload, but show 'outros' truncated
-                if outros:
-                    snippet = (outros[:160] + "...") if len(outros) > 160 else outros
-                    lines.append(f"   • Obs: {snippet}")
-                lines.append("")  # blank line
-            reply = "\n".join(lines)
-            save_conversa("assistant", reply)
-            return jsonify({"reply": reply})
+        result = handle_command(user_msg)
+        if result is not None:
+            return jsonify(save_command_reply(result))
 
         # ----- otherwise: forward to LM Studio (conversa normal) -----
-        # build history to provide context (last 12 messages)
-        recent = get_recent_conversation(limit=12)
-        # convert to LM messages format
-        lm_history = []
-        for m in recent:
-            role = m["role"]
-            content = m["content"]
-            # keep roles as user/assistant; system message injected inside minha_ia
-            lm_history.append({"role": "user" if role == "user" else "assistant", "content": content})
+        lm_history = with_memories(user_msg, build_lm_history(limit=12))
         try:
-            bot_reply = minha_ia.conversar_com_ia(user_msg, lm_history, timeout=60)
+            bot_reply = ask_llm(user_msg, lm_history, bypass_cache=cache_bypassed(data))
+        except llm_client.LLMOverloaded as e:
+            # fail fast instead of queueing behind other generations
+            reply = f"⏳ {e}"
+            save_conversa("assistant", reply)
+            return jsonify({"reply": reply}), 503
         except Exception as e:
             bot_reply = f"❌ Erro ao conectar ao modelo local: {e}"
 
@@ -285,6 +296,70 @@ def chat():
         # Always return JSON so front won't break
         return jsonify({"reply": f"❌ Erro interno no servidor: {str(e)}"}), 500
 
+@app.route("/chat/stream", methods=["POST"])
+def chat_stream():
+    """Same as /chat, but relays the LLM tokens as server-sent events.
+
+    Events: 'data: {"delta": ...}' per chunk, then 'event: done' with the full
+    reply (or 'event: error'). The reply is persisted when the stream ends.
+    """
+    data = request.get_json(force=True, silent=True) or {}
+    user_msg = (data.get("message") or "").strip()
+    if not user_msg:
+        return jsonify({"reply": "⚠️ Mensagem vazia"}), 400
+
+    save_conversa("user", user_msg)
+    try:
+        result = handle_command(user_msg)
+    except Exception as e:
+        result = {"reply": f"❌ Erro interno no servidor: {str(e)}"}
+    if result is not None:
+        result = save_command_reply(result)
+        def one_shot():
+            yield sse({"delta": result["reply"]})
+            yield sse(result, event="done")
+        return Response(one_shot(), mimetype="text/event-stream", headers=SSE_HEADERS)
+
+    lm_history = with_memories(user_msg, build_lm_history(limit=12))
+    bypass = cache_bypassed(data)
+    key = llm_cache_key(user_msg, lm_history)
+    cached = None if bypass else response_cache.lookup(key)
+    if cached is not None:
+        save_conversa("assistant", cached)
+        def from_cache():
+            yield sse({"delta": cached})
+            yield sse({"reply": cached, "cached": True}, event="done")
+        return Response(from_cache(), mimetype="text/event-stream", headers=SSE_HEADERS)
+
+    def generate():
+        parts = []
+        bot_reply = None
+        try:
+            for delta in minha_ia.conversar_com_ia_stream(user_msg, lm_history, timeout=60):
+                parts.append(delta)
+                yield sse({"delta": delta})
+            if parts and not bypass:
+                response_cache.store(key, "".join(parts))
+            bot_reply = "".join(parts) or "⚠️ Ocorreu um problema ao obter resposta da IA."
+            yield sse({"reply": bot_reply}, event="done")
+        except Exception as e:
+            bot_reply = "".join(parts) or f"❌ Erro ao conectar ao modelo local: {e}"
+            yield sse({"error": str(e), "reply": bot_reply}, event="error")
+        finally:
+            # runs on completion, error or client disconnect
+            if parts or bot_reply:
+                save_conversa("assistant", "".join(parts) or bot_reply)
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream", headers=SSE_HEADERS)
+
+@app.route("/llm/stats", methods=["GET"])
+def llm_stats():
+    return jsonify(llm_client.get_client().stats())
+
+@app.route("/llm/cache/stats", methods=["GET"])
+def llm_cache_stats():
+    return jsonify(response_cache.stats())
+
 # Upload endpoint (planilhas)
 @app.route("/upload", methods=["POST"])
 def upload():
@@ -294,39 +369,144 @@ def upload():
         f = request.files["file"]
         if f.filename == "":
             return jsonify({"reply": "❌ Arquivo sem nome"}), 400
-        path = os.path.join(UPLOAD_FOLDER, f.filename)
-        f.save(path)
-        # try to read with pandas if xls/xlsx/csv
+        # stored by content hash: an identical re-upload is not written or parsed again
+        sha, _ = uploads.save(f.stream, f.filename)
+        # import mode: stream the sheet into tecnicos in a background job
+        if (request.values.get("import") or "").lower() in ("1", "true", "sim", "yes"):
+            if not f.filename.lower().endswith((".xlsx", ".xlsm", ".csv")):
+                return jsonify({"reply": "❌ Importação aceita apenas .csv ou .xlsx"}), 400
+            estado = (request.values.get("estado") or "").strip().upper() or None
+            return start_upload_import(sha, f.filename, estado)
         try:
-            if f.filename.lower().endswith((".xls", ".xlsx", ".xlsm")):
-                # xlrd/openpyxl may fail on damaged files - catch exceptions
-                df = pd.read_excel(path, engine="openpyxl")
-            elif f.filename.lower().endswith(".csv"):
-                df = pd.read_csv(path)
-            else:
-                return jsonify({"reply": f"✅ Arquivo salvo: {f.filename} (não é planilha ou não foi processada)."})
-            # do not auto-insert huge datasets — just show summary
-            nrows, ncols = df.shape
-            sample = df.head(5).to_dict(orient="records")
-            return jsonify({"reply": f"✅ Planilha '{f.filename}' recebida: {nrows} linhas x {ncols} colunas. Exemplo (até 5): {sample}"})
+            if not f.filename.lower().endswith((".xls", ".xlsx", ".xlsm", ".csv")):
+                return jsonify({"reply": f"✅ Arquivo salvo: {f.filename} (não é planilha ou não foi processada).",
+                                "upload": sha})
+            with metrics.span("parse"):
+                # parsed once into the columnar cache; later previews/imports read the cache
+                meta, built = uploads.ensure_cache(sha)
+                sample = uploads.preview(sha)
+            origem = "" if built else " (já recebida antes, lida do cache)"
+            return jsonify({
+                "reply": f"✅ Planilha '{f.filename}' recebida{origem}: {meta['row_count']} linhas x "
+                         f"{len(meta['columns'])} colunas. Exemplo (até 5): {sample}",
+                "upload": sha,
+            })
         except Exception as e:
             return jsonify({"reply": f"⚠️ Erro ao ler planilha: {str(e)}. Você pode enviar os técnicos manualmente com 'Guarde no banco:'."}), 500
     except Exception as e:
         return jsonify({"reply": f"❌ Erro no upload: {str(e)}"}), 500
 
-# Simple search endpoint
+def start_upload_import(sha, filename, estado):
+    meta = uploads.get(sha)
+    job = importer.start_import(uploads.blob_path(sha, meta["ext"]), DB_FILE, filename=filename, estado=estado,
+                                chunks=lambda n: uploads.iter_chunks(sha, n))
+    return jsonify({
+        "reply": f"⏳ Importação de '{filename}' iniciada (job {job['id']}).",
+        "job": job,
+        "upload": sha,
+        "status_url": f"/upload/jobs/{job['id']}",
+    }), 202
+
+@app.route("/uploads", methods=["GET"])
+def uploads_list():
+    limit = min(int(request.args.get("limit", "100")), 1000)
+    return jsonify({"uploads": uploads.recent(limit), "stats": uploads.stats()})
+
+@app.route("/uploads/<sha>", methods=["GET"])
+def upload_info(sha):
+    meta = uploads.get(sha)
+    if not meta:
+        return jsonify({"error": "upload não encontrado"}), 404
+    if meta["cache_format"]:
+        meta["preview"] = uploads.preview(sha)
+    return jsonify(meta)
+
+@app.route("/uploads/<sha>/import", methods=["POST"])
+def upload_reimport(sha):
+    # re-import a stored upload straight from its cache (no new upload, no xlsx parsing)
+    meta = uploads.get(sha)
+    if not meta:
+        return jsonify({"error": "upload não encontrado"}), 404
+    if meta["ext"] not in (".xlsx", ".xlsm", ".csv"):
+        return jsonify({"reply": "❌ Importação aceita apenas .csv ou .xlsx"}), 400
+    estado = (request.values.get("estado") or "").strip().upper() or None
+    return start_upload_import(sha, meta["filename"], estado)
+
+@app.route("/upload/jobs", methods=["GET"])
+def upload_jobs():
+    return jsonify({"jobs": importer.list_jobs()})
+
+@app.route("/upload/jobs/<job_id>", methods=["GET"])
+def upload_job_status(job_id):
+    job = importer.get_job(job_id)
+    if not job:
+        return jsonify({"error": "job não encontrado"}), 404
+    return jsonify(job)
+
+# Bulk ingest endpoint
+@app.route("/technicians/bulk", methods=["POST"])
+def tech_bulk():
+    data = request.get_json(force=True, silent=True) or {}
+    records = data.get("records")
+    if not isinstance(records, list) or not records:
+        return jsonify({"error": "Envie 'records' como uma lista não vazia"}), 400
+    if len(records) > BULK_MAX_RECORDS:
+        return jsonify({"error": f"Máximo de {BULK_MAX_RECORDS} registros por requisição"}), 413
+    estado = (data.get("estado") or "").strip().upper() or None
+    try:
+        accepted, results, counts = tecnicos.ingest(get_conn(), records, default_estado=estado)
+    except sqlite3.Error as e:
+        return jsonify({"error": f"Erro ao gravar no banco: {e}"}), 500
+    return jsonify({
+        "accepted": len(accepted),
+        "rejected": len(results) - len(accepted),
+        **counts,
+        "results": results,
+    })
+
+# Search endpoint: full-text/prefix over nome, CPF, RG, telefone and outros
 @app.route("/technicians/search", methods=["GET"])
 def tech_search():
     q = (request.args.get("q") or "").strip()
-    if not q:
+    estado = (request.args.get("estado") or "").strip().upper() or None
+    # backwards compatible: '?q=RJ' still lists a state
+    if q and not estado and q.upper() in search.UFS:
+        estado, q = q.upper(), ""
+    if not q and not estado:
         return jsonify({"results": []})
-    estado = q.upper()
-    rows = query_tecnicos_estado(estado, limit=500)
-    results = []
-    for r in rows:
-        _id, nome, cpf, rg, tel, outros, created = r
-        results.append({"id": _id, "nome": nome, "cpf": cpf, "rg": rg, "telefone": tel, "outros": outros, "created_at": created})
-    return jsonify({"results": results})
+    try:
+        limit = int(request.args.get("limit", 50))
+        offset = int(request.args.get("offset", 0))
+    except ValueError:
+        return jsonify({"error": "limit/offset devem ser inteiros"}), 400
+    results, has_more = search.search_tecnicos(get_conn(), q=q, estado=estado, limit=limit, offset=offset)
+    next_offset = offset + len(results) if has_more else None
+    return jsonify({"results": results, "has_more": has_more, "next_offset": next_offset})
+
+# Full roster export, streamed in id order (see exporter.py): no row cap, constant memory
+@app.route("/technicians/export", methods=["GET"])
+def tech_export():
+    estado = (request.args.get("estado") or "").strip().upper() or None
+    fmt = (request.args.get("format") or "csv").lower()
+    if estado and estado not in search.UFS:
+        return jsonify({"error": f"Estado inválido: {estado}"}), 400
+    if fmt not in exporter.FORMATS:
+        return jsonify({"error": f"'format' deve ser {', '.join(exporter.FORMATS)}"}), 400
+    try:
+        after_id = int(request.args.get("after_id") or 0)
+        upto = int(request.args["upto_id"]) if request.args.get("upto_id") else None
+    except ValueError:
+        return jsonify({"error": "after_id/upto_id devem ser inteiros"}), 400
+    conn = get_conn()
+    if upto is None:
+        upto = exporter.upto_id(conn, estado)  # fixed up front so a resumed export ends at the same row
+    use_gzip = fmt != "xlsx" and "gzip" in request.accept_encodings
+    try:
+        body, mimetype = exporter.export_stream(conn, fmt, estado, after_id, upto, gzip=use_gzip)
+    except exporter.ExportError as e:  # e.g. XLSX too large to build before sending
+        return jsonify({"error": str(e)}), 400
+    headers = exporter.export_headers(fmt, estado, upto, gzip=use_gzip)
+    return Response(stream_with_context(body), mimetype=mimetype, headers=headers)
 
 if __name__ == "__main__":
     print(f"Servidor rodando em http://127.0.0.1:{APP_PORT}  — DB: {DB_FILE}")
@@ -1,26 +1,38 @@
 # Server.py
 # Servidor Flask unificado (memória + chat)
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 import sqlite3
 from datetime import datetime
-import requests
 import os
+import db
+import llm_client
+import context_builder
+import pagination
+import retrieval
+import metrics
+import write_queue
+import history_cache
+import retention
+from llm_stream import sse, SSE_HEADERS
 
 APP_PORT = int(os.environ.get("APP_PORT", 5000))
 DATABASE = "beka.db"
 
 app = Flask(__name__)
 CORS(app, resources={r"*": {"origins": "*"}})  # ajustar origem em produção
+db.init_app(app)
+metrics.init_app(app, "server")  # tempos por etapa + GET /metrics
+# índice de relevância (FTS5/BM25) sobre chat_history — ver retrieval.py
+memory_index = retrieval.MemoryIndex("chat_history", vector_path=f"{DATABASE}.chat_history.vec.npz")
 
 
 # -------------------------
 # Helpers de DB
 # -------------------------
 def get_db_connection():
-    conn = sqlite3.connect(DATABASE, check_same_thread=False)
-    conn.row_factory = sqlite3.Row
-    return conn
+    # conexão persistente por thread (ver db.py) — não fechar após o uso
+    return db.get_connection(DATABASE, row_factory=sqlite3.Row)
 
 def init_db():
     conn = get_db_connection()
@@ -34,95 +46,121 @@ def init_db():
             timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
         )
     ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_chat_history_session ON chat_history (session_id, id)')
     conn.commit()
-    conn.close()
+    context_builder.init_context_tables(conn)
+    memory_index.init(conn)
+    # arquivamento das mensagens antigas + VACUUM/ANALYZE incrementais (ver retention.py)
+    retention.start_maintenance(DATABASE, ["chat_history"])
+
+# cauda do histórico das sessões ativas em memória: o contexto de uma sessão
+# quente é montado sem ler o banco (ver history_cache.py)
+historico_cache = history_cache.HistoryCache()
+
+def _cache_mensagem_nova(row):
+    historico_cache.append(row[0], row[1], row[2])
+
+def _cache_ids_gravados(rows, first_id):
+    ids = {}
+    for i, row in enumerate(rows):
+        ids.setdefault(row[0], []).append(first_id + i)
+    for session_id, session_ids in ids.items():
+        historico_cache.assign_ids(session_id, session_ids)
+
+def _cache_linha_descartada(row):
+    # a linha ficou na cauda sem id e nunca vai ganhar um: a próxima leitura recarrega do banco
+    historico_cache.invalidate(row[0])
+
+# histórico gravado fora do caminho do request, em lotes (ver write_queue.py)
+chat_log = write_queue.WriteQueue(
+    DATABASE, "INSERT INTO chat_history (session_id, role, content, timestamp) VALUES (?, ?, ?, ?)",
+    name="chat-history-writer", on_put=_cache_mensagem_nova, on_commit=_cache_ids_gravados,
+    on_dead_letter=_cache_linha_descartada)
 
 def salvar_mensagem_db(session_id, role, content):
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute('''
-        INSERT INTO chat_history (session_id, role, content)
-        VALUES (?, ?, ?)
-    ''', (session_id, role, content))
-    conn.commit()
-    conn.close()
+    # timestamp no formato do CURRENT_TIMESTAMP (UTC), fixado na hora da mensagem
+    chat_log.put((session_id, role, content, datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")))
 
-def carregar_historico_db(session_id, limit=None):
-    conn = get_db_connection()
-    cur = conn.cursor()
-    if limit:
-        cur.execute('''
-            SELECT role, content, timestamp FROM chat_history
-            WHERE session_id = ?
-            ORDER BY id ASC LIMIT ?
-        ''', (session_id, limit))
-    else:
-        cur.execute('''
-            SELECT role, content, timestamp FROM chat_history
-            WHERE session_id = ?
-            ORDER BY id ASC
-        ''', (session_id,))
-    rows = cur.fetchall()
-    conn.close()
-    return [{"role": r["role"], "content": r["content"], "timestamp": r["timestamp"]} for r in rows]
+def mensagens_pendentes(session_id):
+    """Mensagens da sessão ainda na fila de gravação (chamar dentro de chat_log.read_lock())."""
+    return [{"role": r[1], "content": r[2], "timestamp": r[3]}
+            for r in chat_log.pending(lambda r: r[0] == session_id)]
 
 def limpar_historico_db(session_id):
     conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute('DELETE FROM chat_history WHERE session_id = ?', (session_id,))
-    conn.commit()
-    conn.close()
+    with chat_log.read_lock():
+        chat_log.discard(lambda r: r[0] == session_id)
+        conn.execute('DELETE FROM chat_history WHERE session_id = ?', (session_id,))
+        conn.commit()
+        context_builder.clear_summary(conn, session_id)
+        historico_cache.invalidate(session_id)
 
 
 # -------------------------
 # Comunicação com a IA
 # -------------------------
-LLM_URL = "http://localhost:1234/v1/chat/completions"  # ajuste se necessário
-
-def conversar_com_ia(mensagem, historico):
-    system_prompt = (
-        "Você é a Beka, assistente pessoal criada por Pedro Silva. "
-        "Você tem personalidade profissional, simpática e educada, "
-        "responde sempre de forma clara e organizada, com uma linguagem formal e fluida. "
-        "Evite apelidos, gírias e risadas como 'haha'. "
-        "Não mencione ser uma IA ou modelo. "
-        "Responda sempre em português natural e com empatia."
-    )
-
-    mensagens = [{"role": "system", "content": system_prompt}]
+# URL/modelo/limites do LLM: variáveis LLM_* lidas em llm_client.py
+SYSTEM_PROMPT = (
+    "Você é a Beka, assistente pessoal criada por Pedro Silva. "
+    "Você tem personalidade profissional, simpática e educada, "
+    "responde sempre de forma clara e organizada, com uma linguagem formal e fluida. "
+    "Evite apelidos, gírias e risadas como 'haha'. "
+    "Não mencione ser uma IA ou modelo. "
+    "Responda sempre em português natural e com empatia."
+)
+
+def montar_mensagens(mensagem, historico):
+    mensagens = [{"role": "system", "content": SYSTEM_PROMPT}]
     if historico:
         for m in historico:
             mensagens.append({"role": m["role"], "content": m["content"]})
     mensagens.append({"role": "user", "content": mensagem})
+    return mensagens
+
+def buscar_memorias(mensagem, session_id=None, k=retrieval.RETRIEVAL_TOP_K):
+    """Mensagens antigas mais relevantes para `mensagem` (todas as sessões se session_id=None)."""
+    where, args = ("t.session_id = ?", (session_id,)) if session_id else ("", ())
+    return memory_index.search(get_db_connection(), mensagem, k=k, where=where, args=args,
+                               columns=("session_id", "role", "timestamp"))
+
+def montar_contexto(session_id, mensagem):
+    # resumo + memórias relevantes + turnos recentes dentro do orçamento de tokens
+    # (ver context_builder.py); memórias de outras sessões só com RETRIEVAL_CROSS_SESSION=1
+    escopo = None if retrieval.RETRIEVAL_CROSS_SESSION else session_id
+    memorias = buscar_memorias(mensagem, escopo) if retrieval.RETRIEVAL_TOP_K else ()
+    # a cauda da sessão vem de historico_cache; o banco só é lido numa falta
+    with chat_log.read_lock():
+        return context_builder.build_context(DATABASE, session_id, SYSTEM_PROMPT, mensagem,
+                                             memories=memorias, pending=mensagens_pendentes(session_id),
+                                             cache=historico_cache)
 
-    payload = {
-        "model": "meta-llama-3-8b-instruct",
-        "messages": mensagens,
-        "temperature": 0.7,
-        "max_tokens": 1000
-    }
-
+def conversar_com_ia(mensagem, historico):
+    client = llm_client.get_client()
     try:
-        app.logger.info(f"[Beka] Enviando requisição ao modelo: {LLM_URL}")
-        resp = requests.post(LLM_URL, json=payload, timeout=30)
-
-        if resp.status_code == 200:
-            body = resp.json()
-            choice = body.get("choices", [{}])[0]
-            msg = choice.get("message", {}).get("content") or choice.get("text")
-            if not msg:
-                app.logger.warning(f"Resposta inesperada: {body}")
-                return "Desculpe, não consegui compreender totalmente sua solicitação."
-            return msg.strip()
-        else:
-            app.logger.error(f"Erro LLM ({resp.status_code}): {resp.text}")
-            return "Ocorreu um erro ao processar a resposta da Beka."
-
+        app.logger.info(f"[Beka] Enviando requisição ao modelo: {client.url}")
+        msg = client.chat(montar_mensagens(mensagem, historico), timeout=30, max_tokens=1000)
+        if not msg:
+            app.logger.warning("Resposta inesperada do modelo (sem conteúdo)")
+            return "Desculpe, não consegui compreender totalmente sua solicitação."
+        return msg.strip()
+    except llm_client.LLMOverloaded as e:
+        app.logger.warning("LLM sobrecarregado: %s", e)
+        return str(e)
+    except llm_client.LLMError as e:
+        app.logger.error(str(e))
+        return "Ocorreu um erro ao processar a resposta da Beka."
     except Exception as e:
         app.logger.exception("Falha ao chamar LLM: %s", e)
         return "Houve uma falha na comunicação com o servidor de linguagem."
 
 
+def conversar_com_ia_stream(mensagem, historico):
+    """Gera os pedaços da resposta do modelo conforme chegam (stream=True)."""
+    client = llm_client.get_client()
+    app.logger.info(f"[Beka] Enviando requisição (stream) ao modelo: {client.url}")
+    yield from client.stream(montar_mensagens(mensagem, historico), timeout=30, max_tokens=1000)
+
+
 # -------------------------
 # Rotas
 # -------------------------
@@ -139,7 +177,7 @@ def chat():
 
     app.logger.info(f"[Sessão {session_id}] Mensagem recebida: {user_message}")
 
-    historico = carregar_historico_db(session_id)
+    historico = montar_contexto(session_id, user_message)
     ai_response = conversar_com_ia(user_message, historico)
 
     salvar_mensagem_db(session_id, "user", user_message)
@@ -148,13 +186,89 @@ def chat():
     return jsonify({"reply": ai_response}), 200
 
 
+@app.route("/chat/stream", methods=["POST"])
+def chat_stream():
+    """Igual a /chat, mas envia os tokens via server-sent events conforme o modelo gera."""
+    data = request.get_json() or {}
+    user_message = data.get("message")
+    session_id = data.get("session_id")
+
+    if not session_id:
+        return jsonify({"error": "session_id não fornecido"}), 400
+    if not user_message:
+        return jsonify({"error": "message não fornecido"}), 400
+
+    app.logger.info(f"[Sessão {session_id}] Mensagem recebida (stream): {user_message}")
+    historico = montar_contexto(session_id, user_message)
+
+    def gerar():
+        partes = []
+        try:
+            for delta in conversar_com_ia_stream(user_message, historico):
+                partes.append(delta)
+                yield sse({"delta": delta})
+            resposta = "".join(partes).strip() or "Desculpe, não consegui compreender totalmente sua solicitação."
+            yield sse({"reply": resposta}, event="done")
+        except Exception as e:
+            app.logger.exception("Falha no streaming do LLM: %s", e)
+            resposta = "".join(partes).strip() or "Houve uma falha na comunicação com o servidor de linguagem."
+            yield sse({"error": str(e), "reply": resposta}, event="error")
+        finally:
+            # grava a conversa ao fim do stream (inclusive se o cliente desconectar)
+            resposta = "".join(partes).strip()
+            if resposta:
+                salvar_mensagem_db(session_id, "user", user_message)
+                salvar_mensagem_db(session_id, "assistant", resposta)
+
+    return Response(stream_with_context(gerar()), mimetype="text/event-stream", headers=SSE_HEADERS)
+
+
+@app.route("/llm/stats", methods=["GET"])
+def llm_stats():
+    return jsonify(llm_client.get_client().stats()), 200
+
+
+@app.route("/history_cache/stats", methods=["GET"])
+def history_cache_stats():
+    # taxa de acerto e memória estimada da cache de histórico
+    return jsonify(historico_cache.stats()), 200
+
+
+MEMORY_FIELDS = ("id", "role", "content", "timestamp")
+
+def paginar_memoria(session_id, envelope):
+    """Página (keyset por id) do histórico da sessão, ou despejo NDJSON com ?format=ndjson."""
+    try:
+        page = pagination.parse_page_args(request.args, MEMORY_FIELDS, MEMORY_FIELDS)
+    except pagination.PageError as e:
+        return jsonify({"error": str(e)}), 400
+    conn = get_db_connection()
+    # mensagens ainda na fila entram no fim (ver pagination.filter_tail), sem esperar o flush
+    with chat_log.read_lock():
+        pendentes = pagination.filter_tail(conn, page, mensagens_pendentes(session_id))
+        if page["format"] == "ndjson":
+            linhas = pagination.iter_ndjson(conn, "chat_history", page, "session_id = ?", (session_id,),
+                                            tail=pendentes)
+        else:
+            messages, cursor = pagination.fetch_page(conn, "chat_history", page, "session_id = ?",
+                                                     (session_id,), tail=pendentes)
+    if page["format"] == "ndjson":
+        return Response(stream_with_context(linhas), mimetype="application/x-ndjson")
+    if envelope:
+        return jsonify({"memory": messages, "next_cursor": cursor}), 200
+    # /lembrar mantém a lista pura; o cursor vai nos cabeçalhos
+    resp = jsonify(messages)
+    for k, v in (cursor or {}).items():
+        resp.headers[f"X-Next-{k.replace('_', '-').title()}"] = str(v)
+    return resp, 200
+
+
 @app.route("/get_memory", methods=["GET"])
 def get_memory():
     session_id = request.args.get("session_id")
     if not session_id:
         return jsonify({"error": "session_id não fornecido"}), 400
-    messages = carregar_historico_db(session_id)
-    return jsonify({"memory": messages}), 200
+    return paginar_memoria(session_id, envelope=True)
 
 
 @app.route("/clear_memory", methods=["POST"])
@@ -182,9 +296,24 @@ def registrar():
 @app.route("/lembrar", methods=["GET"])
 def lembrar():
     session_id = request.args.get("session_id")
+    mensagem = request.args.get("mensagem")
+    if mensagem:
+        # ?mensagem=...: top-k por relevância (BM25); session_id opcional restringe a busca
+        try:
+            k = min(int(request.args.get("k", 5)), retrieval.MAX_TOP_K)
+        except ValueError:
+            return jsonify({"error": "'k' deve ser um inteiro"}), 400
+        k = max(k, 1)
+        hits = buscar_memorias(mensagem, session_id, k=k)
+        if request.args.get("arquivo") == "1" and len(hits) < k:
+            # completa com mensagens que a retenção já tirou do banco
+            match = (lambda r: r.get("session_id") == session_id) if session_id else None
+            hits += retention.search_archive(retention.policy_for("chat_history", DATABASE), mensagem,
+                                             limit=k - len(hits), match=match)
+        return jsonify(hits), 200
     if not session_id:
         return jsonify({"error": "session_id não fornecido"}), 400
-    return jsonify(carregar_historico_db(session_id)), 200
+    return paginar_memoria(session_id, envelope=False)
 
 
 # -------------------------
@@ -0,0 +1,392 @@
+# tecnicos.py
+# Parsing e ingestão em lote de técnicos (usado por serve.py e pelos benchmarks)
+import re
+import datetime
+
+import metrics
+
+# ----------------- Parsing helpers -----------------
+CPF_RE = re.compile(r"\b\d{3}\.?\d{3}\.?\d{3}-?\d{2}\b")
+TEL_RE = re.compile(r"(\(?\d{2,3}\)?\s?\d{4,5}[-\s]?\d{4})")
+PLACA_RE = re.compile(r"\b[A-Z]{1,3}-?\d{1,4}[A-Z]{0,2}\b", re.IGNORECASE)
+
+ESTADO_TECNICOS_RE = re.compile(r"TECNIC?OS?.*DE\s+([A-Za-z]{1,3})", re.IGNORECASE)
+ESTADO_DADOS_RE = re.compile(r"DADOS.*DE\s+([A-Za-z]{1,3})", re.IGNORECASE)
+ESTADO_SIGLA_RE = re.compile(r"\b(RJ|SP|MG|BA|PR|RS|SC|DF|GO|ES|PE|CE|PB|SE|AL|PI|MA)\b", re.IGNORECASE)
+BANCO_RE = re.compile(r"\bbanco\b", re.IGNORECASE)
+RG_RE = re.compile(r"\bRG[:\s]*([\d\.\-]+)\b", re.IGNORECASE)
+CPF_LABEL_RE = re.compile(r"\bCPF\b", re.IGNORECASE)
+DIGIT_RE = re.compile(r"\d")
+LABELS_RE = re.compile(r"\b(DADOS|TECNICOS|TÉCNICOS|DE|DO|DOS)\b", re.IGNORECASE)
+RECORD_COMMA_RE = re.compile(r",\s*(?=[A-Z])")
+
+def detect_estado(text):
+    # procura "DE RJ" ou "RJ" isolado depois de 'TÉCNICOS' / 'DADOS'
+    m = ESTADO_TECNICOS_RE.search(text)
+    if m:
+        return m.group(1).upper()
+    m2 = ESTADO_DADOS_RE.search(text)
+    if m2:
+        return m2.group(1).upper()
+    # procura sigla isolada
+    m3 = ESTADO_SIGLA_RE.search(text)
+    if m3:
+        return m3.group(1).upper()
+    return None
+
+def split_records(block):
+    # tenta dividir em linhas por ; ou \n
+    if not block:
+        return []
+    if ";" in block:
+        parts = [p.strip() for p in block.split(";") if p.strip()]
+        return parts
+    lines = [l.strip() for l in block.splitlines() if l.strip()]
+    if lines:
+        return lines
+    # fallback: split by comma but careful
+    parts = [p.strip() for p in RECORD_COMMA_RE.split(block) if p.strip()]
+    return parts
+
+def parse_technician(line):
+    # heurística simples
+    nome = None
+    cpf = None
+    telefone = None
+    rg = None
+
+    cpf_m = CPF_RE.search(line)
+    if cpf_m: cpf = cpf_m.group(0)
+
+    tel_m = TEL_RE.search(line)
+    if tel_m: telefone = tel_m.group(1)
+
+    rg_m = RG_RE.search(line)
+    if rg_m: rg = rg_m.group(1)
+
+    # tentative name: text before CPF or before 'CPF' literal or before phone
+    cut_pos = None
+    mcpf = CPF_LABEL_RE.search(line)
+    if mcpf:
+        cut_pos = mcpf.start()
+    elif cpf_m:
+        cut_pos = cpf_m.start()
+    elif tel_m:
+        cut_pos = tel_m.start()
+    if cut_pos:
+        cand = line[:cut_pos].strip().strip(":,-")
+    else:
+        # try take up to first digit sequence
+        cand = DIGIT_RE.split(line, 1)[0].strip().strip(":,-")
+    # cleanup known labels
+    cand = LABELS_RE.sub("", cand).strip()
+    if cand:
+        nome = cand
+    outros = line
+    return {"nome": nome, "cpf": cpf, "rg": rg, "telefone": telefone, "outros": outros}
+
+# ----------------- Batch parsing -----------------
+# Mesmo resultado de parse_technician, mas devolvendo colunas e evitando trabalho
+# inútil por linha: CPF/telefone só são procurados a partir do primeiro dígito,
+# "CPF"/"RG" só quando a palavra aparece na linha, e a limpeza de rótulos do nome
+# roda uma única vez sobre todos os nomes unidos por \x00.
+#
+# Não é vetorizado: continua sendo um laço Python com buscas do `re` linha a linha
+# (pandas.Series.str.extract faria o mesmo por baixo). Em benchmarks/bench_parse.py
+# o ganho sobre parse_technician é de ~1.5x; o resto do custo é o próprio motor de
+# regex. Uma expressão única com grupos nomeados sobre o texto todo foi medida e
+# fica mais lenta que este laço.
+_SEP = "\x00"
+_NON_DIGIT_RE = re.compile(r"\D")
+
+
+def parse_technicians_batch(lines):
+    """Extrai nome/cpf/rg/telefone de muitas linhas, devolvendo colunas.
+
+    Aceita qualquer iterável de strings (lista, pandas.Series...). Retorna um dict
+    de listas (colunas) com as mesmas chaves de parse_technician, mais
+    `cpf_digits` (CPF só com dígitos, vira cpf_norm em prepare_columns).
+    """
+    lines = ["" if v is None else str(v) for v in lines]
+    n = len(lines)
+    cpfs = [None] * n
+    rgs = [None] * n
+    tels = [None] * n
+    cands = []
+    cpf_search, tel_search, rg_search = CPF_RE.search, TEL_RE.search, RG_RE.search
+    label_search, digit_search = CPF_LABEL_RE.search, DIGIT_RE.search
+
+    for i, line in enumerate(lines):
+        low = line.lower()
+        d = digit_search(line)
+        cpf_m = tel_m = None
+        if d is not None:
+            first = d.start()
+            cpf_m = cpf_search(line, first)
+            # o telefone pode começar com '(' logo antes do primeiro dígito
+            tel_m = tel_search(line, first - 1 if first else 0)
+            if cpf_m:
+                cpfs[i] = cpf_m.group(0)
+            if tel_m:
+                tels[i] = tel_m.group(1)
+        # RG_RE aceita só pontuação depois do rótulo ("RG-"): não depende de dígito
+        if "rg" in low:
+            rg_m = rg_search(line)
+            if rg_m:
+                rgs[i] = rg_m.group(1)
+        label_m = label_search(line) if "cpf" in low else None
+
+        cut = label_m or cpf_m or tel_m
+        cut_pos = cut.start() if cut else None
+        if cut_pos:
+            cand = line[:cut_pos]
+        else:
+            # up to first digit sequence
+            cand = line[:d.start()] if d else line
+        cands.append(cand.strip().strip(":,-"))
+
+    if any(_SEP in c for c in cands):
+        cleaned = [LABELS_RE.sub("", c) for c in cands]
+    else:
+        cleaned = LABELS_RE.sub("", _SEP.join(cands)).split(_SEP)
+    return {
+        "nome": [c.strip() or None for c in cleaned],
+        "cpf": cpfs,
+        "rg": rgs,
+        "telefone": tels,
+        "outros": lines,
+        "cpf_digits": [_NON_DIGIT_RE.sub("", v) if v else None for v in cpfs],
+    }
+
+
+def batch_records(cols):
+    """Converte o resultado colunar em dicts (formato de parse_technician)."""
+    keys = ("nome", "cpf", "rg", "telefone", "outros")
+    return [dict(zip(keys, vals)) for vals in zip(*(cols[k] for k in keys))]
+
+
+# ----------------- Bulk ingest -----------------
+# Técnicos são identificados pelo CPF normalizado (cpf_norm, só os 11 dígitos) com um
+# índice único parcial: colar a mesma lista de novo não duplica ninguém. A gravação
+# é um upsert que só altera os campos que mudaram; linhas idênticas nem são escritas
+# (os triggers FTS de search.py só disparam para o que realmente mudou).
+TECNICO_FIELDS = ("nome", "cpf", "rg", "telefone", "outros")
+MAX_FIELD_LEN = 2000
+SEM_NOME = "(sem nome)"
+ESTADO_DESCONHECIDO = "DESCONHECIDO"
+LOOKUP_CHUNK = 500  # parâmetros por SELECT ... IN (...)
+
+INSERT_TECNICO_SQL = """INSERT INTO tecnicos (estado, nome, cpf, rg, telefone, outros, created_at)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)"""
+
+# mesmas regras de _merge(): estado/nome "vazios" e campos nulos não apagam o que existe
+_MERGED = {
+    "estado": f"CASE WHEN excluded.estado = '{ESTADO_DESCONHECIDO}' THEN tecnicos.estado ELSE excluded.estado END",
+    "nome": f"CASE WHEN excluded.nome = '{SEM_NOME}' THEN tecnicos.nome ELSE excluded.nome END",
+    "cpf": "COALESCE(excluded.cpf, tecnicos.cpf)",
+    "rg": "COALESCE(excluded.rg, tecnicos.rg)",
+    "telefone": "COALESCE(excluded.telefone, tecnicos.telefone)",
+    "outros": "COALESCE(excluded.outros, tecnicos.outros)",
+}
+UPSERT_TECNICO_SQL = f"""INSERT INTO tecnicos (estado, nome, cpf, cpf_norm, rg, telefone, outros, created_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(cpf_norm) WHERE cpf_norm IS NOT NULL DO UPDATE SET
+        {", ".join(f"{k} = {v}" for k, v in _MERGED.items())}
+    WHERE {" OR ".join(f"tecnicos.{k} IS NOT {v}" for k, v in _MERGED.items())}"""
+
+
+def normalize_cpf(value):
+    """Só os dígitos do CPF; None se não tiver exatamente 11."""
+    if not value:
+        return None
+    digits = _NON_DIGIT_RE.sub("", str(value))
+    return digits if len(digits) == 11 else None
+
+
+def _cpf_norm_sql(col):
+    digits = col
+    for ch in (".", "-", " ", "/"):
+        digits = f"REPLACE({digits}, '{ch}', '')"
+    return f"CASE WHEN LENGTH({digits}) = 11 AND {digits} NOT GLOB '*[^0-9]*' THEN {digits} END"
+
+
+def _merge(old, new):
+    """Resultado de gravar `new` sobre a linha `old` (dicts com estado + TECNICO_FIELDS)."""
+    merged = dict(old)
+    if new["estado"] != ESTADO_DESCONHECIDO:
+        merged["estado"] = new["estado"]
+    if new["nome"] != SEM_NOME:
+        merged["nome"] = new["nome"]
+    for k in ("cpf", "rg", "telefone", "outros"):
+        if new.get(k) is not None:
+            merged[k] = new[k]
+    return merged
+
+
+def init_cpf_index(conn):
+    """Migração única: coluna cpf_norm, deduplicação das linhas antigas e índice único.
+
+    Duplicatas (mesmo CPF) são fundidas na linha mais antiga (mantém o id), aplicando
+    as mais novas por cima com as regras do upsert. Retorna quantas linhas saíram.
+    """
+    cols = {r[1] for r in conn.execute("PRAGMA table_info(tecnicos)")}
+    done = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_tecnicos_cpf_norm'"
+    ).fetchone()
+    if done and "cpf_norm" in cols:
+        return 0
+    removed = 0
+    with conn:
+        if "cpf_norm" not in cols:
+            conn.execute("ALTER TABLE tecnicos ADD COLUMN cpf_norm TEXT")
+        conn.execute(f"UPDATE tecnicos SET cpf_norm = {_cpf_norm_sql('cpf')} "
+                     "WHERE cpf IS NOT NULL AND cpf_norm IS NULL")
+        dups = [r[0] for r in conn.execute(
+            "SELECT cpf_norm FROM tecnicos WHERE cpf_norm IS NOT NULL GROUP BY cpf_norm HAVING COUNT(*) > 1")]
+        names = ("id", "estado") + TECNICO_FIELDS
+        for cpf_norm in dups:
+            rows = [dict(zip(names, r)) for r in conn.execute(
+                f"SELECT {', '.join(names)} FROM tecnicos WHERE cpf_norm = ? ORDER BY id", (cpf_norm,))]
+            merged = rows[0]
+            for r in rows[1:]:
+                merged = _merge(merged, r)
+            conn.execute("DELETE FROM tecnicos WHERE cpf_norm = ? AND id > ?", (cpf_norm, merged["id"]))
+            conn.execute(f"UPDATE tecnicos SET {', '.join(f'{k} = ?' for k in names[1:])} WHERE id = ?",
+                         [merged[k] for k in names[1:]] + [merged["id"]])
+            removed += len(rows) - 1
+        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_tecnicos_cpf_norm "
+                     "ON tecnicos (cpf_norm) WHERE cpf_norm IS NOT NULL")
+    return removed
+
+
+def prepare_record(record, default_estado=None):
+    """Normaliza um registro (texto livre ou dict) -> (dict, erro)."""
+    if isinstance(record, str):
+        line = record.strip()
+        if not line:
+            return None, "linha vazia"
+        parsed = parse_technician(line)
+        parsed["estado"] = default_estado
+    elif isinstance(record, dict):
+        parsed = {k: record.get(k) for k in TECNICO_FIELDS}
+        parsed["estado"] = record.get("estado") or default_estado
+    else:
+        return None, "registro deve ser texto ou objeto"
+
+    for k in TECNICO_FIELDS + ("estado",):
+        v = parsed.get(k)
+        if v is None:
+            continue
+        if not isinstance(v, str):
+            v = str(v)
+        v = v.strip()
+        if len(v) > MAX_FIELD_LEN:
+            return None, f"campo '{k}' muito longo"
+        parsed[k] = v or None
+
+    # Only accept if has a name or CPF (mesma regra do 'Guarde no banco')
+    if not parsed.get("nome") and not parsed.get("cpf"):
+        return None, "sem nome nem CPF"
+    parsed["estado"] = (parsed.get("estado") or ESTADO_DESCONHECIDO).upper()
+    parsed["nome"] = parsed.get("nome") or SEM_NOME
+    parsed["cpf_norm"] = normalize_cpf(parsed.get("cpf"))
+    return parsed, None
+
+
+def prepare_columns(cols, default_estado=None):
+    """prepare_record para o resultado de parse_technicians_batch, sem parsear de novo.
+
+    Retorna uma lista de (registro, erro) na ordem das linhas; cpf_norm vem de
+    `cpf_digits` (CPF_RE só casa com 11 dígitos).
+    """
+    estado = ((default_estado or "").strip() or ESTADO_DESCONHECIDO).upper()
+    out = []
+    for nome, cpf, rg, telefone, outros, cpf_digits in zip(
+            cols["nome"], cols["cpf"], cols["rg"], cols["telefone"], cols["outros"], cols["cpf_digits"]):
+        if not outros:
+            out.append((None, "linha vazia"))
+            continue
+        values = (nome, cpf, rg, telefone, outros)
+        too_long = next((k for k, v in zip(TECNICO_FIELDS, values) if v and len(v) > MAX_FIELD_LEN), None)
+        if too_long:
+            out.append((None, f"campo '{too_long}' muito longo"))
+        elif not nome and not cpf:
+            out.append((None, "sem nome nem CPF"))
+        else:
+            out.append(({"nome": nome or SEM_NOME, "cpf": cpf, "rg": rg, "telefone": telefone,
+                         "outros": outros, "estado": estado, "cpf_norm": cpf_digits}, None))
+    return out
+
+
+def _existing_by_cpf(conn, cpf_norms):
+    names = ("cpf_norm", "estado") + TECNICO_FIELDS
+    found = {}
+    cpf_norms = list(cpf_norms)
+    for i in range(0, len(cpf_norms), LOOKUP_CHUNK):
+        chunk = cpf_norms[i:i + LOOKUP_CHUNK]
+        cur = conn.execute(f"SELECT {', '.join(names)} FROM tecnicos "
+                           f"WHERE cpf_norm IN ({','.join('?' * len(chunk))})", chunk)
+        for r in cur:
+            found[r[0]] = dict(zip(names[1:], r[1:]))
+    return found
+
+
+def bulk_insert_tecnicos(conn, records):
+    """Grava registros já preparados (upsert por CPF) numa única transação.
+
+    Retorna {"inserted", "updated", "unchanged"}; cada registro ganha a chave
+    "action" com o que aconteceu com ele.
+    """
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+    if not records:
+        return counts
+    now = datetime.datetime.utcnow().isoformat()
+    fields = ("estado",) + TECNICO_FIELDS
+    rows = []
+    with conn:
+        # estado atual de cada CPF (banco + o que já passou neste lote) para classificar
+        # e não reenviar registros idênticos; o ON CONFLICT cobre gravações concorrentes
+        current = _existing_by_cpf(conn, {r["cpf_norm"] for r in records if r.get("cpf_norm")})
+        for r in records:
+            key = r.get("cpf_norm")
+            old = current.get(key) if key else None
+            if old is None:
+                action = "inserted"
+                if key:
+                    current[key] = {k: r.get(k) for k in fields}
+            else:
+                merged = _merge(old, r)
+                action = "unchanged" if merged == old else "updated"
+                current[key] = merged
+            r["action"] = action
+            counts[action] += 1
+            if action != "unchanged":
+                rows.append((r["estado"], r["nome"], r.get("cpf"), key, r.get("rg"), r.get("telefone"),
+                             r.get("outros"), now))
+        if rows:
+            conn.executemany(UPSERT_TECNICO_SQL, rows)
+    return counts
+
+
+def ingest(conn, records, default_estado=None):
+    """Valida + grava um lote. Retorna (aceitos, resultados por linha, contagens)."""
+    accepted = []
+    results = []
+    with metrics.span("parse"):
+        # linhas de texto são parseadas e validadas de uma vez, em colunas
+        text_idx = [i for i, rec in enumerate(records) if isinstance(rec, str) and rec.strip()]
+        prepared = {}
+        if text_idx:
+            cols = parse_technicians_batch(records[i].strip() for i in text_idx)
+            prepared = dict(zip(text_idx, prepare_columns(cols, default_estado)))
+        for i, rec in enumerate(records):
+            parsed, err = prepared[i] if i in prepared else prepare_record(rec, default_estado)
+            if err:
+                results.append({"index": i, "status": "rejected", "error": err})
+                continue
+            accepted.append(parsed)
+            results.append({"index": i, "status": "accepted"})
+    counts = bulk_insert_tecnicos(conn, accepted)
+    for res, rec in zip((r for r in results if r["status"] == "accepted"), accepted):
+        res["action"] = rec["action"]
+    return accepted, results, counts
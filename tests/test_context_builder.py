@@ -0,0 +1,121 @@
+# tests/test_context_builder.py
+import logging
+
+import pytest
+
+import context_builder
+import db
+import llm_client
+
+SYSTEM = "Você é a Beka, assistente da equipe técnica."
+
+
+class FakeLLM:
+    def __init__(self):
+        self.calls = []
+
+    def chat(self, messages, **kw):
+        self.calls.append(messages[-1]["content"])
+        return f"resumo {len(self.calls)}"
+
+
+class InlineExecutor:
+    def submit(self, fn, *args):
+        fn(*args)
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    fake = FakeLLM()
+    monkeypatch.setattr(llm_client, "get_client", lambda: fake)
+    monkeypatch.setattr(context_builder, "_executor", InlineExecutor())
+    return fake
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "beka.db")
+    conn = db.get_connection(path)
+    conn.execute("CREATE TABLE chat_history (id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT, "
+                 "role TEXT, content TEXT)")
+    context_builder.init_context_tables(conn)
+    yield path
+    db.release_connections()
+
+
+def add_turns(path, start, n, session="s"):
+    conn = db.get_connection(path)
+    with conn:
+        conn.executemany(
+            "INSERT INTO chat_history (session_id, role, content) VALUES (?, ?, ?)",
+            [(session, "user" if i % 2 == 0 else "assistant", f"mensagem {i:03d} " + "x" * 60)
+             for i in range(start, start + n)],
+        )
+    return [f"mensagem {i:03d} " + "x" * 60 for i in range(start, start + n)]
+
+
+def cost(messages):
+    return sum(context_builder.estimate_tokens(m["content"]) for m in messages)
+
+
+def test_budget_keeps_latest_turns_verbatim(db_path, llm):
+    texts = add_turns(db_path, 0, 20)
+    budget = 150
+    ctx = context_builder.build_context(db_path, "s", SYSTEM, "oi", budget=budget)
+    # 150 - sistema - pergunta: cabem as 5 últimas (21 tokens cada) na íntegra e em ordem
+    assert [m["content"] for m in ctx] == texts[-5:]
+    assert [m["role"] for m in ctx] == ["assistant", "user", "assistant", "user", "assistant"]
+    assert cost(ctx) + context_builder.estimate_tokens(SYSTEM) + context_builder.estimate_tokens("oi") <= budget
+    # as 15 que ficaram de fora foram resumidas numa chamada só
+    assert len(llm.calls) == 1
+    assert all(t in llm.calls[0] for t in texts[:15])
+    assert not any(t in llm.calls[0] for t in texts[15:])
+    conn = db.get_connection(db_path)
+    assert context_builder.get_summary(conn, "s") == ("resumo 1", 15)
+
+
+def test_summarized_turns_are_never_resent(db_path, llm):
+    texts = add_turns(db_path, 0, 20)
+    context_builder.build_context(db_path, "s", SYSTEM, "oi", budget=150)
+    ctx = context_builder.build_context(db_path, "s", SYSTEM, "oi", budget=150)
+    assert ctx[0] == {"role": "system", "content": "Resumo da conversa até aqui: resumo 1"}
+    assert not any(t in m["content"] for m in ctx for t in texts[:15])
+    assert len(llm.calls) == 1  # nada novo a resumir
+
+    more = add_turns(db_path, 20, 10)
+    ctx = context_builder.build_context(db_path, "s", SYSTEM, "oi", budget=150)
+    assert len(llm.calls) == 2
+    # o segundo resumo recebe o anterior + só as mensagens ainda não resumidas
+    assert llm.calls[1].startswith("Resumo anterior: resumo 1")
+    assert not any(t in llm.calls[1] for t in texts[:15])
+    assert texts[15] in llm.calls[1]
+    assert [m["content"] for m in ctx[1:]] == more[-5:]
+
+
+def test_summary_waits_for_enough_overflow(db_path, llm):
+    add_turns(db_path, 0, 5 + context_builder.SUMMARY_MIN_MESSAGES - 1)
+    context_builder.build_context(db_path, "s", SYSTEM, "oi", budget=150)
+    assert llm.calls == []
+
+
+def test_unexpected_summary_error_is_logged(db_path, monkeypatch, caplog):
+    def broken(*args):
+        raise RuntimeError("coluna sumiu")
+
+    monkeypatch.setattr(context_builder, "summarize", broken)
+    context_builder._pending.add("s")
+    with caplog.at_level(logging.ERROR, logger="context_builder"):
+        context_builder._summarize_job(db_path, "s", 10)
+    assert "Falha ao resumir a sessão s" in caplog.text
+    assert "coluna sumiu" in caplog.text
+    assert "s" not in context_builder._pending
+
+
+def test_llm_error_is_retried_later(db_path, monkeypatch, caplog):
+    def busy(*args):
+        raise llm_client.LLMOverloaded("fila cheia")
+
+    monkeypatch.setattr(context_builder, "summarize", busy)
+    with caplog.at_level(logging.ERROR, logger="context_builder"):
+        context_builder._summarize_job(db_path, "s", 10)
+    assert caplog.text == ""
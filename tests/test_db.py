@@ -0,0 +1,47 @@
+# tests/test_db.py
+import sqlite3
+
+import pytest
+
+import db
+
+
+@pytest.fixture
+def path(tmp_path):
+    p = str(tmp_path / "t.db")
+    conn = db.get_connection(p)
+    conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, nome TEXT)")
+    conn.execute("INSERT INTO t (nome) VALUES ('a')")
+    conn.commit()
+    yield p
+    db.release_connections()
+
+
+def test_same_thread_reuses_connection(path):
+    assert db.get_connection(path) is db.get_connection(path)
+
+
+def test_row_factory_is_per_caller(path):
+    rows = db.get_connection(path, row_factory=sqlite3.Row)
+    plain = db.get_connection(path)
+    assert plain.execute("SELECT nome FROM t").fetchone() == ("a",)
+    row = rows.execute("SELECT nome FROM t").fetchone()
+    assert row["nome"] == "a"
+    assert plain.row_factory is None
+    assert plain.execute("SELECT nome FROM t").fetchone() == ("a",)
+
+
+def test_row_factory_shares_transaction(path):
+    rows = db.get_connection(path, row_factory=sqlite3.Row)
+    plain = db.get_connection(path)
+    with rows:
+        rows.execute("INSERT INTO t (nome) VALUES ('b')")
+        assert plain.in_transaction
+        assert plain.execute("SELECT COUNT(*) FROM t").fetchone() == (2,)
+    assert not plain.in_transaction
+
+
+def test_release_returns_connection_to_pool(path):
+    conn = db.get_connection(path)
+    db.release_connections()
+    assert db.get_connection(path) is conn
@@ -0,0 +1,116 @@
+# tests/test_exporter.py
+import csv
+import gzip
+import io
+import json
+
+import pytest
+
+import db
+import exporter
+
+SCHEMA = """
+CREATE TABLE tecnicos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    estado TEXT,
+    nome TEXT,
+    cpf TEXT,
+    rg TEXT,
+    telefone TEXT,
+    outros TEXT,
+    created_at TEXT
+)
+"""
+INSERT = "INSERT INTO tecnicos (estado, nome, cpf, created_at) VALUES (?, ?, ?, '2024-01-01')"
+
+
+@pytest.fixture
+def conn(tmp_path):
+    c = db.get_connection(str(tmp_path / "e.db"))
+    c.execute(SCHEMA)
+    c.executemany(INSERT, [("SP" if i % 2 else "RJ", f"Técnico {i}", f"{i:011d}") for i in range(1, 11)])
+    c.commit()
+    yield c
+    db.release_connections()
+
+
+def body(conn, fmt, **kw):
+    chunks, _ = exporter.export_stream(conn, fmt, **kw)
+    out = list(chunks)
+    return b"".join(out) if out and isinstance(out[0], bytes) else "".join(out)
+
+
+def ndjson_ids(text):
+    return [json.loads(line)["id"] for line in text.splitlines()]
+
+
+def test_batches_are_keyset_pages(conn):
+    batches = list(exporter.iter_batches(conn, after_id=2, upto=9, batch=3))
+    assert [[r[0] for r in rows] for rows in batches] == [[3, 4, 5], [6, 7, 8], [9]]
+
+
+def test_csv_has_bom_header_and_all_rows(conn):
+    text = body(conn, "csv")
+    assert text.startswith("\ufeff")
+    rows = list(csv.reader(io.StringIO(text[1:])))
+    assert rows[0] == list(exporter.EXPORT_COLUMNS)
+    assert [int(r[0]) for r in rows[1:]] == list(range(1, 11))
+    assert rows[1][2] == "Técnico 1" and rows[1][3] == "00000000001"
+
+
+def test_ndjson_rows(conn):
+    lines = body(conn, "ndjson").splitlines()
+    assert len(lines) == 10
+    first = json.loads(lines[0])
+    assert list(first) == list(exporter.EXPORT_COLUMNS)
+    assert first["nome"] == "Técnico 1" and first["cpf"] == "00000000001"
+
+
+def test_estado_filter(conn):
+    assert ndjson_ids(body(conn, "ndjson", estado="SP")) == [1, 3, 5, 7, 9]
+    assert exporter.upto_id(conn, "RJ") == 10
+    assert exporter.count_rows(conn, "RJ") == 5
+
+
+def test_resume_after_id_stops_at_upto(conn):
+    upto = exporter.upto_id(conn)
+    headers = exporter.export_headers("csv", None, upto)
+    assert headers["X-Export-Upto-Id"] == "10"
+    assert headers["Content-Disposition"] == 'attachment; filename="tecnicos_todos.csv"'
+    # linhas gravadas depois do início não entram na exportação retomada
+    conn.execute(INSERT, ("SP", "Novo", "99999999999"))
+    conn.commit()
+    text = body(conn, "csv", after_id=4, upto=int(headers["X-Export-Upto-Id"]))
+    assert not text.startswith("\ufeff")  # sem cabeçalho na retomada
+    assert [int(r[0]) for r in csv.reader(io.StringIO(text))] == list(range(5, 11))
+    assert ndjson_ids(body(conn, "ndjson", after_id=7, upto=upto, estado="SP")) == [9]
+
+
+@pytest.mark.parametrize("fmt", ["csv", "ndjson"])
+def test_gzip_decompresses_to_plain_output(conn, fmt):
+    plain = body(conn, fmt)
+    packed = body(conn, fmt, gzip=True)
+    assert packed[:2] == b"\x1f\x8b"
+    assert gzip.decompress(packed).decode("utf-8") == plain
+    assert exporter.export_headers(fmt, "SP", 10, gzip=True)["Content-Encoding"] == "gzip"
+
+
+def test_xlsx_rows(conn):
+    openpyxl = pytest.importorskip("openpyxl")
+    wb = openpyxl.load_workbook(io.BytesIO(body(conn, "xlsx", estado="RJ")), read_only=True)
+    rows = list(wb.active.iter_rows(values_only=True))
+    assert rows[0] == exporter.EXPORT_COLUMNS
+    assert [r[0] for r in rows[1:]] == [2, 4, 6, 8, 10]
+
+
+def test_large_xlsx_is_refused(conn, monkeypatch):
+    monkeypatch.setattr(exporter, "EXPORT_XLSX_MAX_ROWS", 4)
+    with pytest.raises(exporter.ExportError, match="csv"):
+        exporter.export_stream(conn, "xlsx")
+    # a retomada só conta o que falta
+    exporter.export_stream(conn, "xlsx", after_id=6)
+
+
+def test_unknown_format(conn):
+    with pytest.raises(exporter.ExportError):
+        exporter.export_stream(conn, "pdf")
@@ -0,0 +1,140 @@
+# tests/test_history_cache.py
+import pytest
+
+import db
+import history_cache
+import retrieval
+import write_queue
+
+
+def test_tail_keeps_only_the_last_messages():
+    cache = history_cache.HistoryCache(tail_messages=3)
+    cache.load("s", "", 0, [(i, "user", f"m{i}") for i in range(1, 6)])
+    assert [r[0] for r in cache.get("s")[2]] == [3, 4, 5]
+    size = cache.stats()["bytes"]
+    cache.append("s", "assistant", "m6")
+    # a deque descartou a mais antiga: o tamanho contado continua igual
+    assert [r[2] for r in cache.get("s")[2]] == ["m4", "m5", "m6"]
+    assert cache.stats()["bytes"] == size and cache.stats()["messages"] == 3
+
+
+def test_sessions_are_evicted_by_size_least_recent_first():
+    probe = history_cache.HistoryCache()
+    probe.load("x", "", 0, [(1, "user", "a" * 1000)])
+    session_bytes = probe.stats()["bytes"]
+
+    cache = history_cache.HistoryCache(max_bytes=session_bytes * 2)
+    for s in ("a", "b"):
+        cache.load(s, "", 0, [(1, "user", "a" * 1000)])
+    cache.get("a")  # "b" passa a ser a menos usada
+    cache.load("c", "", 0, [(1, "user", "a" * 1000)])
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["bytes"] == session_bytes * 2
+    # append numa sessão que cresce além do limite também despeja as outras
+    cache.append("c", "user", "b" * 1000)
+    assert cache.get("a") is None and cache.stats()["sessions"] == 1
+
+
+def test_summary_drops_covered_messages():
+    cache = history_cache.HistoryCache()
+    cache.load("s", "", 0, [(1, "user", "m1"), (2, "assistant", "m2"), (None, "user", "m3")])
+    before = cache.stats()["bytes"]
+    cache.set_summary("s", "resumo", 1)
+    summary, last_id, rows = cache.get("s")
+    assert (summary, last_id, [r[0] for r in rows]) == ("resumo", 1, [2, None])
+    assert cache.stats()["bytes"] < before
+
+
+# ---------- ligado à fila de gravação, como em server.py ----------
+SCHEMA = """
+CREATE TABLE chat_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    pytest.importorskip("flask")
+    pytest.importorskip("flask_cors")
+    import context_builder
+    import server
+
+    path = str(tmp_path / "beka.db")
+    conn = db.get_connection(path)
+    conn.execute(SCHEMA)
+    context_builder.init_context_tables(conn)
+    monkeypatch.setattr(server, "DATABASE", path)
+    monkeypatch.setattr(server, "historico_cache", history_cache.HistoryCache())
+    monkeypatch.setattr(retrieval, "RETRIEVAL_TOP_K", 0)
+    q = server.chat_log
+    # com read_lock() o teste segura o gravador: as linhas ficam na fila
+    chat_log = write_queue.WriteQueue(path, q.insert_sql, name=q.name, flush_ms=5,
+                                      on_put=q.on_put, on_commit=q.on_commit,
+                                      on_dead_letter=q.on_dead_letter)
+    monkeypatch.setattr(server, "chat_log", chat_log)
+    yield server
+    chat_log.close()
+    db.release_connections()
+
+
+def db_rows(server, session_id):
+    return db.get_connection(server.DATABASE).execute(
+        "SELECT id, role, content FROM chat_history WHERE session_id = ? ORDER BY id", (session_id,)
+    ).fetchall()
+
+
+def contents(ctx):
+    return [m["content"] for m in ctx]
+
+
+def test_read_after_write_sees_pending_rows(server):
+    server.salvar_mensagem_db("s", "user", "primeira")
+    server.chat_log.flush(timeout=5)
+    assert contents(server.montar_contexto("s", "oi")) == ["primeira"]  # falta: lê o banco
+    with server.chat_log.read_lock():
+        server.salvar_mensagem_db("s", "assistant", "resposta")
+        server.salvar_mensagem_db("s", "user", "segunda")
+        assert len(server.chat_log.pending()) == 2
+        ctx = server.montar_contexto("s", "oi")
+        assert contents(ctx) == ["primeira", "resposta", "segunda"]
+        assert server.historico_cache.stats()["hits"] == 1
+        # sessão fora da cache: banco + fila entram juntos na carga
+        server.salvar_mensagem_db("t", "user", "nova sessão")
+        assert contents(server.montar_contexto("t", "oi")) == ["nova sessão"]
+    assert server.chat_log.flush(timeout=5)
+    assert contents(server.montar_contexto("t", "oi")) == ["nova sessão"]
+
+
+def test_ids_are_assigned_after_commit(server):
+    server.montar_contexto("a", "oi")
+    server.montar_contexto("b", "oi")
+    with server.chat_log.read_lock():
+        for i in range(3):  # sessões intercaladas no mesmo lote
+            server.salvar_mensagem_db("a", "user", f"a{i}")
+            server.salvar_mensagem_db("b", "user", f"b{i}")
+        assert [r[0] for r in server.historico_cache.get("a")[2]] == [None] * 3
+    assert server.chat_log.flush(timeout=5)
+    for s in ("a", "b"):
+        assert server.historico_cache.get(s)[2] == [tuple(r) for r in db_rows(server, s)]
+
+
+def test_dead_lettered_row_leaves_no_stale_tail(server):
+    server.montar_contexto("s", "oi")
+    with server.chat_log.read_lock():  # as três no mesmo lote
+        server.salvar_mensagem_db("s", "user", "antes")
+        server.salvar_mensagem_db("s", "user", None)  # NOT NULL: vai para o dead-letter
+        server.salvar_mensagem_db("s", "user", "depois")
+    assert server.chat_log.flush(timeout=5)
+    assert server.chat_log.stats()["dead_letter"] == 1
+    # a linha descartada nunca pode ficar com o id de outra
+    cached = server.historico_cache.get("s")
+    assert cached is None or cached[2] == [tuple(r) for r in db_rows(server, "s")]
+    assert contents(server.montar_contexto("s", "oi")) == ["antes", "depois"]
+    assert server.historico_cache.get("s")[2] == [tuple(r) for r in db_rows(server, "s")]
@@ -0,0 +1,57 @@
+# tests/test_importer.py
+import pytest
+
+import importer
+
+HEADER = "Estado;Nome;CPF;Função\n"
+ROW = "SP;João Conceição;01234567890;Técnico\n"
+
+
+@pytest.mark.parametrize("encoding, expected", [
+    ("utf-8", "utf-8-sig"),
+    ("utf-8-sig", "utf-8-sig"),
+    ("cp1252", "cp1252"),
+])
+def test_detect_encoding(tmp_path, encoding, expected):
+    path = tmp_path / "t.csv"
+    path.write_bytes((HEADER + ROW * 10).encode(encoding))
+    assert importer.detect_encoding(str(path)) == expected
+
+
+def test_detect_encoding_falls_back_to_latin1(tmp_path):
+    path = tmp_path / "t.csv"
+    path.write_bytes(HEADER.encode("latin-1") + b"SP;\x81;1;x\n")  # 0x81 não existe em cp1252
+    assert importer.detect_encoding(str(path)) == "latin-1"
+
+
+def test_detect_encoding_reads_past_first_block(tmp_path):
+    path = tmp_path / "t.csv"
+    path.write_bytes(("a;b\n" * 1000).encode() + "ç;ã\n".encode("cp1252"))
+    assert importer.detect_encoding(str(path), block=64) == "cp1252"
+
+
+def test_rows_to_records_keeps_cpf_as_text():
+    headers = ["UF", "Nome", "CPF", "Celular", "Obs"]
+    recs = importer.rows_to_records(headers, [
+        ("SP", "Ana", 1234567890, 11999990000.0, None),
+        ("RJ", "Bia", "012.345.678-90", "", "sem crachá"),
+    ])
+    assert recs[0] == {"estado": "SP", "nome": "Ana", "cpf": "01234567890", "telefone": "11999990000",
+                       "outros": None}
+    assert recs[1]["cpf"] == "012.345.678-90"
+    assert recs[1]["telefone"] is None
+    assert recs[1]["outros"] == "Obs: sem crachá"
+
+
+@pytest.mark.parametrize("encoding", ["utf-8", "cp1252"])
+def test_iter_csv_chunks_decodes_and_keeps_leading_zeros(tmp_path, encoding):
+    pytest.importorskip("pandas")
+    path = tmp_path / "t.csv"
+    path.write_bytes((HEADER + ROW * 3).encode(encoding))
+    chunks = [(headers, list(rows)) for headers, rows in importer.iter_csv_chunks(str(path), chunk_rows=2)]
+    assert [len(rows) for _, rows in chunks] == [2, 1]
+    headers, rows = chunks[0]
+    assert headers == ["Estado", "Nome", "CPF", "Função"]
+    recs = importer.rows_to_records(headers, rows)
+    assert recs[0]["nome"] == "João Conceição"
+    assert recs[0]["cpf"] == "01234567890"
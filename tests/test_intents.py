@@ -0,0 +1,98 @@
+# tests/test_intents.py
+import re
+
+import pytest
+
+import intents
+
+
+def legacy_classify(user_msg):
+    """A sequência de if/elif que serve.py usava antes do roteador (mesma ordem e regexes)."""
+    low = user_msg.lower()
+    mdel = re.match(r"^\s*delete[:\s]+(.+)$", user_msg, re.IGNORECASE)
+    if mdel:
+        return "delete", mdel.group(1)
+    if (re.search(r"\bguarde\b.*\bbanco\b", low) or low.startswith("guarde no banco")
+            or low.startswith("guardar no banco") or low.startswith("guardar:")):
+        return "save", None
+    mq = re.search(r"\b(tecnic|t[eé]cnico|t[eé]cnicos)\b.*\bde\s+([A-Za-z]{1,3})\b", user_msg, re.IGNORECASE)
+    if mq:
+        return "query", mq.group(2)
+    return None, None
+
+
+MESSAGES = [
+    # delete
+    "DELETE Maicon",
+    "delete: Ana Souza",
+    "  Delete   João",
+    "delete:",
+    "delete: ",
+    "delete",
+    "deletar Maicon",
+    "por favor delete Maicon",
+    # save
+    "Guarde no banco: RJ; Maicon; CPF 123.456.789-00",
+    "guardar no banco SP Ana 11 99999-8888",
+    "guardar: Ana; 123",
+    "você pode guarde isso no banco?",
+    "guardar isso no banco depois",
+    "guarde\nno banco: Ana",
+    "obs\nguarde no banco: Ana",
+    # query
+    "técnicos de RJ",
+    "TÉCNICOS DE mg",
+    "tecnicos de sp por favor",
+    "quais são os técnicos de BA?",
+    "tecnico de AM",
+    "técnicos de São Paulo",
+    "técnicos do RJ",
+    "técnicos\nde RJ",
+    "oi\ntécnicos de RJ",
+    # ambíguas: vale a prioridade do registro
+    "delete técnicos de RJ",
+    "DELETE guarde no banco",
+    "guarde no banco os técnicos de RJ",
+    "técnicos de RJ, guarde no banco",
+    "técnicos de RJ\ndelete Maicon",
+    # conversa normal
+    "",
+    "Olá, Beka!",
+    "quanto é 2 + 2?",
+    "me fale sobre o banco central",
+    "tecnologia de ponta",
+]
+
+
+@pytest.mark.parametrize("msg", MESSAGES)
+def test_single_regex_matches_old_if_elif_order(msg):
+    router = intents.build_command_router()
+    intent, m = router.classify(msg)
+    name = intent.name if intent else None
+    expected_name, expected_arg = legacy_classify(msg)
+    assert name == expected_name
+    assert m is None or m.lastgroup == name
+    if name == "delete":
+        assert m.group("delete_target") == expected_arg
+    elif name == "query":
+        assert m.group("query_estado") == expected_arg
+
+
+def test_table_covers_every_intent_and_plain_chat():
+    seen = {legacy_classify(msg)[0] for msg in MESSAGES}
+    assert seen == {"delete", "save", "query", None}
+
+
+def test_dispatch_runs_handler_and_skips_plain_chat():
+    router = intents.build_command_router()
+    router.handler("query")(lambda m, text, suffix="": m.group("query_estado").upper() + suffix)
+    assert router.dispatch("técnicos de rj", suffix="!") == "RJ!"
+    assert router.dispatch("bom dia") is None
+    assert router.dispatch("delete Maicon") is None  # sem handler ligado
+
+
+def test_duplicate_intent_is_rejected():
+    router = intents.IntentRouter()
+    router.add("a", "x")
+    with pytest.raises(ValueError):
+        router.add("a", "y")
@@ -0,0 +1,122 @@
+# tests/test_llm_cache.py
+import threading
+import time
+
+import pytest
+
+import db
+import llm_cache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    c = llm_cache.ResponseCache(str(tmp_path / "cache.db"), history_messages=4)
+    yield c
+    db.release_connections()
+
+
+def key(cache, message, history=()):
+    return cache.make_key("modelo", 0.7, "sistema", message, history)
+
+
+def test_key_normalizes_message(cache):
+    assert key(cache, "Qual o horário?") == key(cache, "  qual   o HORÁRIO ")
+
+
+def test_key_depends_on_recent_turns(cache):
+    a = [{"role": "user", "content": "fale do técnico João"}, {"role": "assistant", "content": "João é de SP"}]
+    b = [{"role": "user", "content": "fale do técnico Ana"}, {"role": "assistant", "content": "Ana é do RJ"}]
+    assert key(cache, "sim", a) != key(cache, "sim", b)
+    assert key(cache, "sim", a) == key(cache, "sim", list(a))
+
+
+def test_key_ignores_turns_older_than_window(cache):
+    old = [{"role": "user", "content": f"antiga {i}"} for i in range(3)]
+    recent = [{"role": "user", "content": f"recente {i}"} for i in range(4)]
+    assert key(cache, "ok", old + recent) == key(cache, "ok", recent)
+
+
+def test_key_includes_memory_block(cache):
+    turns = [{"role": "user", "content": "oi"}]
+    note_a = [{"role": "system", "content": "Memórias: prefere café"}] + turns
+    note_b = [{"role": "system", "content": "Memórias: prefere chá"}] + turns
+    assert key(cache, "o que eu prefiro?", note_a) != key(cache, "o que eu prefiro?", note_b)
+
+
+def test_key_with_zero_history_still_has_context(tmp_path):
+    c = llm_cache.ResponseCache(str(tmp_path / "c.db"), history_messages=0)
+    h1 = [{"role": "system", "content": "A"}, {"role": "user", "content": "x"}]
+    h2 = [{"role": "system", "content": "A"}, {"role": "user", "content": "y"}]
+    h3 = [{"role": "system", "content": "B"}, {"role": "user", "content": "x"}]
+    assert key(c, "m", h1) == key(c, "m", h2)
+    assert key(c, "m", h1) != key(c, "m", h3)
+    db.release_connections()
+
+
+def test_store_and_lookup_survive_memory_eviction(cache):
+    k = key(cache, "pergunta")
+    assert cache.lookup(k) is None
+    cache.store(k, "resposta")
+    cache._lru.clear()
+    assert cache.lookup(k) == "resposta"
+    s = cache.stats()
+    assert s["hits_disk"] == 1 and s["misses"] == 1
+
+
+def test_expired_entries_are_not_returned(tmp_path):
+    c = llm_cache.ResponseCache(str(tmp_path / "c.db"), ttl=0.01)
+    k = key(c, "p")
+    c.store(k, "r")
+    time.sleep(0.02)
+    assert c.lookup(k) is None
+    db.release_connections()
+
+
+def test_concurrent_identical_requests_are_coalesced(cache):
+    k = key(cache, "igual")
+    calls = []
+    started = threading.Event()
+    release = threading.Event()
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(2)
+        return "uma resposta"
+
+    results = []
+
+    def worker():
+        results.append(cache.get_or_compute(k, compute))
+        db.release_connections()
+
+    leader = threading.Thread(target=worker)
+    leader.start()
+    started.wait(2)
+    followers = [threading.Thread(target=worker) for _ in range(4)]
+    for t in followers:
+        t.start()
+    time.sleep(0.05)
+    release.set()
+    for t in [leader] + followers:
+        t.join()
+    assert calls == [1]
+    assert results == ["uma resposta"] * 5
+    assert cache.stats()["coalesced"] == 4
+
+
+def test_error_is_shared_and_not_cached(cache):
+    k = key(cache, "falha")
+
+    def boom():
+        raise RuntimeError("modelo fora do ar")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_compute(k, boom)
+    assert cache.get_or_compute(k, lambda: "ok") == "ok"
+
+
+def test_bypass_skips_cache(cache):
+    k = key(cache, "p")
+    cache.store(k, "velha")
+    assert cache.get_or_compute(k, lambda: "nova", bypass=True) == "nova"
@@ -0,0 +1,72 @@
+# tests/test_llm_client.py
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("requests")
+
+import llm_client  # noqa: E402
+import llm_pool  # noqa: E402
+
+
+def test_default_client_builds():
+    client = llm_client.LLMClient()
+    assert client.max_in_flight == llm_client.LLM_TOTAL_IN_FLIGHT
+    assert client.stats()["max_in_flight"] == client.max_in_flight
+    assert llm_client.get_client().model == llm_client.LLM_MODEL
+
+
+def test_capacity_is_sum_of_backends():
+    backends = [llm_pool.Backend("http://a/v1/chat/completions", 2),
+                llm_pool.Backend("http://b/v1/chat/completions", 3)]
+    client = llm_client.LLMClient(backends=backends)
+    assert client.max_in_flight == 5
+
+
+def test_slot_limits_concurrency_and_rejects_when_queue_full():
+    client = llm_client.LLMClient(url="http://a/v1/chat/completions", max_in_flight=1,
+                                  max_queue=0, queue_timeout=0.05)
+    with client.slot():  # sem fila, mas a vaga está livre
+        with pytest.raises(llm_client.LLMOverloaded):
+            with client.slot():
+                pass
+    assert client.stats()["rejected"] == 1
+
+
+def test_slot_rejects_beyond_max_queue():
+    client = llm_client.LLMClient(url="http://a/v1/chat/completions", max_in_flight=1,
+                                  max_queue=1, queue_timeout=5)
+    def wait():
+        with client.slot():
+            pass
+
+    with client.slot():
+        waiter = threading.Thread(target=wait)
+        waiter.start()
+        while client.stats()["queue_depth"] < 1:
+            time.sleep(0.001)
+        with pytest.raises(llm_client.LLMOverloaded, match="muitas conversas"):
+            with client.slot():
+                pass
+    waiter.join()
+    assert client.stats()["rejected"] == 1 and client.stats()["queue_depth"] == 0
+
+
+def test_slot_times_out_in_queue():
+    client = llm_client.LLMClient(url="http://a/v1/chat/completions", max_in_flight=1,
+                                  max_queue=4, queue_timeout=0.05)
+    errors = []
+
+    def take():
+        try:
+            with client.slot():
+                pass
+        except llm_client.LLMOverloaded as e:
+            errors.append(e)
+
+    with client.slot():
+        t = threading.Thread(target=take)
+        t.start()
+        t.join()
+    assert len(errors) == 1
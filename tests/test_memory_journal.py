@@ -0,0 +1,108 @@
+# tests/test_memory_journal.py
+import json
+
+import pytest
+
+import db
+from memory_journal import MemoryJournal
+
+SCHEMA = """
+CREATE TABLE memory (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    role TEXT,
+    content TEXT,
+    timestamp TEXT
+)
+"""
+
+
+@pytest.fixture
+def conn(tmp_path):
+    c = db.get_connection(str(tmp_path / "beka.db"))
+    c.execute(SCHEMA)
+    c.commit()
+    yield c
+    db.release_connections()
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "memory.jsonl")
+
+
+def add(conn, *contents):
+    conn.executemany("INSERT INTO memory (role, content, timestamp) VALUES ('user', ?, '2024-01-01')",
+                     [(c,) for c in contents])
+    conn.commit()
+
+
+def journal_ids(path):
+    return [e["id"] for e in MemoryJournal(path).iter_entries()]
+
+
+def test_sync_appends_only_new_rows(conn, path):
+    journal = MemoryJournal(path)
+    add(conn, "um", "dois")
+    assert journal.sync(conn) == 2
+    assert journal.sync(conn) == 0
+    add(conn, "três")
+    assert journal.sync(conn) == 1
+    assert [e["content"] for e in journal.iter_entries()] == ["um", "dois", "três"]
+    assert journal.high_water_mark() == 3
+
+
+def test_restart_resumes_from_high_water_mark(conn, path):
+    add(conn, "um", "dois")
+    MemoryJournal(path).sync(conn)
+    add(conn, "três", "quatro")
+    restarted = MemoryJournal(path)  # processo novo: a marca vem do fim do arquivo
+    assert restarted.high_water_mark() == 2
+    assert restarted.sync(conn) == 2
+    assert journal_ids(path) == [1, 2, 3, 4]
+
+
+def test_restart_after_partial_line(conn, path):
+    add(conn, "um", "dois", "três")
+    MemoryJournal(path).sync(conn)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"id": 4, "role": "us')  # queda no meio da escrita
+    add(conn, "quatro")
+    restarted = MemoryJournal(path)
+    assert restarted.high_water_mark() == 3
+    assert restarted.sync(conn) == 1
+    assert journal_ids(path) == [1, 2, 3, 4]  # a linha cortada é ignorada, sem duplicar o 4
+
+
+def test_high_water_mark_with_long_last_line(conn, path):
+    add(conn, "curta", "x" * 20000)
+    MemoryJournal(path).sync(conn)
+    assert MemoryJournal(path).high_water_mark() == 2
+
+
+def test_truncates_when_db_falls_below_high_water_mark(conn, path, tmp_path):
+    add(conn, "um", "dois", "três")
+    MemoryJournal(path).sync(conn)
+    # banco trocado por um menor (restaurado/limpo por fora)
+    other = db.get_connection(str(tmp_path / "novo.db"))
+    other.execute(SCHEMA)
+    add(other, "outro")
+    restarted = MemoryJournal(path)
+    assert restarted.sync(other) == 1
+    assert [(e["id"], e["content"]) for e in restarted.iter_entries()] == [(1, "outro")]
+    assert restarted.high_water_mark() == 1
+
+    other.execute("DELETE FROM memory")
+    other.commit()
+    assert restarted.sync(other) == 0
+    assert journal_ids(path) == [] and restarted.high_water_mark() == 0
+
+
+def test_reset_empties_the_journal(conn, path):
+    add(conn, "um")
+    journal = MemoryJournal(path)
+    journal.sync(conn)
+    journal.reset()
+    assert journal_ids(path) == [] and journal.high_water_mark() == 0
+    assert journal.sync(conn) == 1
+    with open(path, encoding="utf-8") as f:
+        assert [json.loads(line)["content"] for line in f] == ["um"]
@@ -0,0 +1,107 @@
+# tests/test_metrics.py
+import logging
+import time
+
+import pytest
+
+pytest.importorskip("flask")
+
+from flask import Flask, jsonify  # noqa: E402
+
+import db  # noqa: E402
+import metrics  # noqa: E402
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "APP_NAME", metrics.APP_NAME)
+    app = Flask("metrics_test")
+    metrics.init_app(app, "teste")
+    path = str(tmp_path / "m.db")
+
+    @app.route("/tecnicos")
+    def tecnicos():
+        conn = db.get_connection(path)
+        conn.execute("CREATE TABLE IF NOT EXISTS t (x)")
+        rows = conn.execute("SELECT 1").fetchall()
+        with metrics.span("llm_total"):
+            metrics.observe_stage("llm_ttft", 0.001)
+            time.sleep(0.002)
+            metrics.record_tokens(10, 20, 0.002)
+        return jsonify({"rows": rows})
+
+    yield app
+    db.release_connections()
+
+
+def get(client, url):
+    resp = client.get(url)
+    resp.close()  # como o servidor WSGI: as métricas fecham quando o corpo termina
+    return resp
+
+
+def stage_count(stage):
+    key = (("app", "teste"), ("stage", stage))
+    series = metrics.STAGE_SECONDS._series.get(key)
+    return series[2] if series else 0
+
+
+def test_request_records_db_llm_and_serialize(app):
+    before = {s: stage_count(s) for s in ("db", "llm_total", "llm_ttft", "serialize")}
+    resp = get(app.test_client(), "/tecnicos")
+    assert resp.status_code == 200 and resp.get_json() == {"rows": [[1]]}
+    # uma observação por etapa, com os tempos do request somados
+    for stage, n in before.items():
+        assert stage_count(stage) == n + 1, stage
+    llm = metrics.STAGE_SECONDS._series[(("app", "teste"), ("stage", "llm_total"))]
+    assert llm[1] >= 0.002
+    assert metrics._current() is None  # o request terminou
+
+
+def test_spans_are_exclusive():
+    with metrics.span("parse"):
+        with metrics.span("db"):
+            time.sleep(0.01)
+    parse = metrics.STAGE_SECONDS._series[(("app", metrics.APP_NAME), ("stage", "parse"))]
+    assert parse[1] < 0.01  # o tempo do "db" aninhado não entra no "parse"
+
+
+def test_metrics_endpoint_is_prometheus_text(app):
+    client = app.test_client()
+    get(client, "/tecnicos")
+    resp = get(client, "/metrics")
+    assert resp.status_code == 200
+    assert resp.mimetype == "text/plain"
+    text = resp.get_data(as_text=True)
+    assert "# TYPE beka_stage_seconds histogram" in text
+    assert "# TYPE beka_requests_total counter" in text
+    assert 'beka_stage_seconds_bucket{app="teste",stage="db",le="+Inf"}' in text
+    assert 'beka_requests_total{app="teste",endpoint="tecnicos",status="200"}' in text
+    assert 'beka_llm_completion_tokens_total{app="teste"}' in text
+    # o próprio /metrics não é medido
+    assert 'endpoint="metrics"' not in text
+    for line in text.splitlines():
+        assert line.startswith("#") or len(line.rsplit(" ", 1)) == 2
+
+
+def test_slow_request_is_logged(app, monkeypatch, caplog):
+    client = app.test_client()
+    monkeypatch.setattr(metrics, "SLOW_REQUEST_MS", 0)  # desligado
+    with caplog.at_level(logging.WARNING, logger=app.logger.name):
+        get(client, "/tecnicos")
+    assert "[lento]" not in caplog.text
+
+    monkeypatch.setattr(metrics, "SLOW_REQUEST_MS", 1)
+    with caplog.at_level(logging.WARNING, logger=app.logger.name):
+        get(client, "/tecnicos")
+    line = next(r.getMessage() for r in caplog.records if "[lento]" in r.getMessage())
+    assert line.startswith("[lento] tecnicos 200 ")
+    for stage in ("db=", "llm_total=", "serialize=", "outros="):
+        assert stage in line
+    assert "tokens=10+20" in line
+
+    caplog.clear()
+    monkeypatch.setattr(metrics, "SLOW_REQUEST_MS", 60_000)
+    with caplog.at_level(logging.WARNING, logger=app.logger.name):
+        get(client, "/tecnicos")
+    assert "[lento]" not in caplog.text
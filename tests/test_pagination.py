@@ -0,0 +1,100 @@
+# tests/test_pagination.py
+import json
+
+import pytest
+
+import db
+import pagination
+
+FIELDS = ("id", "role", "content", "timestamp")
+
+
+@pytest.fixture
+def conn(tmp_path):
+    c = db.get_connection(str(tmp_path / "p.db"))
+    c.execute("CREATE TABLE memory (id INTEGER PRIMARY KEY AUTOINCREMENT, role TEXT, content TEXT, "
+              "timestamp TEXT)")
+    c.executemany("INSERT INTO memory (role, content, timestamp) VALUES (?, ?, ?)",
+                  [("user", f"m{i}", f"2024-01-{i:02d} 12:00:00") for i in range(1, 26)])
+    c.commit()
+    yield c
+    db.release_connections()
+
+
+def page(**args):
+    return pagination.parse_page_args({k: str(v) for k, v in args.items()}, FIELDS, FIELDS)
+
+
+@pytest.mark.parametrize("args", [
+    {"after_id": "x"}, {"after_id": 1, "before_id": 2}, {"limit": 0}, {"fields": "id,senha"},
+    {"format": "csv"},
+])
+def test_parse_page_args_rejects(args):
+    with pytest.raises(pagination.PageError):
+        page(**args)
+
+
+def test_newest_page_then_walk_back(conn):
+    rows, cursor = pagination.fetch_page(conn, "memory", page(limit=10))
+    assert [r["id"] for r in rows] == list(range(16, 26))
+    assert cursor == {"before_id": 16}
+    seen = [r["id"] for r in rows]
+    while cursor:
+        rows, cursor = pagination.fetch_page(conn, "memory", page(limit=10, **cursor))
+        seen = [r["id"] for r in rows] + seen
+    assert seen == list(range(1, 26))
+
+
+def test_forward_pages(conn):
+    rows, cursor = pagination.fetch_page(conn, "memory", page(after_id=0, limit=20))
+    assert [r["id"] for r in rows] == list(range(1, 21)) and cursor == {"after_id": 20}
+    rows, cursor = pagination.fetch_page(conn, "memory", page(limit=20, **cursor))
+    assert [r["id"] for r in rows] == list(range(21, 26)) and cursor is None
+
+
+def test_time_filter_and_fields(conn):
+    rows, _ = pagination.fetch_page(conn, "memory", page(since="2024-01-10", until="2024-01-12 23:59",
+                                                         fields="content"))
+    assert rows == [{"content": "m10"}, {"content": "m11"}, {"content": "m12"}]
+
+
+def test_ndjson_streams_everything(conn):
+    pagination.NDJSON_BATCH, batch = 7, pagination.NDJSON_BATCH
+    try:
+        lines = "".join(pagination.iter_ndjson(conn, "memory", page(fields="id"))).splitlines()
+    finally:
+        pagination.NDJSON_BATCH = batch
+    assert [json.loads(line)["id"] for line in lines] == list(range(1, 26))
+
+
+def test_tail_is_appended_to_newest_page(conn):
+    pending = [{"role": "user", "content": f"p{i}", "timestamp": "2024-02-01 00:00:00"} for i in range(3)]
+    p = page(limit=5)
+    tail = pagination.filter_tail(conn, p, pending)
+    rows, cursor = pagination.fetch_page(conn, "memory", p, tail=tail)
+    assert [r["content"] for r in rows] == ["m24", "m25", "p0", "p1", "p2"]
+    assert rows[-1]["id"] is None
+    assert cursor == {"before_id": 24}
+
+
+def test_tail_only_page_points_at_newest_db_row(conn):
+    pending = [{"role": "user", "content": f"p{i}", "timestamp": "2024-02-01 00:00:00"} for i in range(3)]
+    p = page(limit=2, fields="content")
+    rows, cursor = pagination.fetch_page(conn, "memory", p, tail=pagination.filter_tail(conn, p, pending))
+    assert rows == [{"content": "p1"}, {"content": "p2"}]
+    assert cursor == {"before_id": 26}
+
+
+def test_tail_respects_cursor_and_time_filter(conn):
+    pending = [{"role": "user", "content": "p", "timestamp": "2024-02-01 00:00:00"}]
+    assert pagination.filter_tail(conn, page(before_id=5), pending) == []
+    assert pagination.filter_tail(conn, page(until="2024-01-31"), pending) == []
+    assert pagination.filter_tail(conn, page(since="2024-01-31", fields="content"), pending) == [
+        {"id": None, "content": "p"}]
+
+
+def test_ndjson_with_tail_and_limit(conn):
+    pending = [{"role": "user", "content": f"p{i}", "timestamp": "2024-02-01"} for i in range(3)]
+    p = page(fields="content", since="2024-01-24", limit=3)
+    lines = pagination.iter_ndjson(conn, "memory", p, tail=pagination.filter_tail(conn, p, pending))
+    assert [json.loads(line)["content"] for line in "".join(lines).splitlines()] == ["m24", "m25", "p0"]
@@ -0,0 +1,131 @@
+# tests/test_retention.py
+import gzip
+import json
+import os
+
+import pytest
+
+import db
+import retention
+
+SCHEMA = """
+CREATE TABLE chat_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+
+@pytest.fixture
+def path(tmp_path):
+    p = str(tmp_path / "beka.db")
+    conn = db.get_connection(p)
+    conn.execute(SCHEMA)
+    conn.executemany(
+        "INSERT INTO chat_history (session_id, role, content, timestamp) VALUES (?, ?, ?, ?)",
+        [("a" if i % 2 else "b", "user", f"mensagem {i} sobre o técnico de Niterói" if i % 5 == 0
+          else f"mensagem {i}", f"2024-01-{1 + i % 28:02d} 10:00:00") for i in range(1, 31)],
+    )
+    conn.commit()
+    yield p
+    db.release_connections()
+
+
+@pytest.fixture
+def base(tmp_path):
+    return str(tmp_path / "archive")
+
+
+def db_ids(path):
+    return [r[0] for r in db.get_connection(path).execute("SELECT id FROM chat_history ORDER BY id")]
+
+
+def archived(policy, base):
+    rows = []
+    for _, _, segment in retention.list_segments(retention.archive_dir(policy, base)):
+        with gzip.open(segment, "rt", encoding="utf-8") as f:
+            rows.extend(json.loads(line) for line in f)
+    return rows
+
+
+def test_archive_round_trips_and_deletes(path, base):
+    policy = retention.Policy("chat_history", path, max_rows=10)
+    original = [dict(zip(("id", "session_id", "role", "content", "timestamp"), r)) for r in
+                db.get_connection(path).execute("SELECT * FROM chat_history WHERE id <= 20 ORDER BY id")]
+    out = retention.archive_table(policy, base, segment_rows=8)
+    assert (out["rows"], out["segments"], out["upto_id"]) == (20, 3, 20)
+    assert db_ids(path) == list(range(21, 31))
+    assert archived(policy, base) == original
+    assert [(a, b) for a, b, _ in retention.list_segments(retention.archive_dir(policy, base))] == \
+        [(1, 8), (9, 16), (17, 20)]
+    # nada novo a arquivar: outra execução não mexe em nada
+    again = retention.archive_table(policy, base, segment_rows=8)
+    assert again["rows"] == 0 and again.get("recovered") == 0
+    assert len(archived(policy, base)) == 20
+
+
+def test_dry_run_changes_nothing(path, base):
+    policy = retention.Policy("chat_history", path, max_rows=10)
+    assert retention.archive_table(policy, base, dry_run=True)["rows"] == 20
+    assert len(db_ids(path)) == 30 and archived(policy, base) == []
+
+
+def test_crash_between_archive_and_delete_loses_and_duplicates_nothing(path, base, monkeypatch):
+    policy = retention.Policy("chat_history", path, max_rows=10)
+    write_segment = retention._write_segment
+    calls = []
+
+    def crash_after_second(*args):
+        final = write_segment(*args)
+        calls.append(final)
+        if len(calls) == 2:
+            raise KeyboardInterrupt("queda entre o rename do segmento e o commit do DELETE")
+        return final
+
+    monkeypatch.setattr(retention, "_write_segment", crash_after_second)
+    with pytest.raises(KeyboardInterrupt):
+        retention.archive_table(policy, base, segment_rows=8)
+    # o segundo segmento está no disco, mas o DELETE dele voltou atrás
+    assert db_ids(path) == list(range(9, 31))
+    assert [r["id"] for r in archived(policy, base)] == list(range(1, 17))
+
+    monkeypatch.setattr(retention, "_write_segment", write_segment)
+    out = retention.archive_table(policy, base, segment_rows=8)
+    assert out["recovered"] == 8  # ids <= último arquivado saem antes de continuar
+    assert db_ids(path) == list(range(21, 31))
+    ids = [r["id"] for r in archived(policy, base)]
+    assert ids == list(range(1, 21))  # cada linha arquivada exatamente uma vez
+
+
+def test_unfinished_segment_is_ignored(path, base):
+    policy = retention.Policy("chat_history", path, max_rows=10)
+    folder = retention.archive_dir(policy, base)
+    os.makedirs(folder)
+    # queda antes do rename: só sobra o .tmp, que não conta como arquivado
+    with open(os.path.join(folder, "000000000001-000000000008.jsonl.gz.tmp"), "wb") as f:
+        f.write(b"lixo")
+    out = retention.archive_table(policy, base, segment_rows=8)
+    assert out["rows"] == 20 and "recovered" not in out
+    assert [r["id"] for r in archived(policy, base)] == list(range(1, 21))
+
+
+def test_search_archive(path, base):
+    policy = retention.Policy("chat_history", path, max_rows=10)
+    retention.archive_table(policy, base, segment_rows=8)
+    hits = retention.search_archive(policy, "tecnico niteroi", base=base)
+    # das mais novas para as mais antigas; só as arquivadas (ids 5, 10, 15, 20)
+    assert [h["id"] for h in hits] == [20, 15, 10, 5]
+    assert all(h["archived"] for h in hits)
+    assert [h["id"] for h in retention.search_archive(policy, "tecnico", limit=2, base=base)] == [20, 15]
+    assert [h["id"] for h in retention.search_archive(policy, "tecnico", base=base, before_id=15)] == [10, 5]
+    scoped = retention.search_archive(policy, "tecnico", base=base, match=lambda r: r["session_id"] == "a")
+    assert [h["id"] for h in scoped] == [15, 5]
+    assert retention.search_archive(policy, "  ", base=base) == []
+
+
+def test_no_policy_archives_nothing(path, base):
+    out = retention.archive_table(retention.Policy("chat_history", path), base)
+    assert out["rows"] == 0 and len(db_ids(path)) == 30
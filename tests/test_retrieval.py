@@ -0,0 +1,112 @@
+# tests/test_retrieval.py
+import pytest
+
+import db
+import retrieval
+
+
+@pytest.fixture
+def conn(tmp_path):
+    c = db.get_connection(str(tmp_path / "mem.db"))
+    c.execute("CREATE TABLE chat_history (id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT, "
+              "role TEXT, content TEXT)")
+    c.commit()
+    yield c
+    db.release_connections()
+
+
+def add(conn, session, content, role="user"):
+    with conn:
+        return conn.execute("INSERT INTO chat_history (session_id, role, content) VALUES (?, ?, ?)",
+                            (session, role, content)).lastrowid
+
+
+def test_bm25_search_and_session_scope(conn):
+    index = retrieval.MemoryIndex("chat_history")
+    index.init(conn)
+    add(conn, "a", "O técnico de Niterói atende às terças")
+    add(conn, "b", "Técnicos de Niterói mudaram de endereço")
+    add(conn, "a", "Receita de bolo de cenoura")
+    hits = index.search(conn, "tecnico niteroi", k=5, columns=("session_id", "role"))
+    assert {h["session_id"] for h in hits} == {"a", "b"}
+    scoped = index.search(conn, "tecnico niteroi", k=5, where="t.session_id = ?", args=("a",),
+                          columns=("session_id", "role"))
+    assert [h["session_id"] for h in scoped] == ["a"]
+
+
+def test_fts_triggers_follow_updates_and_deletes(conn):
+    index = retrieval.MemoryIndex("chat_history")
+    index.init(conn)
+    row = add(conn, "a", "placa do carro ABC")
+    assert index.search(conn, "placa")
+    with conn:
+        conn.execute("UPDATE chat_history SET content = 'nada a ver' WHERE id = ?", (row,))
+    assert not index.search(conn, "placa")
+    with conn:
+        conn.execute("DELETE FROM chat_history")
+    assert not index.search(conn, "nada")
+
+
+def test_vector_index_appends_segments_and_drops_deleted_ids(conn, tmp_path):
+    np = pytest.importorskip("numpy")
+    path = str(tmp_path / "mem.vec.npz")
+    vectors = retrieval.HashingVectorIndex(path, dim=256)
+    vectors.init(conn, "chat_history")
+    words = ["geladeira", "fogão", "lavadora", "micro-ondas", "freezer"]
+    ids = [add(conn, "a", f"mensagem sobre {w}") for w in words]
+    assert vectors.refresh(conn, "chat_history", "content") == 5
+    new = add(conn, "a", "mensagem nova")
+    assert vectors.refresh(conn, "chat_history", "content") == 1
+    assert len(vectors.segments) == 2  # só as linhas novas foram gravadas
+    assert vectors.refresh(conn, "chat_history", "content") == 0
+    # esparso: uma entrada por token distinto, não `dim` floats por linha
+    assert sum(len(s[2]) for s in vectors.segments) < 6 * 4
+    with conn:
+        conn.execute("DELETE FROM chat_history WHERE id IN (?, ?)", ids[:2])
+    vectors.refresh(conn, "chat_history", "content")
+    assert vectors.ids.tolist() == ids[2:] + [new]
+    assert vectors.last_id == new
+    assert conn.execute("SELECT COUNT(*) FROM chat_history_vec_deleted").fetchone() == (0,)
+    # recarregado do disco: mesma coisa
+    again = retrieval.HashingVectorIndex(path, dim=256)
+    assert again.ids.tolist() == vectors.ids.tolist() and again.last_id == new
+    hits = again.search("mensagem sobre micro-ondas", 3)
+    assert hits[0][0] == ids[3]
+    assert np.isclose(hits[0][1], 1.0)
+
+
+def test_vector_refresh_reads_only_new_rows(conn, tmp_path):
+    pytest.importorskip("numpy")
+    vectors = retrieval.HashingVectorIndex(str(tmp_path / "mem.vec.npz"), dim=256)
+    vectors.init(conn, "chat_history")
+    for i in range(3):
+        add(conn, "a", f"linha {i}")
+    vectors.refresh(conn, "chat_history", "content")
+    seen = []
+    conn.set_trace_callback(seen.append)
+    try:
+        add(conn, "a", "mais uma")
+        vectors.refresh(conn, "chat_history", "content")
+    finally:
+        conn.set_trace_callback(None)
+    reads = [q for q in seen if q.lstrip().upper().startswith("SELECT")]
+    assert any("id > 3" in q for q in reads)
+    assert not any("id <=" in q for q in reads)  # nada de varrer os ids já indexados
+
+
+def test_vector_index_reindexes_old_dense_files(conn, tmp_path):
+    np = pytest.importorskip("numpy")
+    path = str(tmp_path / "mem.vec.npz")
+    np.savez(path, ids=np.array([1]), matrix=np.zeros((1, 8), dtype=np.float32))
+    vectors = retrieval.HashingVectorIndex(path, dim=256)
+    assert vectors.last_id == 0 and not vectors.segments
+    add(conn, "a", "texto qualquer")
+    vectors.init(conn, "chat_history")
+    assert vectors.refresh(conn, "chat_history", "content") == 1
+
+
+def test_memory_index_drops_deletion_log_without_vectors(conn):
+    with conn:
+        conn.execute("CREATE TABLE chat_history_vec_deleted (id INTEGER PRIMARY KEY)")
+    retrieval.MemoryIndex("chat_history").init(conn)
+    assert not conn.execute("SELECT 1 FROM sqlite_master WHERE name LIKE 'chat_history_vec_deleted%'").fetchall()
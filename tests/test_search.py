@@ -0,0 +1,110 @@
+# tests/test_search.py
+import pytest
+
+import db
+import search
+import tecnicos
+
+SCHEMA = """
+CREATE TABLE tecnicos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    estado TEXT,
+    nome TEXT,
+    cpf TEXT,
+    rg TEXT,
+    telefone TEXT,
+    outros TEXT,
+    created_at TEXT
+)
+"""
+INSERT = "INSERT INTO tecnicos (estado, nome, cpf, rg, telefone, outros) VALUES (?, ?, ?, ?, ?, ?)"
+
+
+@pytest.fixture
+def conn(tmp_path):
+    c = db.get_connection(str(tmp_path / "s.db"))
+    c.execute(SCHEMA)
+    c.execute(INSERT, ("SP", "João Conceição", "123.456.789-01", None, "(11) 99999-0000", None))
+    c.commit()
+    yield c
+    db.release_connections()
+
+
+def names(conn, q=None, estado=None, **kw):
+    return [r["nome"] for r in search.search_tecnicos(conn, q, estado, **kw)[0]]
+
+
+@pytest.mark.parametrize("q, expected", [
+    ("joão", '"joão"*'),
+    ("123.456.789-01", '"12345678901"*'),
+    ('maria "or" souza*', '"maria"* "or"* "souza"*'),
+    ("RG: 12.345", '"RG"* "12345"*'),
+    ("m²", '"m²"*'),
+    ("²", '"²"*'),  # isdigit(), mas sem \d: nunca vira o termo vazio ""*
+    ("1² 10", '"1"* "10"*'),
+    ("", ""),
+])
+def test_build_match_query(q, expected):
+    assert search.build_match_query(q) == expected
+
+
+def test_init_search_indexes_existing_rows_once(conn):
+    search.init_search(conn)
+    search.init_search(conn)
+    assert names(conn, "joao") == ["João Conceição"]
+    assert conn.execute("SELECT COUNT(*) FROM tecnicos_fts WHERE tecnicos_fts MATCH 'joao'").fetchone() == (1,)
+
+
+def test_search_by_prefix_and_digits(conn):
+    search.init_search(conn)
+    assert names(conn, "conc") == ["João Conceição"]
+    assert names(conn, "12345678901") == ["João Conceição"]
+    assert names(conn, "123.456") == ["João Conceição"]
+    assert names(conn, "11999990000") == ["João Conceição"]
+    assert names(conn, "maria") == []
+
+
+def test_triggers_follow_insert_update_delete(conn):
+    search.init_search(conn)
+    with conn:
+        conn.execute(INSERT, ("RJ", "Maria Souza", None, "55.555.555-5", None, "turno noite"))
+    assert names(conn, "souza") == ["Maria Souza"]
+    assert names(conn, "noite") == ["Maria Souza"]
+    assert names(conn, "555555555") == ["Maria Souza"]
+
+    with conn:
+        conn.execute("UPDATE tecnicos SET nome = 'Maria Lima' WHERE nome = 'Maria Souza'")
+    assert names(conn, "souza") == []
+    assert names(conn, "lima") == ["Maria Lima"]
+
+    with conn:
+        conn.execute("DELETE FROM tecnicos WHERE nome = 'Maria Lima'")
+    assert names(conn, "lima") == []
+    assert names(conn, "555555555") == []
+
+
+def test_upsert_keeps_index_in_sync(conn):
+    tecnicos.init_cpf_index(conn)
+    search.init_search(conn)
+    rec = tecnicos.prepare_record({"nome": "João Conceição", "cpf": "12345678901", "telefone": "21 3333-4444"},
+                                  "SP")[0]
+    assert tecnicos.bulk_insert_tecnicos(conn, [rec])["updated"] == 1
+    assert names(conn, "2133334444") == ["João Conceição"]
+    assert names(conn, "11999990000") == []
+
+
+def test_estado_filter_and_pages(conn):
+    search.init_search(conn)
+    with conn:
+        conn.executemany(INSERT, [("RJ", f"Técnico {i}", None, None, None, None) for i in range(5)])
+    assert names(conn, "tecnico", "SP") == []
+    first, more = search.search_tecnicos(conn, "tecnico", "RJ", limit=3)
+    assert len(first) == 3 and more
+    rest, more = search.search_tecnicos(conn, "tecnico", "RJ", limit=3, offset=3)
+    assert len(rest) == 2 and not more
+    assert {r["id"] for r in first}.isdisjoint(r["id"] for r in rest)
+    # só estado: do mais novo ao mais antigo, sem score
+    listed = search.search_tecnicos(conn, None, "RJ")[0]
+    assert [r["nome"] for r in listed] == [f"Técnico {i}" for i in reversed(range(5))]
+    assert listed[0]["score"] is None
+    assert search.search_tecnicos(conn) == ([], False)
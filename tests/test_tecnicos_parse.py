@@ -0,0 +1,66 @@
+# tests/test_tecnicos_parse.py
+# parse_technicians_batch / prepare_columns devem dar exatamente o mesmo resultado
+# que parse_technician / prepare_record, linha a linha.
+import random
+
+import pytest
+
+import tecnicos
+
+GOLDEN = [
+    "Carlos Souza CPF 123.456.789-09 RG: 12.345-6 Tel (21) 99876-5432",
+    "Ana Lima - 12345678909 - (11) 91234-5678",
+    "João da Silva, cpf: 98765432100, telefone 21 98888-7777",
+    "Maicon Pereira Tel: (31) 3333-4444",
+    "Fernanda Dos Santos RG 1.234.567",
+    "Técnico Pedro",
+    "123.456.789-09 Luís Otávio",
+    "CPF 123.456.789-09 Marcos",
+    "(11) 98765-4321 Carla placa ABC-1234",
+    "DADOS TECNICOS DE RJ: Bruno 111.222.333-44",
+    "Paulo: RG:22.333-4 (21) 97777-6666",
+    "  Rita  ;  12345678909  ",
+    "",
+    # só rótulos, sem números
+    "RG",
+    "CPF",
+    "Carlos RG-",
+    "Ana rg: .",
+    "CPF: Ana",
+    "rG-d,Od:",
+    "RG:-",
+    "cpf rg",
+]
+
+
+def fuzz_lines(n, seed):
+    rnd = random.Random(seed)
+    alphabet = "rRgGcCpPfFdDoOsS0123456789 .-:,()\tTéÉ"
+    return ["".join(rnd.choice(alphabet) for _ in range(rnd.randint(0, 30))) for _ in range(n)]
+
+
+@pytest.mark.parametrize("lines", [GOLDEN, fuzz_lines(20000, seed=7)], ids=["golden", "fuzz"])
+def test_batch_matches_per_line(lines):
+    expected = [tecnicos.parse_technician(line) for line in lines]
+    got = tecnicos.batch_records(tecnicos.parse_technicians_batch(lines))
+    diffs = [(line, e, g) for line, e, g in zip(lines, expected, got) if e != g]
+    assert not diffs, diffs[:3]
+
+
+def test_label_only_rg():
+    line = "rG-d,Od:"
+    assert tecnicos.parse_technician(line)["rg"] == "-"
+    assert tecnicos.parse_technicians_batch([line])["rg"] == ["-"]
+
+
+def test_cpf_digits_column():
+    cols = tecnicos.parse_technicians_batch(["Ana 123.456.789-09", "Bruno"])
+    assert cols["cpf_digits"] == ["12345678909", None]
+
+
+@pytest.mark.parametrize("estado", [None, " rj ", "SP"])
+def test_prepare_columns_matches_prepare_record(estado):
+    lines = [line.strip() for line in GOLDEN + fuzz_lines(5000, seed=11)] + ["Nome " + "x" * 3000]
+    got = tecnicos.prepare_columns(tecnicos.parse_technicians_batch(lines), estado)
+    for line, result in zip(lines, got):
+        assert result == tecnicos.prepare_record(line, estado), line
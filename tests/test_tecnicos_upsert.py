@@ -0,0 +1,91 @@
+# tests/test_tecnicos_upsert.py
+import pytest
+
+import db
+import tecnicos
+
+SCHEMA = """
+CREATE TABLE tecnicos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    estado TEXT,
+    nome TEXT,
+    cpf TEXT,
+    rg TEXT,
+    telefone TEXT,
+    outros TEXT,
+    created_at TEXT
+)
+"""
+
+
+@pytest.fixture
+def conn(tmp_path):
+    c = db.get_connection(str(tmp_path / "tec.db"))
+    c.execute(SCHEMA)
+    c.commit()
+    yield c
+    db.release_connections()
+
+
+def rows(conn):
+    return conn.execute("SELECT estado, nome, cpf, cpf_norm, rg, telefone FROM tecnicos ORDER BY id").fetchall()
+
+
+def test_init_cpf_index_merges_old_duplicates(conn):
+    conn.executemany("INSERT INTO tecnicos (estado, nome, cpf, rg, telefone) VALUES (?, ?, ?, ?, ?)", [
+        ("SP", "Ana", "123.456.789-01", None, "11 99999-0000"),
+        ("RJ", "Ana Souza", "12345678901", "55.555.555-5", None),
+        ("SP", "Bruno", "987.654.321-00", None, None),
+    ])
+    conn.commit()
+    assert tecnicos.init_cpf_index(conn) == 1
+    assert rows(conn) == [
+        ("RJ", "Ana Souza", "12345678901", "12345678901", "55.555.555-5", "11 99999-0000"),
+        ("SP", "Bruno", "987.654.321-00", "98765432100", None, None),
+    ]
+    # segunda chamada não faz nada
+    assert tecnicos.init_cpf_index(conn) == 0
+
+
+def test_bulk_insert_upserts_by_normalized_cpf(conn):
+    tecnicos.init_cpf_index(conn)
+    first = [tecnicos.prepare_record({"nome": "Ana", "cpf": "123.456.789-01"}, "SP")[0]]
+    assert tecnicos.bulk_insert_tecnicos(conn, first) == {"inserted": 1, "updated": 0, "unchanged": 0}
+
+    again = [tecnicos.prepare_record({"nome": "Ana", "cpf": "123.456.789-01"}, "SP")[0],
+             tecnicos.prepare_record({"nome": "Ana", "cpf": "123 456 789 01", "telefone": "1199"}, "SP")[0]]
+    assert tecnicos.bulk_insert_tecnicos(conn, again) == {"inserted": 0, "updated": 1, "unchanged": 1}
+    assert [r["action"] for r in again] == ["unchanged", "updated"]
+    assert len(rows(conn)) == 1
+    assert rows(conn)[0][5] == "1199"
+
+
+def test_bulk_insert_keeps_known_values(conn):
+    tecnicos.init_cpf_index(conn)
+    tecnicos.bulk_insert_tecnicos(conn, [tecnicos.prepare_record(
+        {"nome": "Ana", "cpf": "12345678901", "rg": "1234567"}, "SP")[0]])
+    # sem nome/estado/rg: não apaga o que já estava gravado
+    tecnicos.bulk_insert_tecnicos(conn, [tecnicos.prepare_record({"cpf": "12345678901"})[0]])
+    assert rows(conn) == [("SP", "Ana", "12345678901", "12345678901", "1234567", None)]
+
+
+def test_records_without_cpf_are_always_inserted(conn):
+    tecnicos.init_cpf_index(conn)
+    recs = [tecnicos.prepare_record({"nome": "Sem CPF"}, "SP")[0] for _ in range(2)]
+    assert tecnicos.bulk_insert_tecnicos(conn, recs)["inserted"] == 2
+    assert len(rows(conn)) == 2
+
+
+def test_ingest_reports_per_line_results(conn):
+    tecnicos.init_cpf_index(conn)
+    accepted, results, counts = tecnicos.ingest(conn, [
+        "Ana CPF 123.456.789-01 tel (11) 99999-0000",
+        "",
+        {"nome": "Ana Souza", "cpf": "12345678901"},
+        {"rg": "123"},
+    ], default_estado="sp")
+    assert len(accepted) == 2
+    assert counts == {"inserted": 1, "updated": 1, "unchanged": 0}
+    assert [r["status"] for r in results] == ["accepted", "rejected", "accepted", "rejected"]
+    assert results[0]["action"] == "inserted" and results[2]["action"] == "updated"
+    assert rows(conn) == [("SP", "Ana Souza", "12345678901", "12345678901", None, "(11) 99999-0000")]
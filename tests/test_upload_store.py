@@ -0,0 +1,133 @@
+# tests/test_upload_store.py
+import io
+import threading
+
+import pytest
+
+import db
+import importer
+import upload_store
+
+HEADERS = ["Estado", "Nome", "CPF"]
+ROWS = [("SP", f"Técnico {i}", f"{i:011d}") for i in range(12)]
+
+
+@pytest.fixture
+def reads(monkeypatch):
+    """Conta quantas vezes o arquivo original é lido (no lugar do leitor de CSV/XLSX)."""
+    calls = []
+
+    def fake_iter_chunks(path, chunk_rows=importer.CHUNK_ROWS):
+        calls.append(path)
+        for i in range(0, len(ROWS), chunk_rows):
+            yield HEADERS, ROWS[i:i + chunk_rows]
+
+    monkeypatch.setattr(importer, "iter_chunks", fake_iter_chunks)
+    return calls
+
+
+@pytest.fixture
+def store(tmp_path):
+    s = upload_store.UploadStore(str(tmp_path / "uploads"), str(tmp_path / "app.db"))
+    yield s
+    db.release_connections()
+
+
+def upload(store, data, name="tecnicos.csv"):
+    return store.save(io.BytesIO(data), name)
+
+
+def test_reupload_is_deduplicated(store):
+    sha, new = upload(store, b"a;b\n1;2\n")
+    assert new
+    again, new = upload(store, b"a;b\n1;2\n", "copia.csv")
+    assert (again, new) == (sha, False)
+    meta = store.get(sha)
+    assert meta["filename"] == "copia.csv" and meta["size"] == 8
+    assert store.stats()["dedup_hits"] == 1 and store.stats()["files"] == 1
+    assert len(store.recent()) == 1
+
+
+def test_reupload_keeps_cache_metadata(store, reads):
+    sha, _ = upload(store, b"conteudo")
+    meta, built = store.ensure_cache(sha)
+    assert built and meta["row_count"] == len(ROWS) and meta["columns"] == HEADERS
+    upload(store, b"conteudo")
+    assert store.get(sha)["row_count"] == len(ROWS)
+    assert store.get(sha)["cache_format"] == upload_store.CACHE_FORMAT
+
+
+def test_concurrent_uploads_of_same_content(store):
+    barrier = threading.Barrier(8)
+    results = []
+
+    def worker():
+        barrier.wait()
+        results.append(upload(store, b"mesmo conteudo"))
+        db.release_connections()
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    # a checagem roda dentro da transação: só um upload grava, os outros são repetição
+    assert sorted(new for _, new in results) == [False] * 7 + [True]
+    assert len({sha for sha, _ in results}) == 1
+    assert store.stats()["files"] == 1 and store.stats()["dedup_hits"] == 7
+
+
+def test_preview_and_import_read_the_cache(store, reads, tmp_path):
+    sha, _ = upload(store, b"planilha")
+    assert store.preview(sha, 2) == [dict(zip(HEADERS, r)) for r in ROWS[:2]]
+    assert len(reads) == 1
+    assert store.preview(sha) == [dict(zip(HEADERS, r)) for r in ROWS[:upload_store.PREVIEW_ROWS]]
+    assert [len(rows) for _, rows in store.iter_chunks(sha, 5)] == [5, 5, 2]
+
+    db_file = str(tmp_path / "tec.db")
+    conn = db.get_connection(db_file)
+    conn.execute("CREATE TABLE tecnicos (id INTEGER PRIMARY KEY AUTOINCREMENT, estado TEXT, nome TEXT, "
+                 "cpf TEXT, cpf_norm TEXT, rg TEXT, telefone TEXT, outros TEXT, created_at TEXT)")
+    conn.execute("CREATE UNIQUE INDEX idx_tecnicos_cpf_norm ON tecnicos (cpf_norm) WHERE cpf_norm IS NOT NULL")
+    conn.commit()
+    job = importer._new_job("planilha.csv", None)
+    importer.run_import(job, None, db_file, chunk_rows=5, chunks=lambda n: store.iter_chunks(sha, n))
+    job = importer.get_job(job["id"])
+    assert job["status"] == "done", job["error"]
+    assert job["inserted"] == len(ROWS)
+    assert len(reads) == 1  # o original foi lido uma vez só
+    assert store.stats()["cache_builds"] == 1
+
+
+def test_eviction_by_total_size(tmp_path):
+    store = upload_store.UploadStore(str(tmp_path / "uploads"), str(tmp_path / "app.db"), max_bytes=250)
+    try:
+        shas = [upload(store, bytes([i]) * 100)[0] for i in range(3)]
+        # 300 bytes > 250: sai o menos usado até ~90% do limite
+        assert store.get(shas[0]) is None
+        assert store.get(shas[1]) and store.get(shas[2])
+        assert store.stats()["evictions"] == 1
+        assert store.stats()["blob_bytes"] == 200
+    finally:
+        db.release_connections()
+
+
+def test_pinned_upload_survives_eviction(tmp_path, reads):
+    store = upload_store.UploadStore(str(tmp_path / "uploads"), str(tmp_path / "app.db"), max_bytes=10 ** 6)
+    try:
+        old, _ = upload(store, b"x" * 100)
+        chunks = store.iter_chunks(old, 5)
+        next(chunks)  # leitura em andamento: o upload fica fixado
+        cache_size = store.get(old)["cache_size"]
+        store.max_bytes = 100 + cache_size + 150
+        newer = [upload(store, bytes([i]) * 100)[0] for i in range(2)]
+        assert store.get(old) is not None
+        assert store.get(newer[0]) is None  # o mais antigo não fixado saiu no lugar
+        assert [len(rows) for _, rows in chunks] == [5, 2]
+        chunks.close()
+        # solto, volta a ser o menos usado recentemente
+        store.max_bytes = 150
+        assert store.evict() == 1
+        assert store.get(old) is None and store.get(newer[1]) is not None
+    finally:
+        db.release_connections()
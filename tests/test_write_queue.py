@@ -0,0 +1,152 @@
+# tests/test_write_queue.py
+import json
+import sqlite3
+import threading
+
+import pytest
+
+import db
+import write_queue
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS log (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session TEXT NOT NULL,
+    content TEXT NOT NULL
+)
+"""
+INSERT = "INSERT INTO log (session, content) VALUES (?, ?)"
+
+
+@pytest.fixture
+def path(tmp_path):
+    p = str(tmp_path / "wq.db")
+    conn = db.get_connection(p)
+    conn.execute(SCHEMA)
+    conn.commit()
+    yield p
+    db.release_connections()
+
+
+def rows(path):
+    return db.get_connection(path).execute("SELECT session, content FROM log ORDER BY id").fetchall()
+
+
+@pytest.mark.parametrize("mode", write_queue.DURABILITY_MODES)
+def test_modes_write_everything_in_order(path, mode):
+    q = write_queue.WriteQueue(path, INSERT, durability=mode, flush_ms=5)
+    for i in range(50):
+        q.put(("s", f"m{i}"))
+    assert q.flush(timeout=5)
+    assert rows(path) == [("s", f"m{i}") for i in range(50)]
+    q.close()
+
+
+def test_group_mode_returns_after_commit(path):
+    q = write_queue.WriteQueue(path, INSERT, durability="group")
+    q.put(("s", "já gravada"))
+    assert rows(path) == [("s", "já gravada")]
+    q.close()
+
+
+def test_read_lock_sees_each_row_exactly_once(path):
+    q = write_queue.WriteQueue(path, INSERT, durability="async", flush_ms=1)
+    stop = threading.Event()
+
+    def producer():
+        i = 0
+        while not stop.is_set():
+            q.put(("s", f"m{i}"))
+            i += 1
+
+    t = threading.Thread(target=producer)
+    t.start()
+    try:
+        for _ in range(50):
+            with q.read_lock():
+                seen = [r[1] for r in rows(path)] + [r[1] for r in q.pending()]
+            assert len(seen) == len(set(seen))
+            assert seen == [f"m{i}" for i in range(len(seen))]
+    finally:
+        stop.set()
+        t.join()
+        q.close()
+
+
+def test_discard_drops_pending_rows(path):
+    q = write_queue.WriteQueue(path, INSERT, durability="async", flush_ms=200, batch_rows=1000)
+    q.put(("a", "fica"))
+    q.put(("b", "sai"))
+    assert q.discard(lambda r: r[0] == "b") == 1
+    assert q.flush(timeout=5)
+    assert rows(path) == [("a", "fica")]
+    q.close()
+
+
+def test_on_commit_receives_contiguous_ids(path):
+    seen = []
+    q = write_queue.WriteQueue(path, INSERT, durability="async", flush_ms=5,
+                               on_commit=lambda batch, first: seen.extend(
+                                   (first + i, r[1]) for i, r in enumerate(batch)))
+    for i in range(10):
+        q.put(("s", f"m{i}"))
+    assert q.flush(timeout=5)
+    ids = db.get_connection(path).execute("SELECT id, content FROM log ORDER BY id").fetchall()
+    assert seen == [tuple(r) for r in ids]
+    q.close()
+
+
+def test_permanent_error_goes_to_dead_letter_and_log_continues(path, tmp_path):
+    dead = str(tmp_path / "dead.jsonl")
+    q = write_queue.WriteQueue(path, INSERT, durability="async", flush_ms=50, dead_letter_path=dead)
+    q.put(("s", "antes"))
+    q.put(("s", None))  # NOT NULL: nunca vai entrar
+    q.put(("s", "depois"))
+    assert q.flush(timeout=5)
+    assert rows(path) == [("s", "antes"), ("s", "depois")]
+    with open(dead, encoding="utf-8") as f:
+        entries = [json.loads(line) for line in f]
+    assert [e["row"] for e in entries] == [["s", None]]
+    assert "IntegrityError" in entries[0]["error"]
+    q.put(("s", "mais uma"))
+    assert q.flush(timeout=5)
+    assert q.stats()["dead_letter"] == 1
+    q.close()
+
+
+def test_locked_database_is_retried(path):
+    blocker = sqlite3.connect(path, timeout=0)
+    blocker.execute("BEGIN IMMEDIATE")
+    q = write_queue.WriteQueue(path, INSERT, durability="async", flush_ms=1)
+    q.put(("s", "espera o lock"))
+    assert not q.flush(timeout=0.3)
+    blocker.rollback()
+    blocker.close()
+    assert q.flush(timeout=db.BUSY_TIMEOUT_MS / 1000 + 5)
+    assert rows(path) == [("s", "espera o lock")]
+    assert q.stats()["dead_letter"] == 0
+    q.close()
+
+
+def test_put_times_out_when_queue_stays_full(path):
+    blocker = sqlite3.connect(path, timeout=0)
+    blocker.execute("BEGIN IMMEDIATE")
+    try:
+        q = write_queue.WriteQueue(path, INSERT, durability="async", flush_ms=1, max_pending=2,
+                                   put_timeout=0.2)
+        q.put(("s", "1"))
+        q.put(("s", "2"))
+        with pytest.raises(write_queue.WriteQueueFull):
+            q.put(("s", "3"))
+        assert q.stats()["rejected_full"] == 1
+    finally:
+        blocker.rollback()
+        blocker.close()
+    assert q.flush(timeout=15)
+    q.close()
+
+
+def test_is_transient():
+    assert write_queue.is_transient(sqlite3.OperationalError("database is locked"))
+    assert not write_queue.is_transient(sqlite3.OperationalError("no such table: log"))
+    assert not write_queue.is_transient(sqlite3.IntegrityError("NOT NULL constraint failed"))
@@ -0,0 +1,345 @@
+# upload_store.py
+# Uploads de planilhas endereçados por conteúdo (sha256), com cache colunar já lido.
+#
+#   uploads/blobs/<sha[:2]>/<sha><ext>   arquivo original (cada conteúdo é guardado uma vez)
+#   uploads/cache/<sha>.parquet          planilha lida (todas as colunas como texto)
+#   uploads/cache/<sha>.jsonl.gz         o mesmo sem pyarrow: 1ª linha = cabeçalho, depois 1 lista por linha
+#
+# A tabela uploads (no banco do app) registra nome, tamanho, aba, colunas, número de
+# linhas e o formato do cache. O hash é calculado enquanto o upload é gravado: reenviar
+# o mesmo arquivo não lê a planilha de novo, a prévia sai do cache. Importações e
+# prévias posteriores usam iter_chunks(sha), que lê o cache em vez de reabrir o XLSX.
+# Quando blobs + caches passam de UPLOAD_STORE_MAX_MB, os menos usados recentemente
+# são removidos (arquivo, cache e metadados).
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+from itertools import islice
+
+import db
+import importer
+
+UPLOAD_STORE_MAX_BYTES = int(float(os.getenv("UPLOAD_STORE_MAX_MB", "1024")) * 1024 * 1024)
+HASH_CHUNK = 1024 * 1024
+PREVIEW_ROWS = 5
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # opcional: sem pyarrow o cache é JSONL gzip
+    pa = pq = None
+
+CACHE_FORMAT = "parquet" if pq else "jsonl.gz"
+
+
+def _sheet_name(path):
+    if not path.lower().endswith((".xlsx", ".xlsm")):
+        return None
+    from openpyxl import load_workbook  # lazy
+
+    wb = load_workbook(path, read_only=True)
+    try:
+        return wb.active.title
+    finally:
+        wb.close()
+
+
+# ----------------- Formatos do cache -----------------
+class _ParquetSink:
+    def __init__(self, path, ncols):
+        # colunas posicionais (c0, c1...): cabeçalhos de planilha podem se repetir;
+        # os nomes reais ficam na tabela uploads
+        self.names = [f"c{i}" for i in range(ncols)]
+        self.writer = pq.ParquetWriter(path, pa.schema([(n, pa.string()) for n in self.names]))
+
+    def write(self, columns):
+        self.writer.write_table(pa.table(columns, names=self.names))
+
+    def close(self):
+        self.writer.close()
+
+
+class _JsonlSink:
+    def __init__(self, path, headers):
+        self.f = gzip.open(path, "wt", encoding="utf-8", compresslevel=6)
+        self.f.write(json.dumps(headers, ensure_ascii=False) + "\n")
+
+    def write(self, columns):
+        self.f.writelines(json.dumps(r, ensure_ascii=False) + "\n" for r in zip(*columns))
+
+    def close(self):
+        self.f.close()
+
+
+def _read_parquet(path, chunk_rows):
+    pf = pq.ParquetFile(path)
+    for batch in pf.iter_batches(batch_size=chunk_rows):
+        yield list(zip(*(c.to_pylist() for c in batch.columns)))
+
+
+def _read_jsonl(path, chunk_rows):
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        next(f, None)  # cabeçalho (já está nos metadados)
+        while True:
+            lines = list(islice(f, chunk_rows))
+            if not lines:
+                break
+            yield [json.loads(line) for line in lines]
+
+
+class UploadStore:
+    def __init__(self, root, db_path, max_bytes=UPLOAD_STORE_MAX_BYTES):
+        self.root = root
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._building = {}      # sha -> Lock (uma leitura da planilha por conteúdo)
+        self._pins = Counter()   # sha -> leituras em andamento (não remover)
+        self._stats = {"uploads": 0, "dedup_hits": 0, "cache_builds": 0, "cache_hits": 0, "evictions": 0}
+        for sub in ("blobs", "cache", "tmp"):
+            os.makedirs(os.path.join(root, sub), exist_ok=True)
+        self._init_table()
+
+    def _init_table(self):
+        conn = db.get_connection(self.db_path)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS uploads (
+                sha256 TEXT PRIMARY KEY,
+                filename TEXT NOT NULL,
+                ext TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                sheet TEXT,
+                columns TEXT,
+                row_count INTEGER,
+                cache_format TEXT,
+                cache_size INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_uploads_last_used ON uploads (last_used)")
+        conn.commit()
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    # ---------- caminhos ----------
+    def blob_path(self, sha, ext):
+        return os.path.join(self.root, "blobs", sha[:2], sha + ext)
+
+    def cache_path(self, sha, fmt):
+        return os.path.join(self.root, "cache", f"{sha}.{fmt}")
+
+    # ---------- gravação ----------
+    def save(self, stream, filename):
+        """Grava o upload calculando o sha256; conteúdo repetido não é regravado.
+
+        Retorna (sha, novo).
+        """
+        ext = os.path.splitext(filename)[1].lower()
+        h = hashlib.sha256()
+        size = 0
+        with tempfile.NamedTemporaryFile(dir=os.path.join(self.root, "tmp"), delete=False) as tmp:
+            while True:
+                chunk = stream.read(HASH_CHUNK)
+                if not chunk:
+                    break
+                h.update(chunk)
+                tmp.write(chunk)
+                size += len(chunk)
+        sha = h.hexdigest()
+        now = time.time()
+        path = self.blob_path(sha, ext)
+        conn = db.get_connection(self.db_path)
+        # checagem e gravação numa única transação IMMEDIATE: dois uploads simultâneos do
+        # mesmo conteúdo não apagam a aba/colunas/cache que o primeiro já registrou
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT ext, cache_format FROM uploads WHERE sha256 = ?", (sha,)).fetchone()
+            new = not (row and row[0] == ext and os.path.exists(path))
+            if not new:
+                os.remove(tmp.name)
+                conn.execute("UPDATE uploads SET filename = ?, last_used = ? WHERE sha256 = ?",
+                             (filename, now, sha))
+            else:
+                if row:  # mesmo conteúdo com outra extensão (ou arquivo sumido): lê de novo
+                    self._remove_files(sha, row[0], row[1])
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp.name, path)
+                conn.execute("""
+                    INSERT OR REPLACE INTO uploads (sha256, filename, ext, size, created_at, last_used)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, (sha, filename, ext, size, now, now))
+        if not new:
+            self._count("dedup_hits")
+            return sha, False
+        self._count("uploads")
+        self.evict(keep=(sha,))
+        return sha, True
+
+    def get(self, sha):
+        conn = db.get_connection(self.db_path)
+        row = conn.execute("""
+            SELECT sha256, filename, ext, size, sheet, columns, row_count, cache_format,
+                   cache_size, created_at, last_used
+            FROM uploads WHERE sha256 = ?
+        """, (sha,)).fetchone()
+        if not row:
+            return None
+        keys = ("sha256", "filename", "ext", "size", "sheet", "columns", "row_count", "cache_format",
+                "cache_size", "created_at", "last_used")
+        meta = dict(zip(keys, row))
+        meta["columns"] = json.loads(meta["columns"]) if meta["columns"] else None
+        return meta
+
+    def recent(self, limit=100):
+        conn = db.get_connection(self.db_path)
+        shas = [r[0] for r in conn.execute(
+            "SELECT sha256 FROM uploads ORDER BY last_used DESC LIMIT ?", (limit,))]
+        return [self.get(sha) for sha in shas]
+
+    # ---------- cache colunar ----------
+    def _cached(self, meta):
+        return meta and meta["cache_format"] and os.path.exists(self.cache_path(meta["sha256"], meta["cache_format"]))
+
+    def ensure_cache(self, sha):
+        """Lê a planilha original uma única vez e grava o cache. Retorna (meta, construído)."""
+        meta = self.get(sha)
+        if meta is None:
+            raise KeyError(sha)
+        if self._cached(meta):
+            self._touch(sha)
+            self._count("cache_hits")
+            return meta, False
+        with self._lock:
+            lock = self._building.setdefault(sha, threading.Lock())
+        try:
+            with lock:
+                meta = self.get(sha)
+                if self._cached(meta):  # outra thread acabou de construir
+                    self._count("cache_hits")
+                    return meta, False
+                self._build(meta)
+                self._count("cache_builds")
+                return self.get(sha), True
+        finally:
+            with self._lock:
+                self._building.pop(sha, None)
+
+    def _build(self, meta):
+        sha = meta["sha256"]
+        src = self.blob_path(sha, meta["ext"])
+        path = self.cache_path(sha, CACHE_FORMAT)
+        tmp = path + ".tmp"
+        headers, sink, rows_total = [], None, 0
+        try:
+            for headers, rows in importer.iter_chunks(src):
+                if sink is None:
+                    sink = (_ParquetSink(tmp, len(headers)) if pq else _JsonlSink(tmp, headers))
+                columns = [[] for _ in headers]
+                for row in rows:
+                    for i, col in enumerate(columns):
+                        col.append(importer._cell(row[i]) if i < len(row) else None)
+                sink.write(columns)
+                rows_total += len(columns[0]) if columns else 0
+            if sink is None:  # planilha vazia
+                sink = (_ParquetSink(tmp, 0) if pq else _JsonlSink(tmp, []))
+            sink.close()
+            sink = None
+            os.replace(tmp, path)
+        finally:
+            if sink is not None:
+                sink.close()
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        conn = db.get_connection(self.db_path)
+        with conn:
+            conn.execute("""
+                UPDATE uploads SET sheet = ?, columns = ?, row_count = ?, cache_format = ?,
+                                   cache_size = ?, last_used = ?
+                WHERE sha256 = ?
+            """, (_sheet_name(src), json.dumps(headers, ensure_ascii=False), rows_total, CACHE_FORMAT,
+                  os.path.getsize(path), time.time(), sha))
+        self.evict(keep=(sha,))
+
+    def _touch(self, sha):
+        conn = db.get_connection(self.db_path)
+        with conn:
+            conn.execute("UPDATE uploads SET last_used = ? WHERE sha256 = ?", (time.time(), sha))
+
+    def iter_chunks(self, sha, chunk_rows=importer.CHUNK_ROWS):
+        """(cabeçalhos, linhas) em blocos, lidos do cache — mesmo contrato de importer.iter_chunks."""
+        meta, _ = self.ensure_cache(sha)
+        with self._lock:
+            self._pins[sha] += 1
+        try:
+            path = self.cache_path(sha, meta["cache_format"])
+            reader = _read_parquet if meta["cache_format"] == "parquet" else _read_jsonl
+            for rows in reader(path, chunk_rows):
+                yield meta["columns"], rows
+        finally:
+            with self._lock:
+                self._pins[sha] -= 1
+                if not self._pins[sha]:
+                    del self._pins[sha]
+
+    def preview(self, sha, n=PREVIEW_ROWS):
+        """Primeiras n linhas como dicts (cabeçalho -> valor)."""
+        chunks = self.iter_chunks(sha, n)
+        try:
+            for headers, rows in chunks:
+                return [dict(zip(headers, r)) for r in rows[:n]]
+            return []
+        finally:
+            chunks.close()
+
+    # ---------- remoção por tamanho ----------
+    def evict(self, keep=()):
+        """Se blobs + caches passam de max_bytes, remove os menos usados até ~90% do limite."""
+        conn = db.get_connection(self.db_path)
+        total = conn.execute("SELECT COALESCE(SUM(size + cache_size), 0) FROM uploads").fetchone()[0]
+        if total <= self.max_bytes:
+            return 0
+        excess = total - int(self.max_bytes * 0.9)
+        with self._lock:
+            busy = set(keep) | set(self._pins) | set(self._building)
+        victims = []
+        for sha, ext, fmt, size in conn.execute(
+                "SELECT sha256, ext, cache_format, size + cache_size FROM uploads ORDER BY last_used ASC"):
+            if sha in busy:
+                continue
+            victims.append((sha, ext, fmt))
+            excess -= size
+            if excess <= 0:
+                break
+        with conn:
+            conn.executemany("DELETE FROM uploads WHERE sha256 = ?", [(v[0],) for v in victims])
+        for sha, ext, fmt in victims:
+            self._remove_files(sha, ext, fmt)
+        with self._lock:
+            self._stats["evictions"] += len(victims)
+        return len(victims)
+
+    def _remove_files(self, sha, ext, fmt):
+        paths = [self.blob_path(sha, ext)] + ([self.cache_path(sha, fmt)] if fmt else [])
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        conn = db.get_connection(self.db_path)
+        count, blob_bytes, cache_bytes = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(cache_size), 0) FROM uploads").fetchone()
+        with self._lock:
+            s = dict(self._stats)
+        s.update(files=count, blob_bytes=blob_bytes, cache_bytes=cache_bytes, max_bytes=self.max_bytes,
+                 cache_format=CACHE_FORMAT)
+        return s
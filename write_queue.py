@@ -0,0 +1,317 @@
+# write_queue.py
+# Gravação em segundo plano (write-behind) do log de conversa: conversas em
+# serve.py e chat_history em server.py.
+#
+# save_* só coloca a linha numa fila limitada em memória; uma thread grava as
+# linhas pendentes em lote, numa única transação, quando junta WRITE_BATCH_ROWS
+# ou quando passa WRITE_FLUSH_MS desde a primeira. Leituras que precisam ver o
+# que acabou de ser dito usam read_lock() + pending(): enquanto o lock está com o
+# leitor o gravador não faz commit, então cada linha aparece exatamente uma vez
+# (ou no banco, ou na fila).
+#
+# Hooks opcionais (usados pela cache de histórico do server.py):
+#   on_put(row)               chamado no momento em que a linha entra na fila
+#   on_commit(rows, first_id) chamado após o commit, ainda com o lock de leitura;
+#                             os ids do lote são first_id .. first_id + len(rows) - 1
+#   on_dead_letter(row)       chamado quando a linha vai para o dead-letter (nunca terá id)
+#
+# WRITE_DURABILITY:
+#   async   (padrão) retorna na hora; numa queda perde no máximo ~WRITE_FLUSH_MS
+#   group   espera o commit do lote em que a linha entrou (group commit)
+#   direct  grava e faz commit na própria thread do request (comportamento antigo)
+#
+# Falhas: só "database is locked/busy" é tentado de novo (o mesmo lote, a cada
+# RETRY_DELAY_S). Qualquer outro erro (constraint, schema, linha inválida) grava o lote
+# linha a linha; as que falharem vão para o dead-letter `<banco>.<name>.deadletter.jsonl`
+# e o log segue. Com a fila cheia put() espera no máximo WRITE_PUT_TIMEOUT_S e levanta
+# WriteQueueFull.
+import atexit
+import datetime
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import db
+
+WRITE_DURABILITY = os.getenv("WRITE_DURABILITY", "async").lower()
+WRITE_BATCH_ROWS = int(os.getenv("WRITE_BATCH_ROWS", "64"))
+WRITE_FLUSH_MS = float(os.getenv("WRITE_FLUSH_MS", "50"))
+WRITE_MAX_PENDING = int(os.getenv("WRITE_MAX_PENDING", "10000"))
+WRITE_PUT_TIMEOUT_S = float(os.getenv("WRITE_PUT_TIMEOUT_S", "5"))
+RETRY_DELAY_S = 0.5
+DURABILITY_MODES = ("async", "group", "direct")
+
+log = logging.getLogger(__name__)
+
+
+class WriteQueueFull(RuntimeError):
+    """A fila não esvaziou dentro de WRITE_PUT_TIMEOUT_S (banco travado ou lento demais)."""
+
+
+def is_transient(exc):
+    """Banco ocupado/travado por outro processo: vale tentar de novo."""
+    if not isinstance(exc, sqlite3.OperationalError):
+        return False
+    msg = str(exc).lower()
+    return "locked" in msg or "busy" in msg
+
+
+class WriteQueue:
+    def __init__(self, db_path, insert_sql, name="write-queue", durability=WRITE_DURABILITY,
+                 batch_rows=WRITE_BATCH_ROWS, flush_ms=WRITE_FLUSH_MS, max_pending=WRITE_MAX_PENDING,
+                 on_put=None, on_commit=None, put_timeout=WRITE_PUT_TIMEOUT_S, dead_letter_path=None,
+                 on_dead_letter=None):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"WRITE_DURABILITY inválido: {durability} (use {', '.join(DURABILITY_MODES)})")
+        self.db_path = db_path
+        self.insert_sql = insert_sql
+        self.name = name
+        self.durability = durability
+        self.batch_rows = max(1, batch_rows)
+        # em group quem enfileirou está esperando: grava assim que o gravador estiver
+        # livre; o lote é o que se acumulou durante o commit anterior
+        self.flush_s = flush_ms / 1000 if durability == "async" else 0.0
+        self.max_pending = max(1, max_pending)
+        self.put_timeout = put_timeout
+        self.dead_letter_path = dead_letter_path or f"{db_path}.{name}.deadletter.jsonl"
+        self.on_put = on_put
+        self.on_commit = on_commit
+        self.on_dead_letter = on_dead_letter
+
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._commit_lock = threading.RLock()  # gravador x leitores que mesclam a fila
+        self._enqueued = 0    # total de linhas aceitas
+        self._committed = 0   # total de linhas já no banco
+        self._stopping = False
+        self._thread = None
+        self._stats = {"batches": 0, "rows": 0, "max_batch": 0, "errors": 0, "retries": 0,
+                       "dead_letter": 0, "waits_full": 0, "rejected_full": 0, "last_error": None}
+        atexit.register(self.close)
+
+    # ---------- escrita ----------
+    def put(self, row):
+        """Enfileira uma linha (tupla na ordem dos parâmetros de insert_sql)."""
+        if self.durability == "direct":
+            conn = db.get_connection(self.db_path)
+            with self._commit_lock:
+                with conn:
+                    cur = conn.execute(self.insert_sql, row)
+                if self.on_put:
+                    self.on_put(row)
+                if self.on_commit:
+                    self.on_commit([row], cur.lastrowid)
+            return
+        self._ensure_thread()
+        with self._cond:
+            if len(self._pending) >= self.max_pending and not self._stopping:
+                # fila cheia: segura o chamador até o gravador esvaziar (backpressure),
+                # mas não para sempre
+                self._stats["waits_full"] += 1
+                deadline = time.monotonic() + self.put_timeout
+                while len(self._pending) >= self.max_pending and not self._stopping:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["rejected_full"] += 1
+                        raise WriteQueueFull(f"{self.name}: fila de gravação cheia ({len(self._pending)} linhas)")
+                    self._cond.wait(remaining)
+            self._pending.append(row)
+            if self.on_put:
+                self.on_put(row)
+            self._enqueued += 1
+            seq = self._enqueued
+            if len(self._pending) >= self.batch_rows:
+                self._cond.notify_all()
+            else:
+                self._cond.notify()
+        if self.durability == "group":
+            self._wait_committed(seq)
+
+    def flush(self, timeout=None):
+        """Espera até tudo o que já foi enfileirado estar no banco."""
+        with self._cond:
+            target = self._enqueued
+            self._cond.notify_all()
+        return self._wait_committed(target, timeout)
+
+    def _wait_committed(self, seq, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._committed < seq:
+                if self._thread is None or not self._thread.is_alive():
+                    return False
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    # ---------- leitura ----------
+    @contextmanager
+    def read_lock(self):
+        """Bloco em que banco + pending() formam uma visão consistente."""
+        with self._commit_lock:
+            yield
+
+    def pending(self, predicate=None):
+        """Linhas ainda não gravadas, da mais antiga para a mais nova."""
+        with self._cond:
+            rows = list(self._pending)
+        return [r for r in rows if predicate(r)] if predicate else rows
+
+    def discard(self, predicate):
+        """Remove da fila as linhas que ainda não foram gravadas (ex.: limpar sessão)."""
+        with self._commit_lock, self._cond:
+            keep = [r for r in self._pending if not predicate(r)]
+            dropped = len(self._pending) - len(keep)
+            self._pending = deque(keep)
+            # linhas descartadas contam como concluídas para quem espera o commit
+            self._committed += dropped
+            self._cond.notify_all()
+        return dropped
+
+    # ---------- gravador ----------
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._cond:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def _wait_batch(self):
+        """Espera haver um lote (tamanho ou prazo). False quando é hora de parar."""
+        with self._cond:
+            while not self._pending and not self._stopping:
+                self._cond.wait()
+            if not self._pending:
+                return False
+            # junta mais linhas até o tamanho do lote ou o prazo da primeira
+            deadline = time.monotonic() + self.flush_s
+            while len(self._pending) < self.batch_rows and not self._stopping:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return True
+
+    def _run(self):
+        try:
+            while self._wait_batch():
+                try:
+                    self._write()
+                except Exception as e:
+                    with self._cond:
+                        self._stats["errors"] += 1
+                        self._stats["last_error"] = str(e)
+                    if not is_transient(e):
+                        log.exception("%s: falha ao gravar lote; gravando linha a linha", self.name)
+                        self._write_rows()
+                        continue
+                    if self._stopping:
+                        return  # no shutdown não fica preso tentando para sempre
+                    with self._cond:
+                        self._stats["retries"] += 1
+                    time.sleep(RETRY_DELAY_S)  # banco ocupado: tenta o mesmo lote de novo
+        finally:
+            db.release_connections()
+
+    def _write(self):
+        conn = db.get_connection(self.db_path)
+        with self._commit_lock:
+            # o lote é lido já com o lock: discard() não pode mexer na fila no meio
+            with self._cond:
+                batch = [self._pending[i] for i in range(min(len(self._pending), self.batch_rows * 4))]
+            if not batch:
+                return
+            with conn:
+                conn.executemany(self.insert_sql, batch)
+                # um único gravador e uma transação: os ids do lote são contíguos
+                last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+            self._committed_hook(batch, last_id - len(batch) + 1)
+            self._done(len(batch), batch=True)
+
+    def _write_rows(self):
+        """Depois de um erro permanente: grava o lote linha a linha; as que falham vão
+        para o dead-letter, para uma linha ruim não travar o log inteiro."""
+        conn = db.get_connection(self.db_path)
+        with self._commit_lock:
+            with self._cond:
+                batch = [self._pending[i] for i in range(min(len(self._pending), self.batch_rows * 4))]
+            for row in batch:
+                written = False
+                while True:
+                    try:
+                        with conn:
+                            row_id = conn.execute(self.insert_sql, row).lastrowid
+                        self._committed_hook([row], row_id)
+                        written = True
+                        break
+                    except Exception as e:
+                        if is_transient(e) and not self._stopping:
+                            time.sleep(RETRY_DELAY_S)
+                            continue
+                        self._dead_letter(row, e)
+                        break
+                self._done(1, written=written)
+
+    def _committed_hook(self, rows, first_id):
+        if self.on_commit:
+            try:
+                self.on_commit(rows, first_id)
+            except Exception:
+                pass  # as linhas já estão no banco; um hook com erro não pode regravá-las
+
+    def _done(self, n, batch=False, written=True):
+        # linhas no dead-letter também saem da fila e contam como concluídas
+        with self._cond:
+            for _ in range(n):
+                self._pending.popleft()
+            self._committed += n
+            if batch:
+                self._stats["batches"] += 1
+                self._stats["max_batch"] = max(self._stats["max_batch"], n)
+            if written:
+                self._stats["rows"] += n
+            self._cond.notify_all()
+
+    def _dead_letter(self, row, exc):
+        log.error("%s: linha descartada para %s: %s", self.name, self.dead_letter_path, exc)
+        entry = {"at": datetime.datetime.utcnow().isoformat(), "queue": self.name,
+                 "error": f"{type(exc).__name__}: {exc}", "row": list(row)}
+        try:
+            with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+        except OSError:
+            log.exception("%s: não foi possível gravar o dead-letter", self.name)
+        with self._cond:
+            self._stats["dead_letter"] += 1
+        if self.on_dead_letter:
+            try:
+                self.on_dead_letter(row)
+            except Exception:
+                log.exception("%s: falha no hook de dead-letter", self.name)
+
+    def close(self, timeout=10):
+        """Grava o que falta e para o gravador (chamado no shutdown)."""
+        thread = self._thread
+        if thread is None:
+            return
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        thread.join(timeout)
+
+    def stats(self):
+        with self._cond:
+            s = dict(self._stats)
+            s.update(durability=self.durability, pending=len(self._pending),
+                     enqueued=self._enqueued, committed=self._committed)
+        s["avg_batch"] = round(s["rows"] / s["batches"], 2) if s["batches"] else 0.0
+        return s